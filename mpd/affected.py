@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import subprocess
+from pathlib import Path
+
+from .config import project_data_dir
+from .spack_compat import tty
+from .util import bold, gray
+
+LAST_GOOD_FILE = "last-good.json"
+
+
+def _git(repo, *arguments, text=True):
+    return subprocess.run(
+        ["git", "-C", str(repo), *arguments], capture_output=True, text=text, check=False
+    )
+
+
+def head_commit(repo):
+    """The commit checked out in repo, or None if repo is not a git repository."""
+    result = _git(repo, "rev-parse", "--verify", "HEAD")
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def worktree_fingerprint(repo):
+    """A digest of repo's uncommitted changes (including untracked files), or None if clean."""
+    diff = _git(repo, "diff", "--binary", "HEAD", text=False)
+    untracked = _git(repo, "ls-files", "--others", "--exclude-standard", "-z", text=False)
+    if not diff.stdout and not untracked.stdout:
+        return None
+    digest = hashlib.sha256(diff.stdout)
+    for name in sorted(untracked.stdout.split(b"\0")):
+        if not name:
+            continue
+        digest.update(b"\0" + name + b"\0")
+        try:
+            digest.update(hashlib.sha256((Path(repo) / os.fsdecode(name)).read_bytes()).digest())
+        except OSError:
+            pass
+    return digest.hexdigest()
+
+
+def repository_state(repo):
+    """The checked-out commit and uncommitted changes of repo (None if not a git repository)."""
+    commit = head_commit(repo)
+    if commit is None:
+        return None
+    return {"commit": commit, "worktree": worktree_fingerprint(repo)}
+
+
+def repository_changed(repo, last_good):
+    """Whether repo's sources differ from those of the last_good repository state.
+
+    The sources changed if the uncommitted changes (including untracked files)
+    differ from those of last_good, or if the commits since last_good change
+    the tree.
+    """
+    if last_good is None:
+        return True
+    if isinstance(last_good, str):
+        # Recorded by an older version, which only recorded clean repositories as unchanged
+        last_good = {"commit": last_good, "worktree": None}
+    if worktree_fingerprint(repo) != last_good.get("worktree"):
+        return True
+    # Exit status 1 means the trees differ; anything else (e.g. an unknown commit) is an error
+    return _git(repo, "diff", "--quiet", last_good["commit"], "HEAD").returncode != 0
+
+
+def _last_good_path(project_config):
+    return project_data_dir(project_config["name"]) / LAST_GOOD_FILE
+
+
+def read_last_good(project_config, activity):
+    """The repository states of the last successful build or test of the build area."""
+    path = _last_good_path(project_config)
+    if not path.exists():
+        return {}
+    try:
+        records = json.loads(path.read_text())
+    except ValueError:
+        return {}
+    return records.get(activity, {}).get(project_config["build"], {})
+
+
+def repository_states(project_config):
+    """The current state (see repository_state) of each checked-out repository."""
+    source = Path(project_config["source"])
+    states = {}
+    for repo in sorted(set(project_config.get("srcs", {}).values())):
+        state = repository_state(source / repo)
+        if state:
+            states[repo] = state
+    return states
+
+
+def record_last_good(project_config, activity, states):
+    """Record the repository states of a successful build or test of all affected packages.
+
+    A test run only exercises what was built, so it records the states of the
+    last successful build rather than the checked-out sources.
+    """
+    path = _last_good_path(project_config)
+    try:
+        records = json.loads(path.read_text()) if path.exists() else {}
+    except ValueError:
+        records = {}
+    records.setdefault(activity, {})[project_config["build"]] = states
+    path.write_text(json.dumps(records, indent=2, sort_keys=True))
+
+
+def changed_packages(project_config, last_good):
+    """Packages whose checked-out repository changed since the last_good repository states."""
+    source = Path(project_config["source"])
+    changed_repos = {
+        repo
+        for repo in set(project_config.get("srcs", {}).values())
+        if repository_changed(source / repo, last_good.get(repo))
+    }
+    return {
+        package
+        for package, repo in project_config.get("srcs", {}).items()
+        if repo in changed_repos
+    }
+
+
+def with_dependents(packages, dependencies):
+    """Expand packages by the developed packages that depend on them.
+
+    The dependencies map each developed package to all developed packages it
+    depends on, directly or not, so a single pass finds every dependent.
+    """
+    packages = set(packages)
+    return packages | {
+        package for package, deps in dependencies.items() if packages.intersection(deps)
+    }
+
+
+def affected_packages(project_config, activity):
+    """Developed packages to build (or test) since the last successful build (or test).
+
+    Returns None if every package should be considered affected.
+    """
+    dependencies = project_config.get("package_dependencies")
+    if dependencies is None:
+        tty.warn(
+            "The dependencies among the developed packages are unknown; "
+            "all packages are considered affected\n"
+            + gray("    Type 'spack mpd refresh' to record them.")
+        )
+        return None
+
+    changed = changed_packages(project_config, read_last_good(project_config, activity))
+    affected = with_dependents(changed, dependencies)
+    print()
+    if affected:
+        dependents = sorted(affected - changed)
+        tty.msg(
+            f"Packages changed since the last successful {activity}: "
+            + ", ".join(bold(p) for p in sorted(changed))
+            + (gray(" (dependents: " + ", ".join(dependents) + ")") if dependents else "")
+        )
+    else:
+        tty.msg(f"No packages changed since the last successful {activity}")
+    return sorted(affected)
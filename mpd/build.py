@@ -1,14 +1,39 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
 import subprocess
 from pathlib import Path
 
-from .config import selected_project_config
+from . import affected, check_cache, compiler_cache, jobs, slots
+from .config import build_type_config, project_data_dir, selected_project_config
+from .configure_profile import print_profile, profiling_arguments, trace_path
+from .governor import Governor, sample, supports_fifo_jobserver, unconstrained
+from .options import BUILD_TYPES, add_build_type_option
 from .preconditions import State, activate_development_environment, preconditions
 from .spack_compat import tty
+from .targets import check_host
 from .util import cyan, remove_dir
 
 SUBCOMMAND = "build"
 ALIASES = ["b"]
 
+CONFIGURE_FINGERPRINT = ".mpd-configure.json"
+
+# Subdirectory of the build area holding the build areas of 'spack mpd pgo'
+PGO_AREA = "pgo"
+
+# Subdirectory of the build area built by 'spack mpd build --time-trace'
+TIME_TRACE_AREA = "time-trace"
+
+# Changes to these configure inputs invalidate the CMake cache as a whole
+_FRESH_INPUTS = {
+    "generator": "the generator changed",
+    "compilers": "the compilers changed",
+    "lock": "the development environment changed",
+}
+
 
 def setup_subparser(subparsers):
     build = subparsers.add_parser(
@@ -18,6 +43,7 @@ def setup_subparser(subparsers):
         help="build repositories",
     )
     build.add_argument("--clean", action="store_true", help="clean build area before building")
+    add_build_type_option(build)
     build.add_argument(
         "--configure-only", action="store_true", help="run CMake configuration only, do not build"
     )
@@ -25,7 +51,8 @@ def setup_subparser(subparsers):
         "-j",
         dest="parallel",
         metavar="<number>",
-        help="specify number of threads for parallel build",
+        help="specify number of threads for parallel build\n"
+        "(default: as many compile jobs as fit in the available memory)",
     )
     build.add_argument(
         "-D",
@@ -35,12 +62,41 @@ def setup_subparser(subparsers):
         help="CMake variable definition (e.g. -DFOO:STRING=bar)",
         metavar="<var>:<type>=<value>",
     )
-    build.add_argument(
+    selection = build.add_mutually_exclusive_group()
+    selection.add_argument(
         "--packages",
         nargs="+",
         metavar="<package>",
         help="build only targets for the specified checked-out packages",
     )
+    selection.add_argument(
+        "--affected",
+        action="store_true",
+        help="build only the packages whose sources changed since the last successful build,\n"
+        "and the packages that depend on them",
+    )
+    build.add_argument(
+        "--governor",
+        action="store_true",
+        help="adjust the number of parallel jobs to the memory pressure during the build\n"
+        "(-j sets the maximum; requires GNU make 4.4 or ninja 1.13)",
+    )
+    build.add_argument(
+        "--profile-configure",
+        action="store_true",
+        help="profile the CMake configure step and report where its time was spent",
+    )
+    build.add_argument(
+        "--timings",
+        action="store_true",
+        help="report where the build time was spent (ninja generator only)",
+    )
+    build.add_argument(
+        "--time-trace",
+        action="store_true",
+        help="build with compilation time traces in a separate build area and report the\n"
+        "most expensive headers and template instantiations (Clang only)",
+    )
     build.add_argument(
         "generator_options",
         metavar="-- <generator options>",
@@ -58,7 +114,78 @@ def _generator_value(project_config):
     tty.die(f"Only 'make' and 'ninja' generators are allowed (specified {value}).")
 
 
-def configure_cmake_project(project_config, cmake_defines=None):
+def _file_hash(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def configure_inputs(project_config, cmake_defines=None, previous=None):
+    """Return the inputs of the CMake configure step.
+
+    If no CMake variables are defined, those of the previous configuration are reused.
+    """
+    if cmake_defines is None:
+        cmake_defines = previous["defines"] if previous else []
+    return dict(
+        presets=_file_hash(Path(project_config["source"]) / "CMakePresets.json"),
+        defines=list(cmake_defines),
+        generator=project_config["generator"]["value"],
+        compilers=dict(project_config.get("compiler_paths", {})),
+        lock=_file_hash(Path(project_config["local"]) / "spack.lock"),
+    )
+
+
+def read_configure_fingerprint(build_area):
+    path = Path(build_area) / CONFIGURE_FINGERPRINT
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text())
+    except ValueError:
+        return None
+
+
+def write_configure_fingerprint(build_area, inputs):
+    (Path(build_area) / CONFIGURE_FINGERPRINT).write_text(json.dumps(inputs, indent=2) + "\n")
+
+
+def reconfigure_reason(build_area, previous, current):
+    """Return (fresh, reason) if the project must be configured, otherwise None.
+
+    A fresh configuration discards the CMake cache, which is needed only when the
+    cached results no longer apply or when a previously defined variable is dropped.
+    """
+    if not (Path(build_area) / "CMakeCache.txt").exists():
+        return False, None
+    if previous is None:
+        return False, "the configure inputs were not recorded"
+
+    for key, reason in _FRESH_INPUTS.items():
+        if previous.get(key) != current[key]:
+            return True, reason
+    if not set(previous.get("defines", [])) <= set(current["defines"]):
+        return True, "CMake variable definitions were removed"
+    if previous.get("defines") != current["defines"]:
+        return False, "the CMake variable definitions changed"
+    if previous.get("presets") != current["presets"]:
+        return False, "CMakePresets.json changed"
+    return None
+
+
+def _cmake_version():
+    result = subprocess.run(["cmake", "--version"], capture_output=True, text=True)
+    match = re.search(r"version (\d+)\.(\d+)", result.stdout)
+    return (int(match[1]), int(match[2])) if match else None
+
+
+def _supports_fresh():
+    version = _cmake_version()
+    return version is not None and version >= (3, 24)
+
+
+def configure_cmake_project(project_config, cmake_defines=None, fresh=False, profile=False):
     configure_list = [
         "cmake",
         "--preset",
@@ -70,6 +197,25 @@ def configure_cmake_project(project_config, cmake_defines=None):
         _generator_value(project_config),
     ]
 
+    if fresh:
+        if _supports_fresh():
+            configure_list.append("--fresh")
+        else:
+            (Path(project_config["build"]) / "CMakeCache.txt").unlink(missing_ok=True)
+
+    if profile:
+        version = _cmake_version()
+        # CMake does not create the build area before opening the profile
+        Path(project_config["build"]).mkdir(parents=True, exist_ok=True)
+        trace_path(project_config["build"]).unlink(missing_ok=True)
+        if version is not None and version >= (3, 18):
+            configure_list.extend(profiling_arguments(project_config["build"]))
+        else:
+            tty.warn("Profiling the configure step requires CMake 3.18 or newer")
+
+    if "configuration" in project_config:
+        configure_list.append(f"-DCMAKE_BUILD_TYPE:STRING={project_config['configuration']}")
+
     if cmake_defines:
         configure_list.extend([f"-D{define}" for define in cmake_defines])
 
@@ -87,13 +233,31 @@ def configure_cmake_project(project_config, cmake_defines=None):
     return subprocess.run(configure_list)
 
 
-def configure(project_config, cmake_defines=None):
-    result = configure_cmake_project(project_config, cmake_defines)
+def configure(project_config, cmake_defines=None, fresh=False, profile=False):
+    result = configure_cmake_project(project_config, cmake_defines, fresh, profile)
     if result.returncode != 0:
         print()
         tty.die("The CMake configure step failed. See above\n")
 
 
+def clean_build_area(project_config):
+    """Remove the build area, keeping the build areas nested within it."""
+    build_path = Path(project_config["build"])
+    in_cwd = build_path.resolve() == Path.cwd().resolve()
+    nested = [] if "configuration" in project_config else (*BUILD_TYPES, PGO_AREA, TIME_TRACE_AREA)
+    if not any((build_path / build_type).is_dir() for build_type in nested):
+        remove_dir(build_path, keep_dir=in_cwd)
+        return
+
+    for child in build_path.iterdir():
+        if child.name in nested:
+            continue
+        if child.is_dir() and not child.is_symlink():
+            remove_dir(child)
+        else:
+            child.unlink()
+
+
 def source_directories(project_config):
     source_path = Path(project_config["source"])
     return sorted(
@@ -109,7 +273,8 @@ def package_directory_target(project_config, package_source_directory):
     tty.die(f"Only 'make' and 'ninja' generators are allowed (specified {generator}).")
 
 
-def build_targets_from_packages(project_config, package_names):
+def package_directories(project_config, package_names):
+    """The checked-out repositories of the given packages, in the order given."""
     if not package_names:
         return []
 
@@ -126,15 +291,14 @@ def build_targets_from_packages(project_config, package_names):
     known_packages = {**{src: src for src in available_src_dirs}, **package_to_src}
 
     missing_packages = []
-    targets = []
+    directories = []
     for package_name in package_names:
         if package_name not in known_packages:
             missing_packages.append(package_name)
             continue
 
-        target = package_directory_target(project_config, known_packages[package_name])
-        if target not in targets:
-            targets.append(target)
+        if known_packages[package_name] not in directories:
+            directories.append(known_packages[package_name])
 
     if missing_packages:
         msg = "The following packages are not checked out in the selected project:\n"
@@ -147,7 +311,14 @@ def build_targets_from_packages(project_config, package_names):
 
         tty.die(msg + "\n")
 
-    return targets
+    return directories
+
+
+def build_targets_from_packages(project_config, package_names):
+    return [
+        package_directory_target(project_config, directory)
+        for directory in package_directories(project_config, package_names)
+    ]
 
 
 def build(project_config, parallel, generator_options, targets=None):
@@ -172,23 +343,133 @@ def build(project_config, parallel, generator_options, targets=None):
     return subprocess.run(all_arguments)
 
 
+def governed_build(
+    project_config, parallel, generator_options, targets=None, lease=None, follow_memory=True
+):
+    generator = project_config["generator"]["value"]
+    if not supports_fifo_jobserver(generator):
+        parallel = parallel or jobs.default_parallelism(project_config)
+        if lease:
+            parallel = min(int(parallel), lease.share())
+        if follow_memory:
+            tty.warn(
+                "The build governor requires GNU make 4.4 or ninja 1.13 (or newer);"
+                f" building with -j{parallel} instead"
+            )
+        return build(project_config, parallel, generator_options, targets)
+
+    max_jobs = int(parallel) if parallel else os.cpu_count()
+    compile_memory, _ = jobs.job_memory(project_config)
+    log_path = project_data_dir(project_config["name"]) / "governor.log"
+    sampler = sample if follow_memory else unconstrained
+    # The number of jobs is handed out by the governor's jobserver, so no -j is passed
+    with Governor(max_jobs, compile_memory, log_path, sampler=sampler, lease=lease) as governor:
+        result = build(project_config, None, generator_options, targets)
+    governor.summary()
+    return result
+
+
+def configure_if_needed(project_config, cmake_defines=None, profile=False):
+    """Configure the build area if its configure inputs changed; return True if configured."""
+    build_area = project_config["build"]
+    previous = read_configure_fingerprint(build_area)
+    inputs = configure_inputs(project_config, cmake_defines, previous)
+    reconfigure = reconfigure_reason(build_area, previous, inputs)
+    if profile and not reconfigure:
+        reconfigure = (False, "a configure profile was requested")
+    if not reconfigure:
+        return False
+
+    fresh, reason = reconfigure
+    if reason:
+        print()
+        tty.msg(f"Reconfiguring because {reason}" + (" (fresh)" if fresh else ""))
+    configure(project_config, inputs["defines"], fresh, profile=profile)
+    write_configure_fingerprint(build_area, inputs)
+    check_cache.harvest(project_config)
+    if profile and trace_path(build_area).exists():
+        print_profile(project_config)
+    return True
+
+
+def build_project(project_config, parallel, generator_options, targets=None, governor=False):
+    """Build the project within the machine's build slots, stopping if the build fails."""
+    cache_statistics = compiler_cache.statistics(project_config)
+    lease = slots.lease_for(
+        project_config, "build", int(parallel or jobs.default_parallelism(project_config))
+    )
+    if lease or governor:
+        with lease or contextlib.nullcontext():
+            result = governed_build(
+                project_config,
+                parallel or (lease and lease.requested),
+                generator_options,
+                targets,
+                lease=lease,
+                follow_memory=governor,
+            )
+    else:
+        parallel = parallel or jobs.default_parallelism(project_config)
+        result = build(project_config, parallel, generator_options, targets)
+    compiler_cache.print_statistics(project_config, cache_statistics)
+    if result.returncode != 0:
+        tty.die("Build failed.")
+
+
 def process(args):
     preconditions(State.INITIALIZED, State.SELECTED_PROJECT, State.PACKAGES_TO_DEVELOP)
 
-    config = selected_project_config()
+    config = build_type_config(selected_project_config(), args.build_type)
+    check_host(config)
     if args.clean:
-        build_path = Path(config["build"])
-        in_cwd = build_path.resolve() == Path.cwd().resolve()
-        remove_dir(build_path, keep_dir=in_cwd)
+        clean_build_area(config)
 
     activate_development_environment(config["local"])
 
-    build_area = config["build"]
-    if not (Path(build_area) / "CMakeCache.txt").exists():
-        configure(config, args.cmake_defines)
-
-    if not args.configure_only:
-        targets = build_targets_from_packages(config, args.packages)
-        result = build(config, args.parallel, args.generator_options, targets)
-        if result.returncode != 0:
-            tty.die("Build failed.")
+    if args.time_trace:
+        from .time_trace import build_with_time_trace
+
+        for option in ("configure_only", "timings"):
+            if getattr(args, option):
+                tty.die(f"--time-trace cannot be combined with --{option.replace('_', '-')}")
+        packages = args.packages
+        if args.affected:
+            packages = affected.affected_packages(config, "build")
+            if packages == []:
+                return
+        build_with_time_trace(
+            config,
+            args.parallel,
+            args.generator_options,
+            build_targets_from_packages(config, packages),
+            args.cmake_defines,
+            governor=args.governor,
+            profile=args.profile_configure,
+        )
+        return
+
+    configured = configure_if_needed(config, args.cmake_defines, profile=args.profile_configure)
+    if args.configure_only:
+        if not configured:
+            print()
+            tty.msg("The CMake configuration is up to date")
+        return
+
+    packages = args.packages
+    # A reconfigured build area may need rebuilding as a whole
+    if args.affected and not configured:
+        packages = affected.affected_packages(config, "build")
+        if packages == []:
+            return
+
+    # Sources edited during the build may not have been built
+    states = affected.repository_states(config)
+    targets = build_targets_from_packages(config, packages)
+    build_project(config, args.parallel, args.generator_options, targets, governor=args.governor)
+    if not args.packages:
+        affected.record_last_good(config, "build", states)
+
+    if args.timings:
+        from .build_report import print_report
+
+        print_report(config)
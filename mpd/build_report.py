@@ -0,0 +1,428 @@
+import json
+import re
+import shutil
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+from .config import project_data_dir, selected_project_config
+from .linking import describe, project_settings
+from .preconditions import State, activate_development_environment, preconditions
+from .spack_compat import tty
+from .util import bold, cyan, gray, magenta
+
+SUBCOMMAND = "build-report"
+
+SUPERBUILD = "(superbuild)"
+_HISTORY_FILE = "build-timings.jsonl"
+_MAX_HISTORY = 100
+
+_GRAPH_NODE = re.compile(
+    r'^"(?P<id>[^"]+)" \[label="(?P<label>.*)"(?P<ellipse>, shape=ellipse)?\]$'
+)
+_GRAPH_EDGE = re.compile(r'^"(?P<src>[^"]+)" -> "(?P<dst>[^"]+)"')
+_SHARED_LIBRARY = re.compile(r"\.(so(\.\d+)*|dylib)$")
+
+
+def setup_subparser(subparsers):
+    report = subparsers.add_parser(
+        SUBCOMMAND,
+        description="report where the time of the most recent build was spent\n\n"
+        "Timings are read from the build area's .ninja_log file, which is only\n"
+        "written when the project uses the ninja generator.",
+        help="report build timings",
+    )
+    report.add_argument(
+        "-n",
+        "--top",
+        type=int,
+        default=15,
+        metavar="<number>",
+        help="number of slowest targets to list (default: %(default)s)",
+    )
+    report.add_argument(
+        "--history", action="store_true", help="list the recorded build timings of the project"
+    )
+
+
+class BuildStep:
+    """One ninja edge executed during a build, with its outputs and duration (in seconds)."""
+
+    def __init__(self, outputs, start, end):
+        self.outputs = outputs
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+def parse_ninja_log(log_path):
+    """Return the build steps of the most recent ninja invocation recorded in log_path.
+
+    The log accumulates entries across ninja invocations.  The start and end
+    times of each entry are relative to the start of its invocation, so an
+    entry that ends before the previous one marks the start of a new build.
+    """
+    steps = {}
+    last_end = -1
+    with open(log_path) as f:
+        header = f.readline()
+        if not header.startswith("# ninja log v"):
+            tty.die(f"Unsupported ninja log format in {log_path}")
+
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5:
+                continue
+            start, end, _, output, command_hash = fields[:5]
+            start, end = int(start), int(end)
+            if end < last_end:
+                steps = {}
+            last_end = end
+
+            # Edges with several outputs contribute one line per output
+            key = (start, end, command_hash)
+            if key in steps:
+                steps[key].outputs.append(output)
+            else:
+                steps[key] = BuildStep([output], start / 1000.0, end / 1000.0)
+
+    return list(steps.values())
+
+
+def recorded_durations(log_path):
+    """Map each output recorded in log_path to the duration (in seconds) of its latest build."""
+    durations = {}
+    with open(log_path) as f:
+        if not f.readline().startswith("# ninja log v"):
+            return durations
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 4:
+                durations[fields[3]] = (int(fields[1]) - int(fields[0])) / 1000.0
+    return durations
+
+
+def parse_ninja_graph(dot_text):
+    """Map each output of a 'ninja -t graph' dump to the set of its inputs."""
+    labels = {}
+    edge_nodes = set()
+    edges = []
+    for line in dot_text.splitlines():
+        node = _GRAPH_NODE.match(line)
+        if node:
+            labels[node["id"]] = node["label"].replace('\\"', '"')
+            if node["ellipse"]:
+                edge_nodes.add(node["id"])
+            continue
+        edge = _GRAPH_EDGE.match(line)
+        if edge:
+            edges.append((edge["src"], edge["dst"]))
+
+    inputs = {}
+    edge_inputs = {}
+    edge_outputs = {}
+    for src, dst in edges:
+        if dst in edge_nodes:
+            edge_inputs.setdefault(dst, []).append(src)
+        elif src in edge_nodes:
+            edge_outputs.setdefault(src, []).append(dst)
+        else:
+            # An edge with a single input and a single output
+            inputs.setdefault(labels[dst], set()).add(labels[src])
+
+    for edge, outputs in edge_outputs.items():
+        edge_input_labels = {labels[i] for i in edge_inputs.get(edge, [])}
+        for output in outputs:
+            inputs.setdefault(labels[output], set()).update(edge_input_labels)
+
+    return inputs
+
+
+def ninja_graph(build_area):
+    ninja = shutil.which("ninja")
+    if not ninja:
+        return None
+    result = subprocess.run(
+        [ninja, "-C", str(build_area), "-t", "graph"], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    return parse_ninja_graph(result.stdout)
+
+
+def critical_path(steps, inputs):
+    """Return the chain of build steps that bounded the wall time of the build.
+
+    Each output finishes no earlier than its own duration plus the latest
+    finishing of its inputs; outputs not rebuilt take no time.
+    """
+    step_for = {output: step for step in steps for output in step.outputs}
+    finish = {}
+    via = {}
+
+    for root in step_for:
+        stack = [(root, False)]
+        while stack:
+            node, inputs_done = stack.pop()
+            if node in finish:
+                continue
+            node_inputs = inputs.get(node, ())
+            if not inputs_done:
+                stack.append((node, True))
+                stack.extend((i, False) for i in node_inputs if i not in finish)
+                continue
+            latest = max(node_inputs, key=lambda i: finish.get(i, 0.0), default=None)
+            step = step_for.get(node)
+            finish[node] = (step.duration if step else 0.0) + finish.get(latest, 0.0)
+            via[node] = latest
+
+    if not finish:
+        return []
+
+    path = []
+    node = max(finish, key=finish.get)
+    while node is not None:
+        step = step_for.get(node)
+        if step and (not path or path[-1] is not step):
+            path.append(step)
+        node = via.get(node)
+    return list(reversed(path))
+
+
+def package_for(output, build_area, packages):
+    """Return the developed package whose build subdirectory contains output."""
+    path = Path(output)
+    if path.is_absolute():
+        try:
+            path = path.relative_to(build_area)
+        except ValueError:
+            return SUPERBUILD
+    first = path.parts[0] if path.parts else ""
+    return first if first in packages else SUPERBUILD
+
+
+def is_link_step(step, inputs=None):
+    """Whether step links a shared library or an executable.
+
+    Without the build graph, executables are recognized by their location in a
+    bin directory.
+    """
+    output = step.outputs[0]
+    if _SHARED_LIBRARY.search(output):
+        return True
+    if output.endswith((".a", ".o")):
+        return False
+    if inputs is not None:
+        return any(i.endswith(".o") for i in inputs.get(output, ()))
+    return Path(output).parent.name == "bin" and not Path(output).suffix
+
+
+def summarize(steps, build_area, packages, path=None, inputs=None):
+    per_package = {}
+    link = dict(seconds=0.0, targets=0)
+    for step in steps:
+        if is_link_step(step, inputs):
+            link["seconds"] += step.duration
+            link["targets"] += 1
+        package = package_for(step.outputs[0], build_area, packages)
+        totals = per_package.setdefault(package, dict(seconds=0.0, targets=0))
+        totals["seconds"] += step.duration
+        totals["targets"] += 1
+
+    return dict(
+        wall=max((s.end for s in steps), default=0.0) - min((s.start for s in steps), default=0.0),
+        cpu=sum(s.duration for s in steps),
+        targets=len(steps),
+        packages=per_package,
+        critical_path=sum(s.duration for s in path) if path is not None else None,
+        link=link,
+    )
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "---"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
+
+def _format_delta(new, old):
+    if old is None or new is None:
+        return ""
+    delta = new - old
+    sign = "+" if delta >= 0 else "-"
+    return gray(f" ({sign}{format_duration(abs(delta))})")
+
+
+def history_file(project_name):
+    return project_data_dir(project_name) / _HISTORY_FILE
+
+
+def read_history(project_name):
+    path = history_file(project_name)
+    if not path.exists():
+        return []
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+def record(project_name, summary, log_id):
+    """Append summary to the project's timing history unless this build is already recorded."""
+    entries = read_history(project_name)
+    if entries and entries[-1].get("log") == log_id:
+        return entries[:-1]
+
+    entry = dict(date=datetime.now().replace(microsecond=0).isoformat(" "), log=log_id, **summary)
+    previous = list(entries)
+    entries = (entries + [entry])[-_MAX_HISTORY:]
+    with open(history_file(project_name), "w") as f:
+        for e in entries:
+            f.write(json.dumps(e) + "\n")
+    return previous
+
+
+def print_report(project_config, top=15, record_history=True):
+    build_area = Path(project_config["build"])
+    if project_config["generator"]["value"] != "ninja":
+        tty.warn(
+            "Build timings are only available for projects that use the ninja generator\n"
+            f"    (recreate the project with the {bold('generator=ninja')} variant)"
+        )
+        return
+
+    log_path = build_area / ".ninja_log"
+    if not log_path.exists():
+        tty.warn(
+            f"No build has been recorded in {build_area}\n"
+            f"    (build the project first with {bold('spack mpd build')})"
+        )
+        return
+
+    steps = parse_ninja_log(log_path)
+    if not steps:
+        tty.msg("No targets were rebuilt by the most recent build")
+        return
+
+    from .build import source_directories
+
+    packages = set(source_directories(project_config))
+    inputs = ninja_graph(build_area)
+    path = critical_path(steps, inputs) if inputs is not None else None
+    summary = summarize(steps, build_area, packages, path, inputs)
+    summary["link_mode"] = describe(project_settings(project_config))
+
+    previous = None
+    if record_history:
+        stat = log_path.stat()
+        history = record(project_config["name"], summary, f"{stat.st_mtime_ns}:{stat.st_size}")
+        previous = history[-1] if history else None
+
+    print()
+    tty.msg(
+        f"Build timings for {bold(project_config['name'])}: "
+        f"{summary['targets']} targets rebuilt in {format_duration(summary['wall'])}"
+        + _format_delta(summary["wall"], previous and previous["wall"])
+        + gray(f" (total CPU time {format_duration(summary['cpu'])})")
+    )
+
+    previous_packages = previous["packages"] if previous else {}
+    name_width = max(len(p) for p in list(summary["packages"]) + ["Package"])
+    print(f"\n  {'Package':<{name_width}}  {'Time':>9}  {'Share':>6}  Targets")
+    print("  " + "-" * name_width + "  " + "-" * 9 + "  " + "-" * 6 + "  " + "-" * 7)
+    for package, totals in sorted(
+        summary["packages"].items(), key=lambda item: item[1]["seconds"], reverse=True
+    ):
+        share = 100 * totals["seconds"] / summary["cpu"] if summary["cpu"] else 0
+        old = previous_packages.get(package, {}).get("seconds")
+        print(
+            f"  {magenta(f'{package:<{name_width}}')}  {format_duration(totals['seconds']):>9}"
+            f"  {share:5.1f}%  {totals['targets']:>7}" + _format_delta(totals["seconds"], old)
+        )
+
+    _print_link_time(summary, previous)
+
+    print("\n  Slowest targets:")
+    for step in sorted(steps, key=lambda s: s.duration, reverse=True)[:top]:
+        print(f"    {format_duration(step.duration):>9}  {step.outputs[0]}")
+
+    if path is None:
+        print(gray("\n  (critical path unavailable: 'ninja -t graph' could not be run)"))
+    elif path:
+        share = 100 * summary["critical_path"] / summary["wall"] if summary["wall"] else 0
+        print(
+            f"\n  Critical path: {cyan(format_duration(summary['critical_path']))}"
+            f" ({share:.0f}% of wall time)"
+        )
+        for step in path:
+            print(f"    {format_duration(step.duration):>9}  {step.outputs[0]}")
+    print()
+
+
+def _print_link_time(summary, previous):
+    link = summary["link"]
+    previous_link = previous.get("link") if previous else None
+    print(
+        f"\n  Link time: {cyan(format_duration(link['seconds']))}"
+        f" for {link['targets']} targets"
+        + _format_delta(link["seconds"], previous_link and previous_link["seconds"])
+        + gray(f" ({summary['link_mode']})")
+    )
+    previous_mode = previous.get("link_mode") if previous else None
+    if previous_link and previous_mode and previous_mode != summary["link_mode"]:
+        print(
+            gray(
+                f"    previous build: {format_duration(previous_link['seconds'])}"
+                f" for {previous_link['targets']} targets ({previous_mode})"
+            )
+        )
+
+
+def print_history(project_name):
+    entries = read_history(project_name)
+    if not entries:
+        tty.msg(f"No build timings have been recorded for {bold(project_name)}")
+        return
+
+    print()
+    tty.msg(f"Recorded build timings for {bold(project_name)}:\n")
+    print(
+        f"  {'Date':<19}  {'Wall time':>9}  {'CPU time':>9}  {'Critical':>9}  {'Link':>9}"
+        "  Targets  Linking"
+    )
+    print("  " + "  ".join("-" * width for width in (19, 9, 9, 9, 9, 7, 7)))
+    for entry in entries:
+        link = entry.get("link")
+        print(
+            f"  {entry['date']:<19}  {format_duration(entry['wall']):>9}"
+            f"  {format_duration(entry['cpu']):>9}"
+            f"  {format_duration(entry.get('critical_path')):>9}"
+            f"  {format_duration(link and link['seconds']):>9}  {entry['targets']:>7}"
+            + gray(f"  {entry.get('link_mode', '---')}")
+        )
+    print()
+
+
+def process(args):
+    preconditions(State.INITIALIZED, State.SELECTED_PROJECT, State.PACKAGES_TO_DEVELOP)
+
+    config = selected_project_config()
+    if args.history:
+        print_history(config["name"])
+        return
+
+    # The ninja executable used for the build graph comes from the development environment
+    activate_development_environment(config["local"])
+    print_report(config, top=args.top)
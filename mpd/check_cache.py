@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+from pathlib import Path
+
+from . import init
+from .util import write_if_changed
+
+_CACHE_ENTRY = re.compile(r"^(?P<name>[^#/:][^:]*):(?P<type>[A-Z]+)=(?P<value>.*)$")
+
+# Help strings of the cache entries set by CMake's Check* modules and try_compile
+_CHECK_HELP_PREFIXES = (
+    "Have ",
+    "Test ",
+    "CHECK_TYPE_SIZE:",
+    "Result of TRY_COMPILE",
+)
+
+# Settings besides the compilers that affect the outcome of a check
+_SETTINGS = (
+    "CMAKE_BUILD_TYPE",
+    "CMAKE_CXX_STANDARD",
+    "CMAKE_CXX_EXTENSIONS",
+    "CMAKE_C_FLAGS",
+    "CMAKE_CXX_FLAGS",
+)
+
+
+def results_dir():
+    """Check results shared by all MPD projects, one file per compiler configuration."""
+    return init.cache_dir(init.mpd_config_dir()) / "check-results"
+
+
+def parse_cmake_cache(text):
+    """Map each entry of a CMakeCache.txt file to its (type, value, help string)."""
+    entries = {}
+    help_lines = []
+    for line in text.splitlines():
+        if line.startswith("//"):
+            help_lines.append(line[2:])
+            continue
+        match = _CACHE_ENTRY.match(line)
+        if match:
+            entries[match["name"]] = (match["type"], match["value"], " ".join(help_lines))
+        help_lines = []
+    return entries
+
+
+def check_results(entries):
+    """Select the results of configure checks from the entries of a CMake cache."""
+    return {
+        name: dict(value=value, help=help_string)
+        for name, (entry_type, value, help_string) in entries.items()
+        if entry_type == "INTERNAL"
+        and not name.startswith("CMAKE_")
+        and help_string.startswith(_CHECK_HELP_PREFIXES)
+    }
+
+
+def compiler_identity(path):
+    """Identify a compiler by its resolved path, version string, and file metadata.
+
+    A compiler that is reinstalled or upgraded in place gets a different identity.
+    """
+    try:
+        resolved = Path(path).resolve(strict=True)
+        stat = resolved.stat()
+        result = subprocess.run(
+            [str(resolved), "--version"], capture_output=True, text=True, timeout=30
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    version = result.stdout.splitlines()[0] if result.stdout else ""
+    return dict(path=str(resolved), version=version, mtime=stat.st_mtime_ns, size=stat.st_size)
+
+
+def _value(variable):
+    if isinstance(variable, dict):
+        variable = variable.get("value")
+    return " ".join(str(variable).split()) if variable is not None else ""
+
+
+def configuration(compilers, variables):
+    """Return the configuration under which check results are valid.
+
+    compilers maps each language to a compiler path, and variables holds the
+    CMake variables the checks are run with.
+    """
+    identities = {}
+    for lang, path in sorted(compilers.items()):
+        identity = compiler_identity(path)
+        if identity is None:
+            return None
+        identities[lang] = identity
+
+    settings = {name: _value(variables.get(name)) for name in _SETTINGS}
+    # CMake initializes the compiler flags from the environment on the first configure
+    for lang, env_var in (("C", "CFLAGS"), ("CXX", "CXXFLAGS")):
+        name = f"CMAKE_{lang}_FLAGS"
+        if name not in variables:
+            settings[name] = _value(os.environ.get(env_var))
+    return dict(compilers=identities, settings=settings)
+
+
+def configuration_key(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _is_stale(stored):
+    for identity in stored.get("compilers", {}).values():
+        if compiler_identity(identity["path"]) != identity:
+            return True
+    return False
+
+
+def prune():
+    """Remove the check results of compilers that changed or no longer exist."""
+    directory = results_dir()
+    if not directory.exists():
+        return
+    for path in directory.glob("*.json"):
+        stored = _read(path)
+        if stored is None or _is_stale(stored):
+            path.unlink(missing_ok=True)
+
+
+def _languages(project_config):
+    return [lang for lang in ("c", "cxx") if lang in project_config["languages"]]
+
+
+def harvest(project_config):
+    """Record the check results of the project's build area, returning their number."""
+    cache_file = Path(project_config["build"]) / "CMakeCache.txt"
+    if not cache_file.exists():
+        return 0
+    entries = parse_cmake_cache(cache_file.read_text(errors="replace"))
+    results = check_results(entries)
+    if not results:
+        return 0
+
+    compilers = {}
+    for lang in _languages(project_config):
+        entry = entries.get(f"CMAKE_{lang.upper()}_COMPILER")
+        if not (entry and entry[1]):
+            return 0
+        compilers[lang] = entry[1]
+    config = configuration(compilers, {name: entry[1] for name, entry in entries.items()})
+    if config is None:
+        return 0
+
+    prune()
+    path = results_dir() / f"{configuration_key(config)}.json"
+    stored = _read(path) or dict(config, results={})
+    stored["results"].update(results)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_if_changed(path, json.dumps(stored, indent=2, sort_keys=True) + "\n")
+    return len(results)
+
+
+def cache_variables(project_config, variables):
+    """Return the recorded check results for the project's compilers and CMake variables.
+
+    The results are returned as INTERNAL cache variables, so that CMake's Check*
+    modules skip the corresponding checks.
+    """
+    compilers = {
+        lang: project_config["compiler_paths"][lang] for lang in _languages(project_config)
+    }
+    config = configuration(compilers, variables)
+    if config is None:
+        return {}
+    stored = _read(results_dir() / f"{configuration_key(config)}.json")
+    if stored is None or stored.get("compilers") != config["compilers"]:
+        return {}
+    return {
+        name: {"type": "INTERNAL", "value": result["value"]}
+        for name, result in sorted(stored["results"].items())
+    }
@@ -1,8 +1,7 @@
-import os
-import re
-import select
+import asyncio
+import functools
+import json
 import shutil
-import subprocess
 import sys
 import textwrap
 import urllib
@@ -16,28 +15,17 @@ from spack.util import executable
 from . import init as mpd_init
 from .config import selected_project_config
 from .preconditions import State, preconditions
-from .spack_compat import fs, tty
+from .spack_compat import tty
 from .util import bold, gray, maybe_with_color, yellow
 
 SUBCOMMAND = "git-clone"
 ALIASES = ["g", "clone"]
 
 gh = executable.which("gh")
-# Stolen from https://stackoverflow.com/a/14693789/3585575
-ansi_escape = re.compile(
-    r"""
-    \x1B  # ESC
-    (?:   # 7-bit C1 Fe (except CSI)
-        [@-Z\\-_]
-    |     # or [ for CSI, followed by a control sequence
-        \[
-        [0-?]*  # Parameter bytes
-        [ -/]*  # Intermediate bytes
-        [@-~]   # Final byte
-    )
-""",
-    re.VERBOSE,
-)
+
+# Number of repositories cloned (and forked) at the same time
+_MAX_CONCURRENT_CLONES = 8
+_DEFAULT_FORK_TIMEOUT = 120  # seconds
 
 
 def setup_subparser(subparsers):
@@ -81,11 +69,41 @@ def setup_subparser(subparsers):
         action="store_true",
         help="prefer SSH for GitHub repositories and fall back to HTTPS if unavailable",
     )
+    git_parser.add_argument(
+        "--locked",
+        action="store_true",
+        help="check out the commits recorded in the lockfile (the suite lockfile when used\n"
+        "with --suites, otherwise the project lockfile)",
+    )
+    git_parser.add_argument(
+        "--lockfile",
+        metavar="<lockfile>",
+        help="lockfile to read (with --locked) or write (with --freeze)\n"
+        "(default: suite or project lockfile)",
+    )
+    git_parser.add_argument(
+        "--shallow",
+        action="store_true",
+        help="fetch only the commit to be checked out instead of the full history",
+    )
+    git_parser.add_argument(
+        "--freeze",
+        action="store_true",
+        help="write a lockfile recording the commit checked out in each repository\n"
+        "(restricted to the repositories of the suites given with --suites)",
+    )
     git = git_parser.add_mutually_exclusive_group()
     help_msg = "fork GitHub repository or set origin to already forked repository"
     if not gh:
         help_msg += yellow("\n(not supported on this system - requires gh, which cannot be found)")
     git.add_argument("--fork", action="store_true", help=help_msg)
+    git_parser.add_argument(
+        "--fork-timeout",
+        type=float,
+        default=_DEFAULT_FORK_TIMEOUT,
+        metavar="<seconds>",
+        help="give up forking a repository after this many seconds (default: %(default)s)",
+    )
     git.add_argument("--help-repos", action="store_true", help="list known repositories")
     git.add_argument(
         "--help-repos-with-urls",
@@ -171,9 +189,9 @@ class GitHubRepo:
 
 
 class SimpleGitRepo:
-    def __init__(self, url):
+    def __init__(self, url, name=None):
         path = urllib.parse.urlparse(url).path
-        self._name = Path(path).name.replace(".git", "")
+        self._name = name or Path(path).name.replace(".git", "")
         self._url = url
 
     def name(self):
@@ -202,6 +220,9 @@ class Suite:
     def repositories(self):
         return {p: self.org.repo(p) for p in self.repos}
 
+    def lockfile(self):
+        return _suite_lockfile_path(self.suite_file)
+
 
 def _suite_files_path():
     return mpd_init.known_suites_dir(mpd_init.mpd_config_dir())
@@ -211,6 +232,16 @@ def _suite_seed_marker_path():
     return _suite_files_path() / ".builtins-seeded"
 
 
+def _suite_lockfile_path(suite_file):
+    # A "<name>-suite-lock.yaml" file is not picked up as a suite definition
+    suite_file = Path(suite_file)
+    return suite_file.with_name(suite_file.name.replace("-suite.yaml", "-suite-lock.yaml"))
+
+
+def project_lockfile_path(project_config):
+    return Path(project_config["source"]) / "mpd-lock.yaml"
+
+
 def _populate_known_suites():
     suite_files_path = _suite_files_path()
     suite_files_path.mkdir(exist_ok=True)
@@ -311,6 +342,7 @@ def _remove_suite(suite_name):
 
     suite_file = Path(suite.suite_file)
     suite_file.unlink()
+    suite.lockfile().unlink(missing_ok=True)
     tty.msg(f"Removed suite {bold(suite_name)} from {gray(str(suite_file))}")
     return True
 
@@ -464,9 +496,67 @@ def _github_ssh_url(url):
     return f"git@github.com:{path}"
 
 
-def _clone(repo, srcs_area, prefer_ssh=False):
+def _git_in(path):
     git = spack.util.git.git(required=True)
-    git.add_default_arg("-C", srcs_area)
+    git.add_default_arg("-C", str(path))
+    return git
+
+
+def _clone_at_commit(git, clone_url, local_src_dir, commit, shallow):
+    """Clone clone_url into local_src_dir with commit checked out (detached).
+
+    Returns None on success or the git error message on failure, in which case
+    any partially created repository is removed.
+    """
+    if shallow:
+        # A shallow clone cannot be asked for an arbitrary commit, so fetch
+        # only that commit into an empty repository instead.
+        result = git("init", "--quiet", str(local_src_dir), fail_on_error=False, error=str)
+        local_git = _git_in(local_src_dir)
+        if git.returncode == 0:
+            result = local_git(
+                "remote", "add", "origin", clone_url, fail_on_error=False, error=str
+            )
+        if local_git.returncode == 0:
+            result = local_git(
+                "fetch",
+                "--quiet",
+                "--depth",
+                "1",
+                "origin",
+                commit,
+                fail_on_error=False,
+                error=str,
+            )
+        if local_git.returncode == 0:
+            result = local_git(
+                "checkout", "--quiet", "--detach", "FETCH_HEAD", fail_on_error=False, error=str
+            )
+    else:
+        result = git(
+            "clone", "--no-checkout", clone_url, str(local_src_dir), fail_on_error=False, error=str
+        )
+        local_git = _git_in(local_src_dir)
+        if git.returncode == 0:
+            result = local_git(
+                "checkout", "--quiet", "--detach", commit, fail_on_error=False, error=str
+            )
+            if local_git.returncode != 0:
+                # The commit may not be reachable from any branch (e.g. a pull-request head)
+                local_git("fetch", "--quiet", "origin", commit, fail_on_error=False, error=str)
+                result = local_git(
+                    "checkout", "--quiet", "--detach", commit, fail_on_error=False, error=str
+                )
+
+    if git.returncode == 0 and local_git.returncode == 0:
+        return None
+
+    shutil.rmtree(local_src_dir, ignore_errors=True)
+    return result.rstrip() or f"could not check out commit {commit}"
+
+
+def _clone(repo, srcs_area, prefer_ssh=False, commit=None, shallow=False):
+    git = _git_in(srcs_area)
 
     clone_url = repo.url()
     used_https_fallback = False
@@ -480,12 +570,142 @@ def _clone(repo, srcs_area, prefer_ssh=False):
                 used_https_fallback = True
 
     local_src_dir = Path(srcs_area) / repo.name()
-    result = git("clone", clone_url, str(local_src_dir), fail_on_error=False, error=str)
+    if commit:
+        if local_src_dir.exists():
+            return f"destination path '{local_src_dir}' already exists", used_https_fallback
+        error = _clone_at_commit(git, clone_url, local_src_dir, commit, shallow)
+        return error, used_https_fallback
+
+    depth = ["--depth", "1"] if shallow else []
+    result = git("clone", *depth, clone_url, str(local_src_dir), fail_on_error=False, error=str)
     if "Cloning into" in result and git.returncode == 0:
         return None, used_https_fallback
     return result.rstrip(), used_https_fallback
 
 
+def _checked_out_commit(repo_path):
+    git = _git_in(repo_path)
+    commit = git("rev-parse", "HEAD", output=str, error=str, fail_on_error=False).strip()
+    return commit if git.returncode == 0 else None
+
+
+def read_lockfile(lockfile):
+    """Return the locked repositories of lockfile as a {name: {url, commit}} mapping."""
+    lockfile = Path(lockfile)
+    if not lockfile.is_file():
+        tty.die(f"Lockfile does not exist: {lockfile}")
+
+    with open(lockfile) as f:
+        loaded = syaml.load(f)
+
+    repos = loaded.get("repos") if isinstance(loaded, dict) else None
+    if not isinstance(repos, dict):
+        tty.die(f"Invalid lockfile {lockfile}: expected a 'repos' mapping")
+
+    for name, entry in repos.items():
+        if not isinstance(entry, dict) or not isinstance(entry.get("commit"), str):
+            tty.die(f"Invalid lockfile {lockfile}: expected a commit for repository {name}")
+    return dict(repos)
+
+
+def write_lockfile(lockfile, locked):
+    repos = {
+        name: dict(url=entry["url"], commit=entry["commit"])
+        for name, entry in sorted(locked.items())
+    }
+    with open(lockfile, "w") as f:
+        syaml.dump(dict(repos=repos), stream=f, default_flow_style=False)
+
+
+def _frozen_entry(repo_path):
+    """Return the lockfile entry for the repository at repo_path and any caveats about it."""
+    commit = _checked_out_commit(repo_path)
+    if commit is None:
+        return None, ["no commit checked out"]
+
+    git = _git_in(repo_path)
+    notes = []
+    status = git(
+        "status", "--porcelain", "--untracked-files=no", output=str, error=str, fail_on_error=False
+    )
+    if status.strip():
+        notes.append("uncommitted changes not recorded")
+
+    # Record a remote from which the commit can actually be fetched, preferring the
+    # repository that was forked (if any) over the fork itself.
+    containing = git(
+        "branch", "--remotes", "--contains", commit, output=str, error=str, fail_on_error=False
+    )
+    remotes = {
+        line.strip().split(" -> ")[0].split("/", 1)[0]
+        for line in containing.splitlines()
+        if line.strip()
+    }
+    if not remotes:
+        notes.append("commit not on any remote branch")
+    candidates = [r for r in ("upstream", "origin") if r in remotes or not remotes]
+    candidates += sorted(remotes - {"upstream", "origin"})
+
+    for remote in candidates:
+        url = git("remote", "get-url", remote, output=str, error=str, fail_on_error=False)
+        if git.returncode == 0 and url.strip():
+            return dict(url=url.strip(), commit=commit), notes
+
+    return None, ["no remote from which to fetch commit"]
+
+
+def freeze(project_config, suite_names=None, lockfile=None):
+    srcs_path = Path(project_config["source"])
+    checked_out = sorted(
+        f.name for f in srcs_path.iterdir() if not f.name.startswith(".") and (f / ".git").exists()
+    )
+
+    # Each entry is (lockfile, names of repositories to record)
+    lockfiles = []
+    if suite_names:
+        suites = []
+        for s in suite_names:
+            try:
+                suites.append(suite_for(s))
+            except StopIteration:
+                tty.die(f"Cannot freeze unknown suite {bold(s)}")
+        if lockfile:
+            lockfiles.append((Path(lockfile), [r for s in suites for r in s.repos]))
+        else:
+            lockfiles += [(s.lockfile(), s.repos) for s in suites]
+    else:
+        lockfiles.append((Path(lockfile or project_lockfile_path(project_config)), checked_out))
+
+    for path, names in lockfiles:
+        print()
+        tty.msg(f"Recording checked-out commits in {gray(str(path))}:\n")
+        name_width = max([len(n) + 1 for n in names] + [20])
+        locked = {}
+        for name in names:
+            notes = []
+            if name not in checked_out:
+                entry, notes = None, ["not checked out"]
+            else:
+                entry, notes = _frozen_entry(srcs_path / name)
+
+            if entry:
+                locked[name] = entry
+                line = maybe_with_color(
+                    "y" if notes else "g",
+                    f"  {name + ' ':.<{name_width}}..... {entry['commit'][:10]}",
+                )
+            else:
+                line = maybe_with_color("R", f"  {name + ' ':.<{name_width}}..... skipped")
+            if notes:
+                line += f" ({', '.join(notes)})"
+            print(line)
+
+        write_lockfile(path, locked)
+
+    print()
+    tty.msg(f"Clone the recorded commits with {bold('spack mpd git-clone --locked ...')}\n")
+
+
 def _color_from(status):
     if status.value() == CloneState.ERROR:
         return "R"
@@ -496,92 +716,280 @@ def _color_from(status):
     return None
 
 
-# Stolen from https://stackoverflow.com/a/52954716/3585575
-def _fork_repository():
-    # The relevant message when forking is buried in a message that is
-    # only printed to a TTY...so we have to fake out the system
-    master_fd, tty_fd = os.openpty()
-    p = subprocess.Popen(
-        ["gh", "repo", "fork", "--remote"],
-        bufsize=1,
-        stdout=tty_fd,
-        stderr=subprocess.STDOUT,
-        close_fds=True,
+async def _run_async(*cmd, cwd=None):
+    """Run cmd without blocking the event loop, returning (returncode, stdout, stderr)."""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # Raised when the fork times out--do not leave the process behind
+        proc.kill()
+        await proc.wait()
+        raise
+    return proc.returncode, stdout.decode().strip(), stderr.decode().strip()
+
+
+class ForkError(Exception):
+    pass
+
+
+class GhClient:
+    """Forks GitHub repositories via the GitHub REST API as exposed by 'gh api'.
+
+    Any object providing the same coroutines (e.g. a local stand-in for
+    testing) may be passed to clone_repos instead.
+    """
+
+    def __init__(self, gh_path="gh"):
+        self._gh = gh_path
+        self._login = None
+        self._login_lock = None
+
+    async def _api(self, *args):
+        returncode, out, err = await _run_async(self._gh, "api", *args)
+        if returncode != 0:
+            raise ForkError(err or f"'gh api {' '.join(args)}' failed")
+        try:
+            return json.loads(out) if out else None
+        except ValueError:
+            raise ForkError(f"unexpected response from 'gh api {' '.join(args)}'")
+
+    async def login(self):
+        """Return the login of the authenticated GitHub user."""
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+        async with self._login_lock:
+            if self._login is None:
+                try:
+                    self._login = (await self._api("user"))["login"]
+                except ForkError:
+                    raise ForkError("not logged in to GitHub (see 'gh auth login')")
+        return self._login
+
+    async def repository(self, full_name):
+        """Return the repository description of full_name, or None if it does not exist."""
+        try:
+            return await self._api(f"repos/{full_name}")
+        except ForkError:
+            return None
+
+    async def fork(self, full_name):
+        """Fork full_name to the user's account, returning the fork's description.
+
+        GitHub returns the existing fork if the user has already forked it.
+        """
+        return await self._api("--method", "POST", f"repos/{full_name}/forks")
+
+    async def set_default(self, repo_path, full_name):
+        """Make full_name the repository that gh commands in repo_path refer to."""
+        await _run_async(self._gh, "repo", "set-default", full_name, cwd=repo_path)
+
+
+def _github_full_name(url):
+    """Return the "<owner>/<repository>" name of a GitHub URL, or None for other URLs."""
+    if url.startswith("git@github.com:"):
+        path = url[len("git@github.com:") :]
+    else:
+        parsed = urllib.parse.urlparse(url)
+        if parsed.netloc != "github.com":
+            return None
+        path = parsed.path
+    path = path.strip("/")
+    if path.endswith(".git"):
+        path = path[: -len(".git")]
+    return path if path.count("/") == 1 else None
+
+
+async def _fork_repository(client, repo_path, url):
+    """Fork the repository at url and point the 'origin' remote of repo_path to the fork.
+
+    As with 'gh repo fork --remote', the original 'origin' remote is renamed to
+    'upstream'.  Returns a (CloneState, message) pair.
+    """
+    full_name = _github_full_name(url)
+    if full_name is None:
+        return CloneState.ERROR, "only GitHub repositories can be forked"
+
+    try:
+        login = await client.login()
+        if full_name.split("/")[0] == login:
+            return CloneState.SKIPPED, "repository owned by you"
+
+        existing = await client.repository(f"{login}/{full_name.split('/')[1]}")
+        if existing and (existing.get("parent") or {}).get("full_name") == full_name:
+            fork, state = existing, CloneState.SKIPPED
+        else:
+            fork, state = await client.fork(full_name), CloneState.DONE
+        await client.set_default(repo_path, full_name)
+    except ForkError as e:
+        return CloneState.ERROR, f"could not fork: {e}"
+
+    fork_name = fork["full_name"]
+    if state == CloneState.DONE:
+        msg = "created fork " + fork_name
+    else:
+        msg = "added fork " + fork_name
+
+    # Use the same transport for the fork as was used to clone the repository
+    _, origin_url, _ = await _run_async("git", "remote", "get-url", "origin", cwd=repo_path)
+    fork_url = fork["ssh_url"] if origin_url.startswith("git@") else fork["clone_url"]
+    if _github_full_name(origin_url) == fork_name:
+        return CloneState.SKIPPED, "using fork " + fork_name
+
+    returncode, _, _ = await _run_async("git", "remote", "get-url", "upstream", cwd=repo_path)
+    if returncode != 0:
+        returncode, _, err = await _run_async(
+            "git", "remote", "rename", "origin", "upstream", cwd=repo_path
+        )
+        if returncode != 0:
+            return CloneState.ERROR, f"could not rename remote 'origin' ({err})"
+    else:
+        await _run_async("git", "remote", "remove", "origin", cwd=repo_path)
+
+    returncode, _, err = await _run_async(
+        "git", "remote", "add", "origin", fork_url, cwd=repo_path
+    )
+    if returncode != 0:
+        return CloneState.ERROR, f"could not add remote for {fork_name} ({err})"
+    return state, msg
+
+
+def _status_line(name, status, name_width):
+    line = maybe_with_color(
+        _color_from(status), f"  {name + ' ':.<{name_width}}..... {status.name():<7}"
+    )
+    if status.annotation():
+        line += f" ({status.annotation()})"
+    return line
+
+
+def _clone_status(repo, srcs_area, prefer_ssh, commit, shallow):
+    """Clone repo, returning its RepoStatus and whether the sources directory changed."""
+    status = RepoStatus()
+    result, used_https_fallback = _clone(
+        repo, srcs_area, prefer_ssh=prefer_ssh, commit=commit, shallow=shallow
     )
+    if result is None:
+        clone_msg = f"cloned at {commit[:10]}" if commit else "cloned"
+        if used_https_fallback:
+            clone_msg += " via https fallback"
+        status.update(CloneState.DONE, clone_msg=clone_msg)
+        return status, True
+
+    if "already exists" in result:
+        clone_msg = "already cloned"
+        if commit and _checked_out_commit(Path(srcs_area) / repo.name()) != commit:
+            clone_msg += ", not at locked commit"
+        status.update(CloneState.SKIPPED, clone_msg=clone_msg)
+    else:
+        status.update(CloneState.ERROR, clone_msg=result)
+    return status, False
+
+
+async def _clone_and_fork(
+    name, repo, srcs_area, semaphore, prefer_ssh, commit, shallow, fork_client, fork_timeout
+):
+    async with semaphore:
+        # Cloning uses Spack's (blocking) git executable, so it runs in a worker thread.
+        status, changed = await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(_clone_status, repo, srcs_area, prefer_ssh, commit, shallow)
+        )
 
-    result = b""
-    timeout = 0.04  # seconds
-    while True:
-        ready, _, _ = select.select([master_fd], [], [], timeout)
-        if ready:
-            for fd in ready:
-                data = os.read(fd, 512)
-                if not data:
-                    break
-                result += data
-        elif p.poll() is not None:  # select timed-out
-            break  # p exited
-    for fd in (master_fd, tty_fd):
-        os.close(fd)  # can't do it sooner: it leads to errno.EIO error
-
-    p.wait()
-    if p.returncode != 0:
-        return "cannot fork"
-    result = result.decode().strip()
-    return ansi_escape.sub("", result)
-
-
-def clone_repos(repos, should_fork, srcs_area, local_area, prefer_ssh=False):
+        if status.okay() and fork_client is not None:
+            fork = _fork_repository(fork_client, str(Path(srcs_area) / name), repo.url())
+            try:
+                state, fork_msg = await asyncio.wait_for(fork, timeout=fork_timeout)
+            except asyncio.TimeoutError:
+                state, fork_msg = CloneState.ERROR, f"fork timed out after {fork_timeout:g}s"
+            status.update(state, fork_msg=fork_msg)
+
+    return name, status, changed
+
+
+async def _clone_and_fork_all(
+    repos, srcs_area, prefer_ssh, locked, shallow, fork_client, fork_timeout
+):
     name_width = max(len(n) + 1 for n in repos.keys())
     name_width = max(name_width, 20)
-    changed_srcs_dir = False
+
+    semaphore = asyncio.Semaphore(_MAX_CONCURRENT_CLONES)
+    tasks = []
     for name, repo in repos.items():
-        result, used_https_fallback = _clone(repo, srcs_area, prefer_ssh=prefer_ssh)
-        status = RepoStatus()
-        if result is None:
-            clone_msg = "cloned"
-            if used_https_fallback:
-                clone_msg += " via https fallback"
-            status.update(CloneState.DONE, clone_msg=clone_msg)
-            changed_srcs_dir = True
-        elif "already exists" in result:
-            status.update(CloneState.SKIPPED, clone_msg="already cloned")
-        else:
-            status.update(CloneState.ERROR, clone_msg=result)
-
-        if status.okay() and should_fork:
-            with fs.working_dir(str(Path(srcs_area) / name)):
-                result = gh("repo", "set-default", repo.url(), output=str, error=str)
-                if gh.returncode != 0:
-                    status.update(
-                        CloneState.ERROR, fork_msg="could not set default URL for forking"
-                    )
-                if status.okay():
-                    result = _fork_repository()
-                    if result == "cannot fork":
-                        status.update(CloneState.ERROR, fork_msg="could not fork")
-                    elif "Created fork" in result:
-                        m = re.search(r"Created fork (\S+)", result, re.DOTALL)
-                        status.update(CloneState.DONE, fork_msg="created fork " + m.group(1))
-                    elif "already exists" in result and "Added remote" in result:
-                        m = re.search(r"(\S+) already exists", result, re.DOTALL)
-                        status.update(CloneState.SKIPPED, fork_msg="added fork " + m.group(1))
-                    elif "already exists" in result and "Using existing remote" in result:
-                        m = re.search(r"(\S+) already exists", result, re.DOTALL)
-                        status.update(CloneState.SKIPPED, fork_msg="using fork " + m.group(1))
-                    else:
-                        status.update(CloneState.ERROR, fork_msg=result)
-
-        line = maybe_with_color(
-            _color_from(status), f"  {name + ' ':.<{name_width}}..... {status.name():<7}"
+        commit = None
+        if locked is not None:
+            entry = locked.get(name)
+            if entry is None:
+                status = RepoStatus()
+                status.update(CloneState.ERROR, clone_msg="no commit recorded in lockfile")
+                print(_status_line(name, status, name_width))
+                continue
+            commit = entry["commit"]
+            if entry.get("url"):
+                repo = SimpleGitRepo(entry["url"], name=name)
+
+        tasks.append(
+            _clone_and_fork(
+                name,
+                repo,
+                srcs_area,
+                semaphore,
+                prefer_ssh,
+                commit,
+                shallow,
+                fork_client,
+                fork_timeout,
+            )
         )
-        if status.annotation():
-            line += f" ({status.annotation()})"
-        print(line)
+
+    # Statuses are printed in the order in which the repositories finish.
+    changed_srcs_dir = False
+    for task in asyncio.as_completed(tasks):
+        name, status, changed = await task
+        print(_status_line(name, status, name_width))
+        changed_srcs_dir = changed_srcs_dir or changed
 
     return changed_srcs_dir
 
 
+def clone_repos(
+    repos,
+    should_fork,
+    srcs_area,
+    local_area,
+    prefer_ssh=False,
+    locked=None,
+    shallow=False,
+    fork_client=None,
+    fork_timeout=_DEFAULT_FORK_TIMEOUT,
+):
+    """Clone (and possibly fork) repos into srcs_area.
+
+    Repositories are cloned concurrently, and each is forked as soon as its
+    clone has completed.  Forking uses fork_client (a GhClient by default)
+    and is abandoned for a repository after fork_timeout seconds.
+
+    If locked (a mapping as returned by read_lockfile) is provided, each
+    repository is checked out at its locked commit; repositories without a
+    locked commit are reported as errors.
+    """
+    if should_fork and fork_client is None:
+        fork_client = GhClient()
+    if not should_fork:
+        fork_client = None
+
+    return asyncio.run(
+        _clone_and_fork_all(
+            repos, srcs_area, prefer_ssh, locked, shallow, fork_client, fork_timeout
+        )
+    )
+
+
 def process(args):
     # Handle suite additions before clone operations so a command like
     #   spack mpd g --add-suite <suite-file> --suites <suite-name>
@@ -608,15 +1016,25 @@ def process(args):
                 f"Forking has been disabled (the {bold('gh')} executable cannot be found).\n"
                 "           You can still clone repositories."
             )
-        # FIXME: Should have a check for successful gh auth status command
 
     should_fork = args.fork and gh
 
-    if args.repos or args.suites:
+    if args.freeze:
+        if args.repos or args.locked:
+            tty.die("The --freeze option cannot be combined with repo specs or --locked")
+        preconditions(State.INITIALIZED, State.SELECTED_PROJECT)
+        freeze(selected_project_config(), args.suites, args.lockfile)
+        return
+
+    if args.repos or args.suites or args.locked:
         preconditions(State.INITIALIZED, State.SELECTED_PROJECT)
         config = selected_project_config()
         changed_srcs_dir = False
-        if args.repos:
+        if args.repos or (args.locked and not args.suites):
+            project_locked = None
+            if args.locked:
+                project_locked = read_lockfile(args.lockfile or project_lockfile_path(config))
+
             print()
             preamble = "Cloning"
             if should_fork:
@@ -627,12 +1045,21 @@ def process(args):
             for repo_spec in args.repos:
                 repo = repos.get(repo_spec, SimpleGitRepo(repo_spec))
                 repos_to_clone[repo.name()] = repo
-            if clone_repos(
+            if not args.repos:
+                # Without repo specs, everything recorded in the lockfile is cloned
+                repos_to_clone = {
+                    name: SimpleGitRepo(entry["url"], name=name)
+                    for name, entry in project_locked.items()
+                }
+            if repos_to_clone and clone_repos(
                 repos_to_clone,
                 should_fork,
                 config["source"],
                 config["local"],
                 prefer_ssh=args.prefer_ssh,
+                locked=project_locked,
+                shallow=args.shallow,
+                fork_timeout=args.fork_timeout,
             ):
                 changed_srcs_dir = True
 
@@ -646,6 +1073,18 @@ def process(args):
                     tty.warn(f"Skipping unknown suite {bold(s)}")
                     continue
 
+                suite_locked = None
+                if args.locked:
+                    suite_lockfile = Path(args.lockfile) if args.lockfile else suite.lockfile()
+                    if not suite_lockfile.exists():
+                        freeze_cmd = f"spack mpd git-clone --suites {s} --freeze"
+                        print()
+                        tty.die(
+                            f"No lockfile for suite {bold(s)} (expected {suite_lockfile}).\n"
+                            f"Create one with {bold(freeze_cmd)}\n"
+                        )
+                    suite_locked = read_lockfile(suite_lockfile)
+
                 print()
                 preamble = "Cloning"
                 if should_fork:
@@ -657,6 +1096,9 @@ def process(args):
                     config["source"],
                     config["local"],
                     prefer_ssh=args.prefer_ssh,
+                    locked=suite_locked,
+                    shallow=args.shallow,
+                    fork_timeout=args.fork_timeout,
                 ):
                     changed_srcs_dir = True
 
@@ -11,15 +11,19 @@ _VERSION = "0.3.1"
 
 subcommands = [
     "build",
+    "build_report",
     "clear",
     "clone",
+    "impact",
     "init",
     "install",
     "list_projects",
     "new_project",
+    "pgo",
     "refresh",
     "rm_project",
     "cmd_select",  # prefix with cmd_ to avoid collision with standard library select
+    "slots",
     "status",
     "test",
     "zap",
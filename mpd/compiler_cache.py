@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from . import init
+from .spack_compat import tty
+from .util import bold, gray
+
+TOOLS = ("ccache", "sccache")
+DEFAULT_MAX_SIZE = "20G"
+
+_SIZE_PATTERN = re.compile(r"^\d+(\.\d+)?[KMGT]i?$")
+
+
+def settings(tool, max_size=None):
+    """Return the compiler-cache settings recorded in the project configuration."""
+    if tool == "none":
+        if max_size is not None:
+            no_cache_selected()
+        return None
+
+    if not shutil.which(tool):
+        tty.die(
+            f"The compiler cache {bold(tool)} was not found in PATH.\n"
+            f"    Install it (e.g. 'spack install {tool}') and add it to PATH before"
+            " creating or refreshing the project.\n"
+        )
+
+    max_size = max_size or DEFAULT_MAX_SIZE
+    if not _SIZE_PATTERN.match(max_size):
+        tty.die(f"Invalid compiler cache size '{max_size}' (expected e.g. 500M or 20G)")
+
+    return dict(tool=tool, max_size=max_size)
+
+
+def no_cache_selected():
+    tty.die("The --compiler-cache-size option requires a compiler cache (see --compiler-cache)")
+
+
+def cache_dir(tool):
+    return init.cache_dir(init.mpd_config_dir()) / tool
+
+
+def base_dir(project_config):
+    """Common ancestor of the project's source and build directories.
+
+    Paths below it are rewritten as relative paths before hashing so that
+    identical sources in different project areas share cache entries.
+    """
+    return os.path.commonpath(
+        [project_config["top"], project_config["source"], project_config["build"]]
+    )
+
+
+def environment(project_config):
+    cache = project_config.get("compiler_cache")
+    if not cache:
+        return {}
+
+    tool = cache["tool"]
+    directory = str(cache_dir(tool))
+    if tool == "ccache":
+        return dict(
+            CCACHE_DIR=directory,
+            CCACHE_MAXSIZE=cache["max_size"],
+            CCACHE_BASEDIR=base_dir(project_config),
+            # Debug builds otherwise hash the working directory, which defeats CCACHE_BASEDIR
+            CCACHE_NOHASHDIR="true",
+        )
+    return dict(SCCACHE_DIR=directory, SCCACHE_CACHE_SIZE=cache["max_size"])
+
+
+def launcher(project_config):
+    """Return the CMake compiler launcher (a CMake list) or None if no cache is used."""
+    cache = project_config.get("compiler_cache")
+    if not cache:
+        return None
+
+    tool = cache["tool"]
+    executable = shutil.which(tool)
+    if not executable:
+        tty.die(f"The compiler cache {bold(tool)} configured for the project was not found")
+
+    cache_dir(tool).mkdir(parents=True, exist_ok=True)
+    variables = [f"{k}={v}" for k, v in environment(project_config).items()]
+    return ";".join(["env"] + variables + [executable])
+
+
+def parse_ccache_stats(text):
+    counters = {}
+    for line in text.splitlines():
+        fields = line.split("\t")
+        if len(fields) == 2 and fields[1].isdigit():
+            counters[fields[0]] = int(fields[1])
+    hits = counters.get("direct_cache_hit", 0) + counters.get("preprocessed_cache_hit", 0)
+    return dict(hits=hits, misses=counters.get("cache_miss", 0))
+
+
+def parse_sccache_stats(text):
+    stats = json.loads(text)["stats"]
+
+    def _total(key):
+        return sum(stats.get(key, {}).get("counts", {}).values())
+
+    return dict(hits=_total("cache_hits"), misses=_total("cache_misses"))
+
+
+def statistics(project_config):
+    """Return the cumulative hit and miss counters of the project's compiler cache."""
+    cache = project_config.get("compiler_cache")
+    if not cache:
+        return None
+
+    tool = cache["tool"]
+    executable = shutil.which(tool)
+    if not executable:
+        return None
+
+    if tool == "ccache":
+        command, parse = [executable, "--print-stats"], parse_ccache_stats
+    else:
+        command, parse = [executable, "--show-stats", "--stats-format=json"], parse_sccache_stats
+
+    env = dict(os.environ, **environment(project_config))
+    result = subprocess.run(command, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        return None
+    try:
+        return parse(result.stdout)
+    except (ValueError, KeyError):
+        return None
+
+
+def print_statistics(project_config, before):
+    after = statistics(project_config)
+    if before is None or after is None:
+        return
+
+    # The counters are reset if the sccache server was restarted during the build
+    if after["hits"] < before["hits"] or after["misses"] < before["misses"]:
+        before = dict(hits=0, misses=0)
+
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    total = hits + misses
+    if total == 0:
+        return
+
+    tool = project_config["compiler_cache"]["tool"]
+    tty.msg(
+        f"Compiler cache ({tool}): {hits} hits, {misses} misses "
+        + gray(f"({100 * hits / total:.1f}% hit rate)")
+    )
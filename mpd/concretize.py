@@ -4,7 +4,6 @@ import os
 import re
 import subprocess
 import sys
-import time
 from pathlib import Path
 
 import spack.builder as builder
@@ -17,11 +16,30 @@ import spack.repo
 import spack.store
 import spack.util.spack_yaml as syaml
 from spack import traverse
-from spack.spec import InstallStatus
-
-from .config import update
+from spack.spec import InstallStatus, Spec
+
+from . import (
+    check_cache,
+    compiler_cache,
+    fetch_cache,
+    jobs,
+    linking,
+    targets,
+    test_resources,
+    unity_pch,
+)
+from .config import default_build_type, update
 from .spack_compat import config_set, tty
-from .util import bold, cyan, get_number, gray, make_yaml_file, runtime_library_dirs, yellow
+from .util import (
+    bold,
+    cyan,
+    get_number,
+    gray,
+    make_yaml_file,
+    runtime_library_dirs,
+    write_if_changed,
+    yellow,
+)
 
 SUBCOMMAND = "new-project"
 ALIASES = ["n"]
@@ -108,15 +126,15 @@ def cmake_package_variables(name, cmake_args):
     )
 
 
-def cmake_develop(project_config, package_cmake_args):
+def cmake_develop(project_config, package_cmake_args, view_path):
     project_name = project_config["name"]
     source_path = Path(project_config["source"])
     file_dir = Path(__file__).resolve().parent
-    with open((source_path / "develop.cmake").absolute(), "w") as out:
-        for name, args in package_cmake_args.items():
-            out.write(f"# {name} variables\n" + cmake_package_variables(name, args))
-        out.write(
-            f"""set(CWD "{file_dir}")
+    content = ""
+    for name, args in package_cmake_args.items():
+        content += f"# {name} variables\n" + cmake_package_variables(name, args)
+    content += unity_pch.develop_preamble(project_config, view_path)
+    content += f"""set(CWD "{file_dir}")
 macro(develop pkg)
   install(CODE "execute_process(COMMAND spack python ensure-install-directory.py\\
                                         {project_name} ${{${{pkg}}_HASH}}\\
@@ -127,20 +145,36 @@ macro(develop pkg)
   if (COMMAND set_${{pkg_with_underscores}}_variables)
     cmake_language(CALL "set_${{pkg_with_underscores}}_variables")
   endif()
-  add_subdirectory(${{pkg}})
-  if (COMMAND unset_${{pkg_with_underscores}}_variables)
+  # Label the package's tests for 'spack mpd test --packages' (subdirectories inherit labels)
+  get_directory_property(mpd_labels LABELS)
+  set_property(DIRECTORY APPEND PROPERTY LABELS ${{pkg}})
+{unity_pch.develop_prologue(project_config)}  add_subdirectory(${{pkg}})
+  set_directory_properties(PROPERTIES LABELS "${{mpd_labels}}")
+{unity_pch.develop_epilogue(project_config)}  if (COMMAND unset_${{pkg_with_underscores}}_variables)
     cmake_language(CALL "unset_${{pkg_with_underscores}}_variables")
   endif()
   install(CODE "execute_process(COMMAND spack python add-to-database.py\\
                                         {project_name} ${{${{pkg}}_HASH}}\\
                                 WORKING_DIRECTORY ${{CWD}})")
 endmacro()
+
+# Reserves memory for tests that declare none (see 'spack mpd test'); ctest reads the
+# directory added here after the tests of all developed packages are defined
+function(mpd_test_resources)
+  set(dir "${{CMAKE_BINARY_DIR}}/mpd-tests")
+  file(CONFIGURE OUTPUT "${{dir}}/CMakeLists.txt" CONTENT
+    "set_property(DIRECTORY APPEND PROPERTY TEST_INCLUDE_FILES \\"${{dir}}/resources.cmake\\")\\n"
+    @ONLY)
+  file(CONFIGURE OUTPUT "${{dir}}/resources.cmake" CONTENT
+    "include(\\"${{CMAKE_BINARY_DIR}}/{test_resources.DEFAULTS_FILE.as_posix()}\\" OPTIONAL)\\n"
+    @ONLY)
+  add_subdirectory("${{dir}}" "${{CMAKE_BINARY_DIR}}/mpd-tests-build")
+endfunction()
 """
-        )
+    return write_if_changed((source_path / "develop.cmake").absolute(), content)
 
 
 def cmake_lists_preamble(project_name, develop_cetmodules, cetmodules4):
-    date = time.strftime("%Y-%m-%d")
     preamble = """cmake_minimum_required(VERSION 3.24...4.1 FATAL_ERROR)
 enable_testing()
 include(develop.cmake)
@@ -150,43 +184,48 @@ include(develop.cmake)
         preamble += "develop(cetmodules)\n\n"
 
     if cetmodules4:
-        preamble += """include(FetchContent)
+        preamble += f"""include(FetchContent)
 FetchContent_Declare(
   cetmodules
-  GIT_REPOSITORY https://github.com/FNALssi/cetmodules
-  GIT_TAG 8269cc9 # v4.02.00
+  GIT_REPOSITORY {fetch_cache.CETMODULES_REPOSITORY}
+  GIT_TAG {fetch_cache.CETMODULES_TAG} # v{fetch_cache.CETMODULES_VERSION}
   EXCLUDE_FROM_ALL # Do not install
-  FIND_PACKAGE_ARGS 4.02.00
+  FIND_PACKAGE_ARGS {fetch_cache.CETMODULES_VERSION}
   )
 
 FetchContent_MakeAvailable(cetmodules)
-find_package(cetmodules 4.02.00 REQUIRED)
+find_package(cetmodules {fetch_cache.CETMODULES_VERSION} REQUIRED)
 """
 
-    preamble += f"project({project_name}-{date} LANGUAGES NONE)\n\n"
+    preamble += f"project({project_name} LANGUAGES NONE)\n\n"
     return preamble
 
 
 def cmake_lists(project_config, dependencies, cetmodules4):
     source_path = Path(project_config["source"])
     develop_cetmodules = any("cetmodules" in p for p in [d[0] for d in dependencies])
-    with open((source_path / "CMakeLists.txt").absolute(), "w") as f:
-        f.write(
-            cmake_lists_preamble(
-                project_config["name"],
-                develop_cetmodules=develop_cetmodules,
-                cetmodules4=cetmodules4,
-            )
-        )
-        for d, hash, prefix in dependencies:
-            if d == "cetmodules":
-                continue
-            srcs_name = project_config["srcs"][d]
-            f.write(f"\ndevelop({srcs_name})")
-        f.write("\n")
-
-
-def cmake_presets(project_config, dependencies, cetmodules4, view_path):
+    content = cmake_lists_preamble(
+        project_config["name"],
+        develop_cetmodules=develop_cetmodules,
+        cetmodules4=cetmodules4,
+    )
+    for d, hash, prefix in dependencies:
+        if d == "cetmodules":
+            continue
+        srcs_name = project_config["srcs"][d]
+        content += f"\ndevelop({srcs_name})"
+    content += "\n\nmpd_test_resources()\n"
+    return write_if_changed((source_path / "CMakeLists.txt").absolute(), content)
+
+
+def cmake_presets(
+    project_config,
+    dependencies,
+    cetmodules4,
+    view_path,
+    fetch_variables=None,
+    package_hints=None,
+):
     # Use the compiler that was already selected and validated in project_config_from_args
     compiler_paths = project_config["compiler_paths"]
 
@@ -195,7 +234,7 @@ def cmake_presets(project_config, dependencies, cetmodules4, view_path):
     rpath_value = ";".join(view_lib_dirs)
 
     configure_presets = {
-        "CMAKE_BUILD_TYPE": {"type": "STRING", "value": "RelWithDebInfo"},
+        "CMAKE_BUILD_TYPE": {"type": "STRING", "value": default_build_type(project_config)},
         "CMAKE_CXX_EXTENSIONS": {"type": "BOOL", "value": "OFF"},
         "CMAKE_CXX_STANDARD_REQUIRED": {"type": "BOOL", "value": "ON"},
         "CMAKE_CXX_STANDARD": {"type": "STRING", "value": cxxstd},
@@ -206,6 +245,7 @@ def cmake_presets(project_config, dependencies, cetmodules4, view_path):
 
     if cetmodules4:
         configure_presets["CMAKE_PROJECT_TOP_LEVEL_INCLUDES"] = "CetProvideDependency"
+        configure_presets.update(fetch_variables or {})
 
     # Set C/CXX compilers depending on which languages are needed
     languages = project_config["languages"]
@@ -213,6 +253,35 @@ def cmake_presets(project_config, dependencies, cetmodules4, view_path):
         configure_presets["CMAKE_C_COMPILER"] = {"type": "PATH", "value": compiler_paths["c"]}
     if "cxx" in languages:
         configure_presets["CMAKE_CXX_COMPILER"] = {"type": "PATH", "value": compiler_paths["cxx"]}
+
+    chosen_compiler = project_config.get("chosen_compiler")
+    target_flags = {}
+    if chosen_compiler:
+        compiler = Spec(chosen_compiler)
+        flags = targets.optimization_flags(
+            targets.project_targets(project_config)["develop"],
+            compiler.name,
+            str(compiler.version),
+        )
+        for lang in ("c", "cxx"):
+            if flags and lang in languages:
+                target_flags[lang] = flags
+                configure_presets[f"CMAKE_{lang.upper()}_FLAGS"] = {
+                    "type": "STRING",
+                    "value": flags,
+                }
+    configure_presets.update(linking.cache_variables(project_config, target_flags))
+
+    launcher = compiler_cache.launcher(project_config)
+    if launcher:
+        for lang in ("c", "cxx"):
+            if lang in languages:
+                configure_presets[f"CMAKE_{lang.upper()}_COMPILER_LAUNCHER"] = {
+                    "type": "STRING",
+                    "value": launcher,
+                }
+
+    configure_presets.update(jobs.job_pool_cache_variables(project_config))
     if "python" in languages:
         # It is sufficient to use the *local* view path for CMake to locate Python
         local_view_path = Path(project_config["local"]) / ".spack-env" / "view"
@@ -256,6 +325,14 @@ def cmake_presets(project_config, dependencies, cetmodules4, view_path):
                     if key.startswith(dep_name):
                         allCacheVariables[preset_type][key] = value
 
+    # Results of configure checks made with the same compilers and settings
+    for key, value in check_cache.cache_variables(project_config, configure_presets).items():
+        configure_presets.setdefault(key, value)
+
+    # Variables already set (e.g. from a dependency's presets) take precedence over the hints
+    for key, value in (package_hints or {}).items():
+        configure_presets.setdefault(key, value)
+
     presets = {"version": max_presets_version}
     for preset_type in [s for s in preset_types if s in allCacheVariables]:
         presets.update(
@@ -271,14 +348,93 @@ def cmake_presets(project_config, dependencies, cetmodules4, view_path):
             }
         )
 
-    with open((source_path / "CMakePresets.json").absolute(), "w") as f:
-        json.dump(presets, f, indent=4)
+    return write_if_changed(
+        (source_path / "CMakePresets.json").absolute(), json.dumps(presets, indent=4)
+    )
+
+
+def make_cmake_files(
+    project_config,
+    cmake_args,
+    dependencies,
+    cetmodules4,
+    view_path,
+    fetch_variables=None,
+    package_hints=None,
+):
+    """Generate the project's CMake files, returning the names of those that changed."""
+    changed = {
+        "develop.cmake": cmake_develop(project_config, cmake_args, view_path),
+        "CMakeLists.txt": cmake_lists(project_config, dependencies, cetmodules4),
+        "CMakePresets.json": cmake_presets(
+            project_config, dependencies, cetmodules4, view_path, fetch_variables, package_hints
+        ),
+    }
+    return [name for name, was_written in changed.items() if was_written]
+
+
+_CONFIG_FILE_PATTERN = re.compile(r"^(?P<name>.+?)(Config|-config)\.cmake$")
+# Config-file locations searched by find_package, relative to an installation prefix
+_CONFIG_FILE_GLOBS = (
+    "lib*/cmake/*/*onfig.cmake",
+    "share/cmake/*/*onfig.cmake",
+    "lib*/*/*onfig.cmake",
+    "share/*/*onfig.cmake",
+    "lib*/*/cmake/*onfig.cmake",
+    "share/*/cmake/*onfig.cmake",
+    "*/cmake/*onfig.cmake",
+    "cmake/*onfig.cmake",
+    "*onfig.cmake",
+)
 
 
-def make_cmake_files(project_config, cmake_args, dependencies, cetmodules4, view_path):
-    cmake_develop(project_config, cmake_args)
-    cmake_lists(project_config, dependencies, cetmodules4)
-    cmake_presets(project_config, dependencies, cetmodules4, view_path)
+def find_package_hints(prefixes):
+    """Return <Name>_DIR cache variables for the CMake config files installed in prefixes.
+
+    Pointing find_package directly at the config-file directory of each dependency
+    avoids searching the (large) environment view for every package lookup.
+    """
+    hints = {}
+    for prefix in prefixes:
+        prefix = Path(prefix)
+        if not prefix.is_dir():
+            continue
+        for pattern in _CONFIG_FILE_GLOBS:
+            for config_file in sorted(prefix.glob(pattern)):
+                match = _CONFIG_FILE_PATTERN.match(config_file.name)
+                if not match:
+                    continue
+                name = match["name"]
+                # Lower-case config files do not reveal the case of the package name, which
+                # is usually that of the directory the file is installed in.
+                directory = config_file.parent
+                if directory.name.lower() == "cmake":
+                    directory = directory.parent
+                if name.islower() and directory.name.lower() == name:
+                    name = directory.name
+                hints.setdefault(f"{name}_DIR", {"type": "PATH", "value": str(config_file.parent)})
+    return hints
+
+
+def installed_root_prefixes(env):
+    return [s.prefix for _, s in env.concretized_specs() if s.installed]
+
+
+def update_find_package_hints(project_config, env):
+    """Add find_package hints for the environment's installed root specs to the presets.
+
+    Variables already set (e.g. from a dependency's presets) are left untouched.
+    Returns True if the presets file changed.
+    """
+    presets_file = Path(project_config["source"]) / "CMakePresets.json"
+    if not presets_file.exists():
+        return False
+
+    presets = json.loads(presets_file.read_text())
+    cache_variables = presets["configurePresets"][0]["cacheVariables"]
+    for key, value in find_package_hints(installed_root_prefixes(env)).items():
+        cache_variables.setdefault(key, value)
+    return write_if_changed(presets_file, json.dumps(presets, indent=4))
 
 
 def no_dependents(packages):
@@ -321,19 +477,24 @@ def toposort_packages(packages):
     return reversed(L)  # We want the lowest-level packages first
 
 
-def ordered_roots(env, package_requirements):
+def developed_dependencies(env, package_requirements):
+    """Map each developed package to the developed packages it (transitively) depends on."""
     packages = list(package_requirements.keys())
+    return {
+        s.name: [d.name for d in s.traverse(order="topo", root=False) if d.name in packages]
+        for s in env.all_specs()
+        if s.name in package_requirements
+    }
+
 
+def ordered_roots(env, package_requirements):
     # Build comparison table with parent < child represented as the pair (parent, child)
-    parent_children = {}
-    install_prefixes = {}
-    for s in env.all_specs():
-        if s.name not in package_requirements:
-            continue
-        parent_children[s.name] = [
-            d.name for d in s.traverse(order="topo", root=False) if d.name in packages
-        ]
-        install_prefixes[s.name] = (s.name, s.dag_hash(), s.prefix)
+    parent_children = developed_dependencies(env, package_requirements)
+    install_prefixes = {
+        s.name: (s.name, s.dag_hash(), s.prefix)
+        for s in env.all_specs()
+        if s.name in package_requirements
+    }
 
     sorted_packages = toposort_packages(parent_children)
     return [install_prefixes[p] for p in sorted_packages]
@@ -462,13 +623,16 @@ def prepare_package_requirements(project_config):
     packages_with_overrides = {f"{key}:": value for key, value in packages.items()}
 
     package_requirements = copy.deepcopy(packages_with_overrides)
+    project_targets = targets.project_targets(project_config)
+    for requirements in package_requirements.values():
+        requirements["target"] = [project_targets["develop"]]
     package_requirements.update(project_config["dependencies"])
 
     # Build the "all" configuration
     all_config = {
         "providers": {"libc": ["glibc"], "zlib-api:": ["zlib"]},
         "variants": ["generator=ninja"],
-        "target": ["x86_64_v3"],
+        "target": [project_targets["dependencies"]],
     }
 
     package_requirements["all"] = all_config
@@ -812,6 +976,8 @@ def handle_installation(project_config, env, packages, yes_to_all, compiler_syml
             development_env, local_env_dir, "py-tensorflow", "set", "TENSORFLOW_DIR", "tensorflow"
         )
         _add_env_var_prepend_paths(project_config)
+        # Dependencies installed just now can also be found directly
+        update_find_package_hints(project_config, development_env)
         update(project_config, status="ready")
         tty.msg(
             f"{bold(name)} is ready for development (e.g type {cyan('spack mpd build ...')})\n"
@@ -826,6 +992,7 @@ def concretize_project(project_config, yes_to_all):
     # Fail before spending time in the solver--a package with no develop version
     # cannot satisfy the "@develop" requirement MPD imposes on cloned sources.
     verify_develop_versions(packages)
+    linking.validate(project_config)
 
     print()
     tty.msg(cyan("Determining dependencies") + " (this may take a few minutes)")
@@ -847,13 +1014,33 @@ def concretize_project(project_config, yes_to_all):
     tty.info(cyan("Creating local development environment"))
 
     first_order_deps, cetmodules4 = collect_first_order_dependencies(env, packages, project_config)
-    make_cmake_files(
+    fetch_variables = None
+    if cetmodules4 and "cetmodules" not in packages:
+        cetmodules_spec = next((s for s in env.all_specs() if s.name == "cetmodules"), None)
+        fetch_variables = fetch_cache.cetmodules_cache_variables(project_config, cetmodules_spec)
+    dependencies = ordered_roots(env, packages)
+    view_path = Path(env.view_path_default)
+
+    # Recorded for 'spack mpd build --affected', which rebuilds the dependents of changed packages
+    project_config["package_dependencies"] = developed_dependencies(env, packages)
+    env = finalize_environment(project_config, packages, first_order_deps)
+    targets.report_mismatched_dependencies(
+        project_config, [s for s in env.all_specs() if s.installed]
+    )
+
+    # The presets include the find_package hints so that they are written at most once
+    changed_files = make_cmake_files(
         project_config,
         cmake_args,
-        ordered_roots(env, packages),
+        dependencies,
         cetmodules4,
-        Path(env.view_path_default),
+        view_path,
+        fetch_variables,
+        find_package_hints(installed_root_prefixes(env)),
     )
+    if changed_files:
+        tty.info(gray("Updated generated files: " + ", ".join(changed_files)))
+    else:
+        tty.info(gray("Generated CMake files are unchanged"))
 
-    env = finalize_environment(project_config, packages, first_order_deps)
     handle_installation(project_config, env, packages, yes_to_all, compiler_symlinks_dir)
@@ -29,7 +29,7 @@ except ImportError:
     PATH.repos
     from spack_repo.builtin.build_systems.cmake import CMakePackage
 
-from . import init
+from . import init, linking, options, targets, unity_pch
 from .spack_compat import active_environment, tty
 from .util import cyan, gray, green, magenta, spack_cmd_line, yellow
 
@@ -71,6 +71,45 @@ def selected_projects_dir():
     return init.mpd_selected_projects_dir(mpd_config_dir())
 
 
+def project_data_dir(project_name):
+    """Directory for data MPD keeps about a project (e.g. build timings).
+
+    Unlike the project's build directory, it survives 'spack mpd zap'.
+    """
+    path = init.projects_data_dir(mpd_config_dir()) / project_name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def default_build_type(project_config):
+    """Build type set by the project's 'build_type' variant."""
+    return project_config.get("build_type", {}).get("value", options.DEFAULT_BUILD_TYPE)
+
+
+def build_type_config(project_config, build_type=None):
+    """Return the project configuration for working in the build area of build_type.
+
+    The project's default build type is built directly in the project's build
+    directory; other build types are built in subdirectories named after them.
+    """
+    if build_type is None or build_type == default_build_type(project_config):
+        return project_config
+    config = dict(project_config)
+    config["build"] = str(Path(project_config["build"]) / build_type)
+    config["configuration"] = build_type
+    return config
+
+
+def configured_build_types(project_config):
+    """Build types other than the default for which a build area has been configured."""
+    build_path = Path(project_config["build"])
+    return [
+        build_type
+        for build_type in options.BUILD_TYPES
+        if (build_path / build_type / "CMakeCache.txt").exists()
+    ]
+
+
 def selected_projects():
     projects = {}
     for sp in selected_projects_dir().iterdir():
@@ -387,6 +426,10 @@ def apply_project_defaults(project_cfg, general_variant_map, variants):
     elif "cxxstd" not in project_cfg:
         project_cfg["cxxstd"] = _DEFAULT_CXXSTD
 
+    # Build type, which is also applied to each package with a 'build_type' variant
+    if "build_type" in general_variant_map:
+        project_cfg["build_type"] = general_variant_map["build_type"]
+
     # Generator
     if "generator" in general_variant_map:
         generator_variant = general_variant_map.pop("generator")
@@ -523,7 +566,9 @@ def build_dependency_requirements(dependency_variant_map, virtual_dependencies,
     return dependency_requirements
 
 
-def handle_variants(project_cfg, variants, dependencies=None, env_var_prepends=None):
+def handle_variants(
+    project_cfg, variants, dependencies=None, env_var_prepends=None, build_options=None
+):
     """
     Process variants and dependencies, updating project configuration.
 
@@ -531,6 +576,7 @@ def handle_variants(project_cfg, variants, dependencies=None, env_var_prepends=N
         project_cfg: Project configuration dictionary
         variants: List of general variant strings (positional args)
         dependencies: List of dependency spec strings (from --dependency flag)
+        build_options: Build options specified on the command line (see options.py)
 
     Returns:
         Updated project_cfg dictionary
@@ -587,6 +633,9 @@ def handle_variants(project_cfg, variants, dependencies=None, env_var_prepends=N
         project_cfg["env_var_prepend"] = parse_env_var_prepends(env_var_prepends)
     elif "env_var_prepend" not in project_cfg:
         project_cfg["env_var_prepend"] = []
+    if build_options:
+        project_cfg.update(build_options)
+    unity_pch.normalize_exclusions(project_cfg)
 
     return project_cfg
 
@@ -675,7 +724,8 @@ def project_config_from_args(args):
     if dependencies:
         dependencies = [" ".join(dep_tokens) for dep_tokens in dependencies]
     env_var_prepends = getattr(args, "env_var_prepend", None)
-    return handle_variants(project, args.variants, dependencies, env_var_prepends)
+    build_options = options.build_options_from_args(args)
+    return handle_variants(project, args.variants, dependencies, env_var_prepends, build_options)
 
 
 def mpd_project_exists(project_name):
@@ -720,7 +770,13 @@ def update(project_config, status=None, installed_at=None):
         shutil.copy(f.name, config_file)
 
 
-def refresh(project_name, new_variants, new_dependencies=None, new_env_var_prepends=None):
+def refresh(
+    project_name,
+    new_variants,
+    new_dependencies=None,
+    new_env_var_prepends=None,
+    new_build_options=None,
+):
     config_file = mpd_config_file()
     if config_file.exists():
         with open(config_file, "r") as f:
@@ -736,7 +792,7 @@ def refresh(project_name, new_variants, new_dependencies=None, new_env_var_prepe
 
     prepare_project_directories(top_path, srcs_path)
     config["projects"][project_name] = handle_variants(
-        project_cfg, new_variants, new_dependencies, new_env_var_prepends
+        project_cfg, new_variants, new_dependencies, new_env_var_prepends, new_build_options
     )
     with NamedTemporaryFile() as f:
         syaml.dump(config, stream=f)
@@ -847,6 +903,10 @@ def selected_project_config():
     return project_config(selected_project())
 
 
+def _excluded_packages(packages):
+    return gray(f" (except {', '.join(packages)})") if packages else ""
+
+
 def print_config_info(config):
     print("\n  Project directories:")
     print(f"    {cyan('top')}     {config['top']}")
@@ -873,6 +933,55 @@ def print_config_info(config):
     if len(ignored_packages):
         print("\n    *" + gray("ignored: repository not registered as a CMake package with Spack"))
 
+    build_type = default_build_type(config)
+    other_build_types = [bt for bt in configured_build_types(config) if bt != build_type]
+    build_type_line = f"\n  Build type:\n    {cyan(build_type)}"
+    if other_build_types:
+        build_type_line += gray(f" (also configured: {', '.join(other_build_types)})")
+    print(build_type_line)
+
+    project_targets = targets.project_targets(config)
+    print(
+        f"\n  Targets:\n    {cyan(project_targets['develop'])}"
+        + gray(" (developed packages), ")
+        + cyan(project_targets["dependencies"])
+        + gray(" (dependencies)")
+    )
+
+    link = linking.project_settings(config)
+    if link:
+        print(f"\n  Linking:\n    {cyan(linking.describe(link))}")
+
+    unity = config.get("unity")
+    if unity:
+        print(
+            "\n  Unity builds:\n    "
+            + cyan(f"batch size {unity['batch_size']}")
+            + _excluded_packages(unity["exclude"])
+        )
+
+    pch = config.get("pch")
+    if pch:
+        print(
+            f"\n  Precompiled headers:\n    {cyan('shared across developed packages')}"
+            + _excluded_packages(pch["exclude"])
+        )
+
+    compiler_cache = config.get("compiler_cache")
+    if compiler_cache:
+        print(
+            f"\n  Compiler cache:\n    {cyan(compiler_cache['tool'])}"
+            + gray(f" (maximum size {compiler_cache['max_size']})")
+        )
+
+    if config.get("test_cache"):
+        print(f"\n  Test results:\n    {cyan('cached for passing tests with unchanged inputs')}")
+
+    job_memory = config.get("job_memory")
+    if job_memory:
+        memory = ", ".join(f"{kind} {gb:g} GB" for kind, gb in job_memory.items())
+        print(f"\n  Memory per build job:\n    {cyan(memory)}")
+
     env = config["env"]
     if env:
         print(f"\n  Reusing dependencies from environment:\n    {green(env)}")
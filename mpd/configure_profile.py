@@ -0,0 +1,148 @@
+import json
+from pathlib import Path
+
+from .build_report import SUPERBUILD, format_duration
+from .spack_compat import tty
+from .util import bold, gray, magenta
+
+CONFIGURE_TRACE = "mpd-configure-trace.json"
+
+# Commands whose time is reported separately; nested calls of the same command
+# (e.g. find_package calls made by a package's config file) count toward the outermost.
+PROFILED_COMMANDS = ("find_package", "try_compile", "execute_process")
+
+
+def trace_path(build_area):
+    return Path(build_area) / CONFIGURE_TRACE
+
+
+def profiling_arguments(build_area):
+    return ["--profiling-format=google-trace", f"--profiling-output={trace_path(build_area)}"]
+
+
+class Call:
+    """One profiled CMake command invocation, with its duration (in seconds)."""
+
+    def __init__(self, package, command, arguments, location, duration):
+        self.package = package
+        self.command = command
+        self.arguments = arguments
+        self.location = location
+        self.duration = duration
+
+
+def parse_trace(events, packages):
+    """Return the calls of the profiled commands and the configure time of each package.
+
+    CMake's google-trace profile records the beginning and end of each command as
+    separate events.  The time of a develop(<package>) call, which adds the package's
+    subdirectory, is attributed to that package; everything else is attributed to
+    the superbuild.
+    """
+    calls = []
+    package_seconds = {}
+    stack = []
+    first = last = None
+    for event in events:
+        phase = event.get("ph")
+        if phase == "B":
+            args = event.get("args", {})
+            function_args = args.get("functionArgs", "")
+            name = event.get("name", "").lower()
+            outer_package = stack[-1]["package"] if stack else SUPERBUILD
+            package = outer_package
+            if name == "develop" and function_args.split()[:1] and outer_package == SUPERBUILD:
+                candidate = function_args.split()[0]
+                if candidate in packages:
+                    package = candidate
+            stack.append(
+                dict(
+                    name=name,
+                    args=function_args,
+                    location=args.get("location", ""),
+                    package=package,
+                    starts_package=package != outer_package,
+                    ts=event["ts"],
+                )
+            )
+            first = event["ts"] if first is None else first
+        elif phase == "E" and stack:
+            begin = stack.pop()
+            duration = (event["ts"] - begin["ts"]) / 1e6
+            last = event["ts"]
+            if begin["starts_package"]:
+                package_seconds[begin["package"]] = (
+                    package_seconds.get(begin["package"], 0.0) + duration
+                )
+            if begin["name"] in PROFILED_COMMANDS and not any(
+                outer["name"] == begin["name"] for outer in stack
+            ):
+                calls.append(
+                    Call(
+                        begin["package"], begin["name"], begin["args"], begin["location"], duration
+                    )
+                )
+
+    total = (last - first) / 1e6 if first is not None and last is not None else 0.0
+    package_seconds[SUPERBUILD] = max(0.0, total - sum(package_seconds.values()))
+    return calls, package_seconds, total
+
+
+def summarize(calls, package_seconds):
+    """Return rows (package, seconds, {command: seconds}) ranked by configure time."""
+    per_command = {}
+    for call in calls:
+        commands = per_command.setdefault(call.package, {})
+        commands[call.command] = commands.get(call.command, 0.0) + call.duration
+    return sorted(
+        (
+            (package, seconds, per_command.get(package, {}))
+            for package, seconds in package_seconds.items()
+        ),
+        key=lambda row: row[1],
+        reverse=True,
+    )
+
+
+def print_profile(project_config, top=15):
+    path = trace_path(project_config["build"])
+    try:
+        events = json.loads(path.read_text())
+    except (OSError, ValueError):
+        tty.warn(f"Could not read the CMake configure profile {path}")
+        return
+
+    from .build import source_directories
+
+    packages = set(source_directories(project_config))
+    calls, package_seconds, total = parse_trace(events, packages)
+
+    print()
+    tty.msg(
+        f"Configure profile for {bold(project_config['name'])}: "
+        f"{format_duration(total)} "
+        + gray(f"(trace in {path}; open it with chrome://tracing or https://ui.perfetto.dev)")
+    )
+
+    rows = summarize(calls, package_seconds)
+    name_width = max(len(p) for p in [row[0] for row in rows] + ["Package"])
+    header = f"  {'Package':<{name_width}}  {'Time':>9}  {'Share':>6}"
+    header += "".join(f"  {command:>15}" for command in PROFILED_COMMANDS)
+    print("\n" + header)
+    print("  " + "-" * (len(header) - 2))
+    for package, seconds, commands in rows:
+        share = 100 * seconds / total if total else 0
+        line = f"  {magenta(f'{package:<{name_width}}')}  {format_duration(seconds):>9}"
+        line += f"  {share:5.1f}%"
+        line += "".join(
+            f"  {format_duration(commands.get(command)):>15}" for command in PROFILED_COMMANDS
+        )
+        print(line)
+
+    print("\n  Slowest commands:")
+    for call in sorted(calls, key=lambda c: c.duration, reverse=True)[:top]:
+        arguments = call.arguments if len(call.arguments) <= 60 else call.arguments[:57] + "..."
+        print(
+            f"    {format_duration(call.duration):>9}  {call.command}({arguments})"
+            + gray(f"  [{call.package}] {call.location}")
+        )
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import spack.util.git
+
+from . import init
+from .spack_compat import tty
+from .util import gray
+
+CETMODULES_REPOSITORY = "https://github.com/FNALssi/cetmodules"
+CETMODULES_TAG = "8269cc9"
+CETMODULES_VERSION = "4.02.00"
+
+_CMAKE_FILE_SUFFIXES = (".cmake", "CMakeLists.txt")
+
+
+def source_cache_dir():
+    """Sources of FetchContent dependencies shared by all MPD projects, keyed by tag."""
+    return init.cache_dir(init.mpd_config_dir()) / "fetchcontent"
+
+
+def cetmodules_source_dir():
+    return source_cache_dir() / f"cetmodules-{CETMODULES_TAG}"
+
+
+def populate_cetmodules():
+    """Clone the cetmodules sources into the source cache unless already present.
+
+    Returns True if the cache is warm.
+    """
+    target = cetmodules_source_dir()
+    if target.exists():
+        return True
+
+    source_cache_dir().mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".cetmodules-", dir=source_cache_dir()))
+    git = spack.util.git.git(required=True)
+    error = git(
+        "clone",
+        "--quiet",
+        "--no-checkout",
+        CETMODULES_REPOSITORY,
+        str(staging),
+        fail_on_error=False,
+        error=str,
+    )
+    if git.returncode == 0:
+        git.add_default_arg("-C", str(staging))
+        error = git(
+            "checkout", "--quiet", "--detach", CETMODULES_TAG, fail_on_error=False, error=str
+        )
+
+    if git.returncode != 0:
+        shutil.rmtree(staging, ignore_errors=True)
+        tty.warn(
+            f"Could not cache the cetmodules sources (tag {CETMODULES_TAG}); CMake will fetch"
+            " them when configuring\n" + gray(str(error).strip())
+        )
+        return False
+
+    try:
+        # Another project may have populated the cache concurrently
+        staging.rename(target)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+    return True
+
+
+def declares_fetchcontent(source_path, source_dirs):
+    """Whether any of the developed packages declares FetchContent dependencies itself."""
+    for src in source_dirs:
+        for root, dirs, files in os.walk(Path(source_path) / src):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                if not name.endswith(_CMAKE_FILE_SUFFIXES):
+                    continue
+                try:
+                    text = (Path(root) / name).read_text(errors="ignore")
+                except OSError:
+                    continue
+                if "FetchContent_Declare" in text:
+                    return True
+    return False
+
+
+def cetmodules_cache_variables(project_config, cetmodules_spec=None):
+    """CMake cache variables that avoid fetching cetmodules over the network.
+
+    An installed cetmodules of a suitable version is preferred; otherwise the
+    cached sources are used.  When no developed package declares FetchContent
+    dependencies of its own, FetchContent is also fully disconnected.
+    """
+    if cetmodules_spec is not None and cetmodules_spec.satisfies(f"@{CETMODULES_VERSION}:"):
+        return {"cetmodules_ROOT": {"type": "PATH", "value": str(cetmodules_spec.prefix)}}
+
+    if not populate_cetmodules():
+        return {}
+
+    variables = {
+        "FETCHCONTENT_SOURCE_DIR_CETMODULES": {
+            "type": "PATH",
+            "value": str(cetmodules_source_dir()),
+        }
+    }
+    source_dirs = sorted(set(project_config.get("srcs", {}).values()))
+    if not declares_fetchcontent(project_config["source"], source_dirs):
+        variables["FETCHCONTENT_FULLY_DISCONNECTED"] = {"type": "BOOL", "value": "ON"}
+    return variables
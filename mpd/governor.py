@@ -0,0 +1,181 @@
+import fcntl
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import termios
+import threading
+import time
+
+from . import jobs
+from .spack_compat import tty
+from .util import gray
+
+_PRESSURE = "/proc/pressure/memory"
+_GB = 1024**3
+
+# Memory-stall percentages (PSI "some avg10") above which the governor stops granting new
+# tokens, and above which it halves the number of tokens.
+PRESSURE_HOLD = 5.0
+PRESSURE_SHED = 20.0
+
+_MIN_VERSIONS = {"make": (4, 4), "ninja": (1, 13)}
+
+
+def parse_pressure(text):
+    """Return the 'some avg10' value of a /proc/pressure file."""
+    match = re.search(r"^some avg10=([\d.]+)", text, re.MULTILINE)
+    return float(match[1]) if match else None
+
+
+def memory_pressure():
+    try:
+        with open(_PRESSURE) as f:
+            return parse_pressure(f.read())
+    except OSError:
+        return None
+
+
+def sample():
+    return jobs.available_memory(), memory_pressure()
+
+
+def unconstrained():
+    """Sampler for builds that are governed only by a slot lease."""
+    return None, None
+
+
+def target_tokens(in_use, available, pressure, job_memory_gb, max_tokens, current):
+    """Number of job tokens the jobserver should hold, given the current system state.
+
+    Every running job holds a token except the one the client implicitly owns.  New
+    tokens are granted for each job that fits in the available memory; growth is
+    limited per step because the memory of freshly started jobs is not yet visible.
+    """
+    if available is None:
+        return max_tokens
+
+    desired = in_use + math.floor(max(0, available) / (job_memory_gb * _GB))
+    desired = min(desired, current + max(1, max_tokens // 4))
+    if pressure is not None:
+        if pressure >= PRESSURE_SHED:
+            desired = min(desired, in_use // 2)
+        elif pressure >= PRESSURE_HOLD:
+            desired = min(desired, in_use)
+    return max(0, min(max_tokens, desired))
+
+
+def _version(executable):
+    result = subprocess.run([executable, "--version"], capture_output=True, text=True)
+    match = re.search(r"(\d+)\.(\d+)", result.stdout)
+    return (int(match[1]), int(match[2])) if match else None
+
+
+def supports_fifo_jobserver(generator):
+    """Whether the generator's build tool takes job tokens from a FIFO jobserver."""
+    executable = shutil.which(generator)
+    if not executable:
+        return False
+    version = _version(executable)
+    return version is not None and version >= _MIN_VERSIONS[generator]
+
+
+class Governor:
+    """GNU make jobserver whose number of job tokens follows the memory of the node.
+
+    While the governor is active, MAKEFLAGS points the build tool (GNU make 4.4 or
+    ninja 1.13 and newer) to a FIFO containing the job tokens.  A background thread
+    samples the available memory and the memory pressure, adds tokens to the FIFO
+    when memory frees up, and withdraws tokens as jobs return them under pressure.
+    Each sample is written to log_path.
+
+    If a slot lease is given, the number of jobs is further bounded by the
+    lease's current share of the build slots.
+    """
+
+    def __init__(
+        self, max_jobs, job_memory_gb, log_path, interval=1.0, sampler=sample, lease=None
+    ):
+        self.max_tokens = max(0, max_jobs - 1)
+        self.lease = lease
+        self.job_memory_gb = job_memory_gb
+        self.log_path = log_path
+        self.interval = interval
+        self.sampler = sampler
+        self.tokens = 0
+        self.history = []
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self._dir = tempfile.mkdtemp(prefix="mpd-jobserver-")
+        self.fifo = os.path.join(self._dir, "fifo")
+        os.mkfifo(self.fifo, 0o600)
+        # Opening for reading and writing neither blocks nor sees EOF when clients close
+        self._fd = os.open(self.fifo, os.O_RDWR | os.O_NONBLOCK)
+        self._log = open(self.log_path, "w")
+        self._log.write("# seconds\tavailable_gb\tpressure\tjobs\ttokens\n")
+        self._start = time.monotonic()
+        self._saved_makeflags = os.environ.get("MAKEFLAGS")
+        os.environ["MAKEFLAGS"] = f" -j{self.max_tokens + 1} --jobserver-auth=fifo:{self.fifo}"
+
+        self.adjust()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if self._saved_makeflags is None:
+            os.environ.pop("MAKEFLAGS", None)
+        else:
+            os.environ["MAKEFLAGS"] = self._saved_makeflags
+        self._log.close()
+        os.close(self._fd)
+        shutil.rmtree(self._dir, ignore_errors=True)
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.adjust()
+
+    def _free_tokens(self):
+        buf = fcntl.ioctl(self._fd, termios.FIONREAD, b"\0\0\0\0")
+        return int.from_bytes(buf, "little")
+
+    def adjust(self):
+        available, pressure = self.sampler()
+        in_use = max(0, self.tokens - self._free_tokens())
+        max_tokens = self.max_tokens
+        if self.lease:
+            max_tokens = min(max_tokens, self.lease.share() - 1)
+        target = target_tokens(
+            in_use, available, pressure, self.job_memory_gb, max_tokens, self.tokens
+        )
+
+        if target > self.tokens:
+            self.tokens += os.write(self._fd, b"+" * (target - self.tokens))
+        elif target < self.tokens:
+            # Only tokens not held by running jobs can be withdrawn
+            try:
+                self.tokens -= len(os.read(self._fd, self.tokens - target))
+            except BlockingIOError:
+                pass
+
+        elapsed = time.monotonic() - self._start
+        available_gb = f"{available / _GB:.2f}" if available is not None else "-"
+        pressure_str = f"{pressure:.2f}" if pressure is not None else "-"
+        self._log.write(
+            f"{elapsed:.1f}\t{available_gb}\t{pressure_str}\t{in_use + 1}\t{self.tokens}\n"
+        )
+        self._log.flush()
+        self.history.append(self.tokens)
+
+    def summary(self):
+        low, high = min(self.history) + 1, max(self.history) + 1
+        tty.msg(
+            f"Build governor allowed between {low} and {high} parallel jobs "
+            + gray(f"(timeline in {self.log_path})")
+        )
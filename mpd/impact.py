@@ -0,0 +1,369 @@
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+from collections import deque
+from pathlib import Path
+
+from . import jobs
+from .build_report import (
+    SUPERBUILD,
+    format_duration,
+    ninja_graph,
+    package_for,
+    read_history,
+    recorded_durations,
+)
+from .config import build_type_config, selected_project_config
+from .options import add_build_type_option
+from .preconditions import State, activate_development_environment, preconditions
+from .spack_compat import tty
+from .util import bold, cyan, gray, magenta
+
+SUBCOMMAND = "impact"
+
+INDEX_FILE = ".mpd-impact-index.json"
+_INDEX_VERSION = 1
+
+_DEPS_HEADER = re.compile(r"^(?P<output>\S.*): #deps \d+")
+_COMPILE_SUFFIXES = (".o", ".obj", ".gch", ".pch")
+_LIBRARY = re.compile(r"\.(so(\.\d+)*|dylib|a)$")
+
+
+def setup_subparser(subparsers):
+    impact_description = """report what a build would redo if the given files changed
+
+The answer is computed from the dependencies recorded in the build area
+by the most recent build (ninja's dependency log, or the dependency files
+of the make generator).  Rebuild times are estimated from the durations
+that ninja recorded for each target."""
+    impact = subparsers.add_parser(
+        SUBCOMMAND, description=impact_description, help="report the rebuild impact of files"
+    )
+    add_build_type_option(impact)
+    impact.add_argument(
+        "--list", action="store_true", help="list the targets that would be rebuilt"
+    )
+    impact.add_argument("files", metavar="<file>", nargs="+", help="source or header file")
+
+
+def _normalize(path, base):
+    return os.path.normpath(os.path.join(base, path))
+
+
+def parse_ninja_deps(text):
+    """Map each output listed by 'ninja -t deps' to the dependencies recorded for it."""
+    deps = {}
+    current = None
+    for line in text.splitlines():
+        header = _DEPS_HEADER.match(line)
+        if header:
+            current = deps.setdefault(header["output"], [])
+        elif line.startswith("    ") and current is not None:
+            current.append(line.strip())
+        elif not line.strip():
+            current = None
+    return deps
+
+
+def ninja_dependencies(build_area):
+    """Map each output of a ninja build area to its explicit and discovered inputs."""
+    inputs = ninja_graph(build_area)
+    if inputs is None:
+        return None
+    result = subprocess.run(
+        [shutil.which("ninja"), "-C", str(build_area), "-t", "deps"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode == 0:
+        for output, deps in parse_ninja_deps(result.stdout).items():
+            inputs.setdefault(output, set()).update(deps)
+    return {
+        _normalize(output, build_area): {_normalize(i, build_area) for i in output_inputs}
+        for output, output_inputs in inputs.items()
+    }
+
+
+def parse_depfile(text):
+    """Return the (target, prerequisites) rules of a Makefile-style dependency file."""
+    rules = []
+    for rule in text.replace("\\\n", " ").splitlines():
+        target, sep, prerequisites = rule.partition(": ")
+        if sep and target.strip():
+            rules.append((target.strip(), prerequisites.split()))
+    return rules
+
+
+def parse_link_command(line, directory):
+    """Return the output and the inputs of a link (or archive) command run in directory."""
+    try:
+        tokens = shlex.split(line)
+    except ValueError:
+        return None, []
+    if not tokens:
+        return None, []
+    if "-o" in tokens[:-1]:
+        output = tokens[tokens.index("-o") + 1]
+    elif Path(tokens[0]).name.endswith("ar") and len(tokens) > 2:
+        output = tokens[2]
+    else:
+        return None, []
+    inputs = [
+        _normalize(t, directory)
+        for t in tokens[1:]
+        if t != output and not t.startswith("-") and (t.endswith(".o") or _LIBRARY.search(t))
+    ]
+    return _normalize(output, directory), inputs
+
+
+def make_dependencies(build_area):
+    """Map each output of a make build area to its inputs, using the dependency files of
+    the compilations and the link commands of the targets."""
+    build_area = Path(build_area)
+    inputs = {}
+    for root, dirs, files in os.walk(build_area):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for f in files:
+            path = Path(root) / f
+            if f.endswith(".o.d"):
+                for target, prerequisites in parse_depfile(path.read_text(errors="replace")):
+                    inputs.setdefault(_normalize(target, build_area), set()).update(
+                        _normalize(p, build_area) for p in prerequisites
+                    )
+            elif f == "link.txt":
+                # Link commands run in the build directory of the target's CMake directory
+                directory = path.parent.parent.parent
+                for line in path.read_text(errors="replace").splitlines():
+                    output, link_inputs = parse_link_command(line, directory)
+                    if output:
+                        inputs.setdefault(output, set()).update(link_inputs)
+    return inputs
+
+
+def _fingerprint_files(build_area, generator):
+    build_area = Path(build_area)
+    if generator == "ninja":
+        return [build_area / name for name in ("build.ninja", ".ninja_deps", ".ninja_log")]
+    files = [build_area / "Makefile"]
+    for root, dirs, names in os.walk(build_area):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        files.extend(Path(root) / n for n in names if n.endswith(".o.d") or n == "link.txt")
+    return files
+
+
+def fingerprint(build_area, generator):
+    """Identify the state of the build area's dependency information."""
+    stats = []
+    for path in _fingerprint_files(build_area, generator):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        stats.append((stat.st_mtime_ns, stat.st_size))
+    return [len(stats), list(max(stats, default=(0, 0))), sum(size for _, size in stats)]
+
+
+class Index:
+    """Reverse dependencies of a build area: the outputs that consume each file."""
+
+    def __init__(self, paths, consumers, durations):
+        self.paths = paths
+        self.consumers = consumers
+        self.durations = durations
+        self.ids = {path: i for i, path in enumerate(paths)}
+
+    @classmethod
+    def from_dependencies(cls, inputs, durations):
+        paths = sorted(set(inputs).union(*inputs.values()))
+        ids = {path: i for i, path in enumerate(paths)}
+        consumers = {}
+        for output, output_inputs in inputs.items():
+            for i in output_inputs:
+                consumers.setdefault(ids[i], []).append(ids[output])
+        durations = {ids[path]: seconds for path, seconds in durations.items() if path in ids}
+        return cls(paths, consumers, durations)
+
+    def to_json(self):
+        return dict(
+            paths=self.paths,
+            consumers={str(i): sorted(c) for i, c in self.consumers.items()},
+            durations={str(i): d for i, d in self.durations.items()},
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data["paths"],
+            {int(i): c for i, c in data["consumers"].items()},
+            {int(i): d for i, d in data["durations"].items()},
+        )
+
+    def lookup(self, file):
+        """Return the index of file, or None if no output depends on it."""
+        for candidate in (os.path.abspath(file), os.path.realpath(file)):
+            i = self.ids.get(os.path.normpath(candidate))
+            if i is not None and i in self.consumers:
+                return i
+        return None
+
+    def affected(self, files):
+        """Return the outputs that would be rebuilt if files changed."""
+        queue = deque(i for i in (self.lookup(f) for f in files) if i is not None)
+        seen = set()
+        while queue:
+            for consumer in self.consumers.get(queue.popleft(), ()):
+                if consumer not in seen:
+                    seen.add(consumer)
+                    queue.append(consumer)
+        return sorted(self.paths[i] for i in seen)
+
+    def duration(self, path):
+        return self.durations.get(self.ids[path])
+
+
+def build_index(build_area, generator):
+    if generator == "ninja":
+        inputs = ninja_dependencies(build_area)
+        if inputs is None:
+            tty.die("Could not read the build graph with 'ninja -t graph'")
+        log = Path(build_area) / ".ninja_log"
+        durations = recorded_durations(log) if log.exists() else {}
+        durations = {_normalize(o, build_area): d for o, d in durations.items()}
+        # Phony outputs (e.g. <package>/all) are not rebuilt
+        inputs = {o: i for o, i in inputs.items() if o in durations or os.path.exists(o)}
+    else:
+        inputs = make_dependencies(build_area)
+        durations = {}
+    return Index.from_dependencies(inputs, durations)
+
+
+def load_index(project_config):
+    """Return the index of the project's build area, rebuilding it after each build."""
+    build_area = Path(project_config["build"])
+    generator = project_config["generator"]["value"]
+    index_path = build_area / INDEX_FILE
+    current = fingerprint(build_area, generator)
+    try:
+        data = json.loads(index_path.read_text())
+        if data.get("version") == _INDEX_VERSION and data.get("fingerprint") == current:
+            return Index.from_json(data)
+    except (OSError, ValueError):
+        pass
+
+    index = build_index(build_area, generator)
+    index_path.write_text(
+        json.dumps(dict(version=_INDEX_VERSION, fingerprint=current, **index.to_json()))
+    )
+    return index
+
+
+def kind(path):
+    """Classify an output as a compilation ('objects'), a link ('links'), or 'other'."""
+    if path.endswith(_COMPILE_SUFFIXES):
+        return "objects"
+    name = Path(path).name
+    if _LIBRARY.search(name) or "." not in name:
+        return "links"
+    return "other"
+
+
+def summarize(index, outputs, build_area, packages):
+    """Count the outputs and their recorded durations per package and kind."""
+    per_package = {}
+    for output in outputs:
+        package = package_for(output, build_area, packages)
+        totals = per_package.setdefault(
+            package, dict(objects=0, links=0, other=0, seconds=0.0, untimed=0)
+        )
+        totals[kind(output)] += 1
+        seconds = index.duration(output)
+        if seconds is None:
+            totals["untimed"] += 1
+        else:
+            totals["seconds"] += seconds
+    return per_package
+
+
+def _average_step_seconds(project_name):
+    """Average duration of the targets rebuilt by recorded builds, if any were recorded."""
+    entries = read_history(project_name)
+    targets = sum(e["targets"] for e in entries)
+    return sum(e["cpu"] for e in entries) / targets if targets else None
+
+
+def print_impact(project_config, files, list_outputs=False):
+    build_area = Path(project_config["build"])
+    index = load_index(project_config)
+
+    unknown = [f for f in files if index.lookup(f) is None]
+    for f in unknown:
+        tty.warn(f"No target of the build area depends on {bold(f)}")
+    outputs = index.affected(files)
+    if not outputs:
+        tty.msg("Nothing would be rebuilt")
+        return
+
+    from .build import source_directories
+
+    per_package = summarize(index, outputs, build_area, set(source_directories(project_config)))
+    untimed = sum(t["untimed"] for t in per_package.values())
+    average = _average_step_seconds(project_config["name"]) if untimed else None
+    if average is not None:
+        for totals in per_package.values():
+            totals["seconds"] += totals["untimed"] * average
+
+    objects = sum(t["objects"] for t in per_package.values())
+    links = sum(t["links"] for t in per_package.values())
+    print()
+    tty.msg(
+        f"Changing {len(files) - len(unknown)} file(s) would rebuild {cyan(str(objects))} objects"
+        f" and relink {cyan(str(links))} targets in {len(per_package)} package(s):"
+    )
+    name_width = max(len(p) for p in list(per_package) + ["Package"])
+    print(f"\n  {'Package':<{name_width}}  {'Objects':>7}  {'Links':>5}  {'Other':>5}  Estimate")
+    print("  " + "  ".join("-" * width for width in (name_width, 7, 5, 5, 9)))
+    for package, totals in sorted(
+        per_package.items(), key=lambda item: (item[0] == SUPERBUILD, -item[1]["seconds"])
+    ):
+        print(
+            f"  {magenta(f'{package:<{name_width}}')}  {totals['objects']:>7}"
+            f"  {totals['links']:>5}  {totals['other']:>5}"
+            f"  {format_duration(totals['seconds']):>9}"
+        )
+
+    cpu = sum(t["seconds"] for t in per_package.values())
+    parallel = jobs.default_parallelism(project_config)
+    longest = max((index.duration(o) or 0.0 for o in outputs), default=0.0)
+    print(
+        f"\n  Estimated rebuild time: {cyan(format_duration(max(cpu / parallel, longest)))}"
+        f" with {parallel} parallel jobs" + gray(f" ({format_duration(cpu)} of CPU time)")
+    )
+    if untimed:
+        note = f"no duration was recorded for {untimed} of the {len(outputs)} targets"
+        if average is not None:
+            note += f"; the average of recorded builds ({format_duration(average)}) is used"
+        print(gray(f"  ({note})"))
+
+    if list_outputs:
+        print("\n  Targets to rebuild:")
+        for output in outputs:
+            print(f"    {os.path.relpath(output, build_area)}")
+    print()
+
+
+def process(args):
+    preconditions(State.INITIALIZED, State.SELECTED_PROJECT, State.PACKAGES_TO_DEVELOP)
+
+    config = build_type_config(selected_project_config(), args.build_type)
+    if not (Path(config["build"]) / "CMakeCache.txt").exists():
+        tty.die(
+            f"The build area {config['build']} has not been built yet\n"
+            f"    (build the project first with {bold('spack mpd build')})"
+        )
+
+    # The ninja executable used to read the dependencies comes from the development environment
+    activate_development_environment(config["local"])
+    print_impact(config, args.files, list_outputs=args.list)
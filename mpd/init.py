@@ -42,6 +42,18 @@ def known_suites_dir(config_dir):
     return config_dir / "known_suites"
 
 
+def cache_dir(config_dir):
+    return config_dir / "cache"
+
+
+def slots_dir(config_dir):
+    return config_dir / "slots"
+
+
+def projects_data_dir(config_dir):
+    return config_dir / "projects"
+
+
 def initialized():
     config_dir = mpd_config_dir()
     config_file = mpd_config_file(mpd_config_dir())
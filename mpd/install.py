@@ -3,7 +3,8 @@ from datetime import datetime
 
 import spack.environment as ev
 
-from .config import selected_project_config, update
+from .config import build_type_config, selected_project_config, update
+from .options import add_build_type_option
 from .preconditions import State, activate_development_environment, preconditions
 from .spack_compat import tty
 from .util import bold, cyan, gray
@@ -13,12 +14,13 @@ ALIASES = ["i"]
 
 
 def setup_subparser(subparsers):
-    subparsers.add_parser(
+    install = subparsers.add_parser(
         SUBCOMMAND,
         description="install (and build if necessary) repositories",
         aliases=ALIASES,
         help="install built repositories",
     )
+    add_build_type_option(install)
 
 
 def process(args):
@@ -27,7 +29,8 @@ def process(args):
     project_config = selected_project_config()
     activate_development_environment(project_config["local"])
 
-    all_arguments = ["cmake", "--install", project_config["build"]]
+    build_area = build_type_config(project_config, args.build_type)["build"]
+    all_arguments = ["cmake", "--install", build_area]
     all_arguments_str = " ".join(all_arguments)
 
     print()
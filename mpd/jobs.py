@@ -0,0 +1,111 @@
+import math
+import os
+
+from .spack_compat import tty
+
+DEFAULT_COMPILE_JOB_MEMORY = 2.0  # GB
+DEFAULT_LINK_JOB_MEMORY = 4.0  # GB
+
+COMPILE_POOL = "mpd_compile"
+LINK_POOL = "mpd_link"
+
+_MEMINFO = "/proc/meminfo"
+_GB = 1024**3
+
+
+def parse_meminfo(text):
+    """Return the /proc/meminfo entries in bytes."""
+    entries = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        fields = value.split()
+        if not fields or not fields[0].isdigit():
+            continue
+        multiplier = 1024 if fields[1:] == ["kB"] else 1
+        entries[key] = int(fields[0]) * multiplier
+    return entries
+
+
+def meminfo():
+    try:
+        with open(_MEMINFO) as f:
+            return parse_meminfo(f.read())
+    except OSError:
+        return {}
+
+
+def total_memory():
+    return meminfo().get("MemTotal")
+
+
+def available_memory():
+    return meminfo().get("MemAvailable")
+
+
+def job_memory(project_config):
+    """Return the estimated memory (in GB) required by each compile and link job."""
+    memory = project_config.get("job_memory") or {}
+    return (
+        memory.get("compile", DEFAULT_COMPILE_JOB_MEMORY),
+        memory.get("link", DEFAULT_LINK_JOB_MEMORY),
+    )
+
+
+def jobs_for_memory(memory, per_job_gb, cpus=None):
+    """Number of jobs of per_job_gb each that fit in memory bytes, bounded by the CPU count."""
+    cpus = cpus or os.cpu_count() or 1
+    if memory is None:
+        return cpus
+    return max(1, min(cpus, math.floor(memory / (per_job_gb * _GB))))
+
+
+def job_pools(project_config, memory=None):
+    """Return the sizes of the compile and link job pools for the node's total memory."""
+    memory = memory if memory is not None else total_memory()
+    if memory is None:
+        return None
+
+    compile_memory, link_memory = job_memory(project_config)
+    return {
+        COMPILE_POOL: jobs_for_memory(memory, compile_memory),
+        LINK_POOL: jobs_for_memory(memory, link_memory),
+    }
+
+
+def job_pool_cache_variables(project_config):
+    """CMake cache variables that assign compilations and links to memory-sized Ninja pools."""
+    if project_config["generator"]["value"] != "ninja":
+        return {}
+
+    pools = job_pools(project_config)
+    if not pools:
+        return {}
+
+    return {
+        "CMAKE_JOB_POOLS": {
+            "type": "STRING",
+            "value": ";".join(f"{name}={size}" for name, size in pools.items()),
+        },
+        "CMAKE_JOB_POOL_COMPILE": {"type": "STRING", "value": COMPILE_POOL},
+        "CMAKE_JOB_POOL_LINK": {"type": "STRING", "value": LINK_POOL},
+    }
+
+
+def default_parallelism(project_config):
+    """Number of parallel jobs used when 'spack mpd build' is invoked without -j.
+
+    The number of compile jobs that fit in the currently available memory,
+    bounded by the number of CPUs.
+    """
+    compile_memory, _ = job_memory(project_config)
+    return jobs_for_memory(available_memory(), compile_memory)
+
+
+def parse_job_memory(value):
+    try:
+        memory = float(value)
+    except ValueError:
+        memory = 0
+    if not math.isfinite(memory) or memory <= 0:
+        tty.die(f"Invalid job memory '{value}' (expected a positive number of GB)")
+    return memory
@@ -0,0 +1,191 @@
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from .spack_compat import tty
+from .util import bold, gray
+
+LINKERS = ("lld", "mold", "gold")
+LTO_MODES = ("thin", "full")
+
+_LANGUAGES = ("c", "cxx")
+_PROBE_SOURCES = {"c": "probe.c", "cxx": "probe.cc"}
+_LINKER_FLAG_VARIABLES = (
+    "CMAKE_EXE_LINKER_FLAGS",
+    "CMAKE_SHARED_LINKER_FLAGS",
+    "CMAKE_MODULE_LINKER_FLAGS",
+)
+
+
+def settings(linker=None, split_dwarf=None, lto=None, current=None):
+    """Link settings of the project, with unspecified settings keeping their current values.
+
+    The values 'default' (for linker) and 'none' (for lto) remove the setting.
+    """
+    result = dict(current or {})
+    if linker:
+        result["linker"] = None if linker == "default" else linker
+    if split_dwarf is not None:
+        result["split_dwarf"] = split_dwarf
+    if lto:
+        result["lto"] = None if lto == "none" else lto
+    return {key: value for key, value in result.items() if value}
+
+
+def project_settings(project_config):
+    return project_config.get("link") or {}
+
+
+def describe(link):
+    """Short description of the link settings (e.g. 'mold, split DWARF, thin LTO')."""
+    parts = [link.get("linker") or "default linker"]
+    if link.get("split_dwarf"):
+        parts.append("split DWARF")
+    if link.get("lto"):
+        parts.append(f"{link['lto']} LTO")
+    return ", ".join(parts)
+
+
+def _compiler(project_config):
+    """Return the language and path of the compiler used to link the developed packages."""
+    compiler_paths = project_config["compiler_paths"]
+    for lang in reversed(_LANGUAGES):
+        if lang in project_config["languages"] and compiler_paths.get(lang):
+            return lang, compiler_paths[lang]
+    return None, None
+
+
+def compiler_family(compiler):
+    """Return 'gcc' or 'clang' according to the version string of the compiler."""
+    try:
+        result = subprocess.run([compiler, "--version"], capture_output=True, text=True)
+    except OSError:
+        return None
+    version = result.stdout.lower()
+    if "clang" in version:
+        return "clang"
+    if "gcc" in version or "free software foundation" in version:
+        return "gcc"
+    return None
+
+
+def _writes_gdb_index(link):
+    # GNU ld (BFD) cannot write a .gdb_index section
+    return link.get("split_dwarf") and link.get("linker") in LINKERS
+
+
+def compile_flags(link, family):
+    flags = []
+    if link.get("split_dwarf"):
+        flags.append("-gsplit-dwarf")
+    lto = link.get("lto")
+    if lto == "thin":
+        flags.append("-flto=thin")
+    elif lto == "full":
+        flags.append("-flto=auto" if family == "gcc" else "-flto=full")
+    return " ".join(flags)
+
+
+def linker_flags(link):
+    flags = []
+    if link.get("linker"):
+        flags.append(f"-fuse-ld={link['linker']}")
+    if _writes_gdb_index(link):
+        flags.append("-Wl,--gdb-index")
+    return " ".join(flags)
+
+
+def archiver(family, compiler):
+    """Return the archiver and ranlib tools that understand LTO objects, if available."""
+    names = ("gcc-ar", "gcc-ranlib") if family == "gcc" else ("llvm-ar", "llvm-ranlib")
+    tools = [
+        shutil.which(name, path=str(Path(compiler).parent)) or shutil.which(name) for name in names
+    ]
+    return tools if all(tools) else None
+
+
+def _probe(lang, compiler, flags):
+    """Compile and link a trivial program with flags, returning the compiler's error output."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / _PROBE_SOURCES[lang]
+        source.write_text("int main(void) { return 0; }\n")
+        try:
+            result = subprocess.run(
+                [compiler, *flags, str(source), "-o", "probe"],
+                cwd=tmp,
+                capture_output=True,
+                text=True,
+            )
+        except OSError as e:
+            return str(e)
+    return result.stderr.strip() if result.returncode != 0 else None
+
+
+def validate(project_config):
+    """Stop if the project's compiler cannot build with the project's link settings."""
+    link = project_settings(project_config)
+    if not link:
+        return
+    lang, compiler = _compiler(project_config)
+    if compiler is None:
+        return
+    family = compiler_family(compiler)
+    if link.get("lto") == "thin" and family != "clang":
+        tty.die(
+            f"Thin LTO requires a Clang compiler ({bold(compiler)} is not one)\n"
+            + gray("    Select full LTO instead with 'spack mpd refresh --lto full'")
+        )
+
+    # Each setting is checked on its own first, so that a failure names the culprit
+    checks = []
+    if link.get("linker"):
+        checks.append((f"link with {link['linker']}", dict(linker=link["linker"])))
+    if link.get("split_dwarf"):
+        checks.append(("generate split DWARF", dict(split_dwarf=True)))
+    if link.get("lto"):
+        checks.append((f"perform {link['lto']} LTO", dict(lto=link["lto"])))
+    if len(checks) > 1:
+        checks.append(("build with the combined link settings", link))
+
+    for description, checked in checks:
+        flags = f"-O2 -g {compile_flags(checked, family)} {linker_flags(checked)}".split()
+        error = _probe(lang, compiler, flags)
+        if error is not None:
+            tty.die(
+                f"The compiler {bold(compiler)} cannot {description} ({' '.join(flags)}):\n"
+                + gray("\n".join(f"    {line}" for line in error.splitlines()[-5:]))
+            )
+
+
+def cache_variables(project_config, languages_flags):
+    """Return the CMake cache variables that apply the project's link settings.
+
+    languages_flags maps each language to the compiler flags already set for it,
+    with which the flags of the link settings are combined.
+    """
+    link = project_settings(project_config)
+    if not link:
+        return {}
+    _, compiler = _compiler(project_config)
+    family = compiler_family(compiler) if compiler else None
+
+    variables = {}
+    extra_flags = compile_flags(link, family)
+    for lang in _LANGUAGES:
+        if lang in project_config["languages"]:
+            flags = " ".join(f for f in (languages_flags.get(lang), extra_flags) if f)
+            if flags:
+                variables[f"CMAKE_{lang.upper()}_FLAGS"] = {"type": "STRING", "value": flags}
+
+    flags = linker_flags(link)
+    if flags:
+        for name in _LINKER_FLAG_VARIABLES:
+            variables[name] = {"type": "STRING", "value": flags}
+
+    # Static libraries of LTO objects need archives with a symbol index of the LTO objects
+    tools = archiver(family, compiler) if link.get("lto") and compiler else None
+    if tools:
+        variables["CMAKE_AR"] = {"type": "FILEPATH", "value": tools[0]}
+        variables["CMAKE_RANLIB"] = {"type": "FILEPATH", "value": tools[1]}
+    return variables
@@ -4,6 +4,7 @@ import spack.environment as ev
 
 from .concretize import concretize_project
 from .config import mpd_project_exists, print_config_info, project_config_from_args, select, update
+from .options import add_build_options
 from .preconditions import State, preconditions
 from .spack_compat import tty
 from .util import bold, gray, remove_view
@@ -60,6 +61,7 @@ def setup_subparser(subparsers):
         help="prepend colon-separated paths to ENV_VAR for each checked-out package\n"
         "(can be specified multiple times)",
     )
+    add_build_options(new_project)
     new_project.add_argument("variants", nargs="*", help="variants to apply to developed packages")
 
 
@@ -0,0 +1,211 @@
+from . import compiler_cache, jobs, linking, targets, unity_pch
+
+BUILD_TYPES = ("Debug", "Release", "RelWithDebInfo", "MinSizeRel")
+DEFAULT_BUILD_TYPE = "RelWithDebInfo"
+
+
+def add_build_options(parser):
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument(
+        "--compiler-cache",
+        choices=compiler_cache.TOOLS + ("none",),
+        help="compiler cache used to launch compilations (shared across MPD projects)",
+    )
+    cache.add_argument(
+        "--ccache",
+        dest="compiler_cache",
+        action="store_const",
+        const="ccache",
+        help="same as '--compiler-cache ccache'",
+    )
+    parser.add_argument(
+        "--compiler-cache-size",
+        metavar="<size>",
+        help="maximum size of the compiler cache (e.g. 20G)\n"
+        f"(default: {compiler_cache.DEFAULT_MAX_SIZE})",
+    )
+    parser.add_argument(
+        "--compile-job-memory",
+        metavar="<GB>",
+        help="estimated memory required by each compile job, used to size parallel builds\n"
+        f"(default: {jobs.DEFAULT_COMPILE_JOB_MEMORY:g})",
+    )
+    parser.add_argument(
+        "--link-job-memory",
+        metavar="<GB>",
+        help="estimated memory required by each link job, used to size parallel builds\n"
+        f"(default: {jobs.DEFAULT_LINK_JOB_MEMORY:g})",
+    )
+    parser.add_argument(
+        "--target",
+        metavar="<target>",
+        help="microarchitecture for which the developed packages are built\n"
+        f"(e.g. {targets.NATIVE}, x86_64_v2; default: {targets.DEFAULT_TARGET}"
+        " if supported by the host)",
+    )
+    parser.add_argument(
+        "--dependency-target",
+        metavar="<target>",
+        help="microarchitecture for which dependencies are built or reused\n"
+        "(default: same as the default for --target)",
+    )
+    parser.add_argument(
+        "--linker",
+        choices=("default",) + linking.LINKERS,
+        help="linker used for the developed packages (default: the compiler's default)",
+    )
+    split_dwarf = parser.add_mutually_exclusive_group()
+    split_dwarf.add_argument(
+        "--split-dwarf",
+        dest="split_dwarf",
+        action="store_const",
+        const=True,
+        help="write debug information to separate .dwo files (-gsplit-dwarf), and\n"
+        "a .gdb_index section when linking with lld, mold, or gold",
+    )
+    split_dwarf.add_argument(
+        "--no-split-dwarf",
+        dest="split_dwarf",
+        action="store_const",
+        const=False,
+        help="keep debug information in the object files (default)",
+    )
+    parser.add_argument(
+        "--lto",
+        choices=("none",) + linking.LTO_MODES,
+        help="link-time optimization of the developed packages (default: none;\n"
+        "thin LTO requires Clang)",
+    )
+    unity = parser.add_mutually_exclusive_group()
+    unity.add_argument(
+        "--unity",
+        dest="unity",
+        action="store_const",
+        const=True,
+        help="build the developed packages with unity builds (CMAKE_UNITY_BUILD)",
+    )
+    unity.add_argument(
+        "--no-unity", dest="unity", action="store_const", const=False, help="disable unity builds"
+    )
+    parser.add_argument(
+        "--unity-batch-size",
+        type=int,
+        metavar="<number>",
+        help="number of sources combined in each unity source file (implies --unity)\n"
+        f"(default: {unity_pch.DEFAULT_UNITY_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--unity-exclude",
+        metavar="<package>[,<package>...]",
+        help="developed packages built without unity builds (replaces the recorded list)",
+    )
+    pch = parser.add_mutually_exclusive_group()
+    pch.add_argument(
+        "--pch",
+        dest="pch",
+        action="store_const",
+        const=True,
+        help="precompile the headers most frequently included by the developed packages",
+    )
+    pch.add_argument(
+        "--no-pch",
+        dest="pch",
+        action="store_const",
+        const=False,
+        help="disable precompiled headers",
+    )
+    parser.add_argument(
+        "--pch-exclude",
+        metavar="<package>[,<package>...]",
+        help="developed packages built without precompiled headers (replaces the recorded list)",
+    )
+
+    test_cache = parser.add_mutually_exclusive_group()
+    test_cache.add_argument(
+        "--test-cache",
+        dest="test_cache",
+        action="store_const",
+        const=True,
+        help="skip passing tests whose command, environment and inputs are unchanged\n"
+        "(see 'spack mpd test')",
+    )
+    test_cache.add_argument(
+        "--no-test-cache",
+        dest="test_cache",
+        action="store_const",
+        const=False,
+        help="disable the test result cache",
+    )
+
+
+def add_build_type_option(parser):
+    parser.add_argument(
+        "--config",
+        dest="build_type",
+        choices=BUILD_TYPES,
+        help="use the build area of the given build type\n"
+        "(default: the project's build type, see the 'build_type' variant)",
+    )
+
+
+def build_options_from_args(args, current=None):
+    """Return the build options explicitly specified in args.
+
+    Options that are not specified are omitted so that 'spack mpd refresh' keeps
+    the values recorded in the current project configuration.  For a new project,
+    the default microarchitecture targets are always recorded.
+    """
+    current = current or {}
+    options = {}
+
+    tool = getattr(args, "compiler_cache", None)
+    size = getattr(args, "compiler_cache_size", None)
+    if tool or size:
+        settings = current.get("compiler_cache")
+        if tool:
+            settings = compiler_cache.settings(tool, size)
+        elif settings:
+            settings = compiler_cache.settings(settings["tool"], size)
+        else:
+            compiler_cache.no_cache_selected()
+        options["compiler_cache"] = settings
+
+    compile_memory = getattr(args, "compile_job_memory", None)
+    link_memory = getattr(args, "link_job_memory", None)
+    if compile_memory or link_memory:
+        memory = dict(current.get("job_memory") or {})
+        if compile_memory:
+            memory["compile"] = jobs.parse_job_memory(compile_memory)
+        if link_memory:
+            memory["link"] = jobs.parse_job_memory(link_memory)
+        options["job_memory"] = memory
+
+    linker = getattr(args, "linker", None)
+    split_dwarf = getattr(args, "split_dwarf", None)
+    lto = getattr(args, "lto", None)
+    if linker or split_dwarf is not None or lto:
+        options["link"] = linking.settings(linker, split_dwarf, lto, current.get("link"))
+
+    unity = getattr(args, "unity", None)
+    batch_size = getattr(args, "unity_batch_size", None)
+    unity_exclude = getattr(args, "unity_exclude", None)
+    if unity is not None or batch_size is not None or unity_exclude is not None:
+        options["unity"] = unity_pch.unity_settings(
+            unity, batch_size, unity_exclude, current.get("unity")
+        )
+
+    pch = getattr(args, "pch", None)
+    pch_exclude = getattr(args, "pch_exclude", None)
+    if pch is not None or pch_exclude is not None:
+        options["pch"] = unity_pch.pch_settings(pch, pch_exclude, current.get("pch"))
+
+    test_cache = getattr(args, "test_cache", None)
+    if test_cache is not None:
+        options["test_cache"] = test_cache
+
+    target = getattr(args, "target", None)
+    dependency_target = getattr(args, "dependency_target", None)
+    if target or dependency_target or not current:
+        options["target"] = targets.settings(target, dependency_target, current.get("target"))
+
+    return options
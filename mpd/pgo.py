@@ -0,0 +1,272 @@
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from spack.spec import Spec
+
+from .build import PGO_AREA, TIME_TRACE_AREA, build_project, configure_if_needed
+from .build_report import format_duration
+from .config import selected_project_config
+from .options import BUILD_TYPES
+from .preconditions import State, activate_development_environment, preconditions
+from .spack_compat import tty
+from .targets import check_host
+from .util import bold, cyan, gray, green, magenta, remove_dir, yellow
+
+SUBCOMMAND = "pgo"
+
+_LANGUAGES = ("c", "cxx")
+_CLANG_COMPILERS = ("llvm", "clang", "apple-clang")
+
+
+def setup_subparser(subparsers):
+    pgo_description = """build the developed packages with profile-guided optimization
+
+The developed packages are first built with instrumentation in a separate
+build area, where the training command is run to collect a profile.  The
+packages are then rebuilt in another build area using that profile.  Unless
+--skip-benchmark is specified, the benchmark command (by default the training
+command) is finally timed against the regular and the optimized builds.
+
+Commands are run in the development environment, with the selected build
+area's library and executable directories prepended to LD_LIBRARY_PATH and
+PATH, and with MPD_BUILD_AREA set to the build area."""
+    pgo = subparsers.add_parser(
+        SUBCOMMAND, description=pgo_description, help="profile-guided optimization"
+    )
+    pgo.add_argument(
+        "-j",
+        dest="parallel",
+        metavar="<number>",
+        help="specify number of threads for parallel builds",
+    )
+    pgo.add_argument(
+        "--clean",
+        action="store_true",
+        help="remove the PGO build areas and profiles before starting",
+    )
+    pgo.add_argument(
+        "--benchmark",
+        metavar="<command>",
+        help="command to time instead of the training command (quote it as one argument)",
+    )
+    pgo.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        metavar="<number>",
+        help="time each benchmark run this many times, keeping the fastest (default: %(default)s)",
+    )
+    pgo.add_argument(
+        "--skip-benchmark",
+        action="store_true",
+        help="do not time the regular and optimized builds",
+    )
+    pgo.add_argument(
+        "training_command",
+        metavar="-- <training command>",
+        nargs="+",
+        help="command that exercises the developed packages (e.g. lar -c reco.fcl -n 50)",
+    )
+
+
+def pgo_dir(project_config):
+    return Path(project_config["build"]) / PGO_AREA
+
+
+def compiler_family(project_config):
+    chosen_compiler = project_config.get("chosen_compiler")
+    name = Spec(chosen_compiler).name if chosen_compiler else None
+    if name == "gcc":
+        return "gcc"
+    if name in _CLANG_COMPILERS:
+        return "clang"
+    tty.die(
+        "Profile-guided optimization is supported for GCC and Clang compilers only"
+        + (f" (the project uses {name})" if name else "")
+    )
+
+
+def instrumentation_flags(family, profile_dir, build_area):
+    if family == "gcc":
+        # Profile files are named after the object files relative to the build area, so that
+        # the optimized build, which uses a different build area, finds them.
+        return (
+            f"-fprofile-generate={profile_dir} -fprofile-update=atomic"
+            f" -fprofile-prefix-path={build_area}"
+        )
+    return f"-fprofile-generate={profile_dir}"
+
+
+def optimization_flags(family, profile, build_area):
+    if family == "gcc":
+        return (
+            f"-fprofile-use={profile} -fprofile-partial-training"
+            f" -fprofile-prefix-path={build_area} -Wno-missing-profile"
+        )
+    return f"-fprofile-use={profile} -Wno-profile-instr-unprofiled -Wno-profile-instr-out-of-date"
+
+
+def preset_flags(project_config):
+    """Compiler flags set by the project's presets (e.g. for the microarchitecture target)."""
+    presets_file = Path(project_config["source"]) / "CMakePresets.json"
+    if not presets_file.exists():
+        return {}
+    cache_variables = json.loads(presets_file.read_text())["configurePresets"][0]["cacheVariables"]
+    flags = {}
+    for lang in _LANGUAGES:
+        value = cache_variables.get(f"CMAKE_{lang.upper()}_FLAGS", "")
+        flags[lang] = value["value"] if isinstance(value, dict) else value
+    return flags
+
+
+def flag_defines(project_config, pgo_flags):
+    base_flags = preset_flags(project_config)
+    defines = []
+    for lang in _LANGUAGES:
+        if lang in project_config["languages"]:
+            flags = " ".join(f for f in (base_flags.get(lang), pgo_flags) if f)
+            defines.append(f"CMAKE_{lang.upper()}_FLAGS:STRING={flags}")
+    return defines
+
+
+def merge_profiles(family, profile_dir, project_config):
+    """Merge the raw profiles of the training runs, returning the profile to use.
+
+    GCC accumulates the counters of all runs in its profile files, so only
+    Clang's raw profiles need to be merged.
+    """
+    if family == "gcc":
+        profiles = list(profile_dir.rglob("*.gcda"))
+        if not profiles:
+            tty.die(f"The training command did not write any profiles to {profile_dir}")
+        tty.msg(f"Collected profiles of {len(profiles)} object files")
+        return profile_dir
+
+    raw_profiles = sorted(profile_dir.glob("*.profraw"))
+    if not raw_profiles:
+        tty.die(f"The training command did not write any profiles to {profile_dir}")
+    compiler_dir = Path(project_config["compiler_paths"]["cxx"]).parent
+    profdata = shutil.which("llvm-profdata", path=str(compiler_dir)) or shutil.which(
+        "llvm-profdata"
+    )
+    if not profdata:
+        tty.die("Could not find llvm-profdata, which is needed to merge Clang profiles")
+    merged = profile_dir / "merged.profdata"
+    subprocess.run(
+        [profdata, "merge", f"--output={merged}"] + [str(p) for p in raw_profiles], check=True
+    )
+    tty.msg(f"Merged {len(raw_profiles)} raw profiles into {merged}")
+    return merged
+
+
+def build_area_environment(build_area, exclude=()):
+    """Environment in which commands use the libraries and executables of build_area."""
+    lib_dirs, bin_dirs = [], []
+    for root, dirs, files in os.walk(build_area):
+        dirs[:] = sorted(d for d in dirs if d not in exclude and not d.startswith("."))
+        if any(".so" in f for f in files):
+            lib_dirs.append(root)
+        if Path(root).name == "bin":
+            bin_dirs.append(root)
+
+    env = dict(os.environ)
+    for variable, paths in (("LD_LIBRARY_PATH", lib_dirs), ("PATH", bin_dirs)):
+        existing = [env[variable]] if env.get(variable) else []
+        env[variable] = os.pathsep.join(paths + existing)
+    env["MPD_BUILD_AREA"] = str(build_area)
+    return env
+
+
+def run_command(command, env, description):
+    tty.msg(f"{description}:\n\n" + cyan(" ".join(command)) + "\n")
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        tty.die(f"The command failed with exit code {result.returncode}")
+    return elapsed
+
+
+def time_command(command, env, description, repeat):
+    return min(run_command(command, env, description) for _ in range(max(1, repeat)))
+
+
+def print_benchmark(regular, optimized):
+    change = 100 * (optimized - regular) / regular if regular else 0
+    color = green if change < 0 else yellow
+    print()
+    tty.msg(bold("Benchmark"))
+    print(f"    {magenta('regular build  ')}  {format_duration(regular):>9}")
+    print(
+        f"    {magenta('optimized build')}  {format_duration(optimized):>9}  "
+        + color(f"{change:+.1f}%")
+    )
+
+
+def process(args):
+    preconditions(State.INITIALIZED, State.SELECTED_PROJECT, State.PACKAGES_TO_DEVELOP)
+
+    config = selected_project_config()
+    check_host(config)
+    family = compiler_family(config)
+    area = pgo_dir(config)
+    if args.clean:
+        remove_dir(area)
+    profile_dir = area / "profiles"
+    instrumented = dict(config, build=str(area / "instrumented"))
+    optimized = dict(config, build=str(area / "optimized"))
+
+    activate_development_environment(config["local"])
+
+    print()
+    tty.msg(cyan("Building instrumented packages") + gray(f" ({instrumented['build']})"))
+    flags = instrumentation_flags(family, profile_dir, instrumented["build"])
+    configure_if_needed(instrumented, flag_defines(config, flags))
+    build_project(instrumented, args.parallel, [])
+
+    # Profiles of earlier training runs may no longer match the instrumented code
+    shutil.rmtree(profile_dir, ignore_errors=True)
+    profile_dir.mkdir(parents=True)
+    run_command(
+        args.training_command,
+        build_area_environment(instrumented["build"]),
+        "Training with command",
+    )
+    profile = merge_profiles(family, profile_dir, config)
+
+    print()
+    tty.msg(cyan("Building optimized packages") + gray(f" ({optimized['build']})"))
+    configure_if_needed(
+        optimized, flag_defines(config, optimization_flags(family, profile, optimized["build"]))
+    )
+    # The build system does not track the profile, so everything is recompiled
+    if (Path(optimized["build"]) / "CMakeCache.txt").exists():
+        subprocess.run(["cmake", "--build", optimized["build"], "--target", "clean"], check=True)
+    build_project(optimized, args.parallel, [])
+
+    if args.skip_benchmark:
+        return
+
+    benchmark = shlex.split(args.benchmark) if args.benchmark else args.training_command
+    print()
+    tty.msg(cyan("Building regular packages") + gray(f" ({config['build']})"))
+    configure_if_needed(config)
+    build_project(config, args.parallel, [])
+    regular_time = time_command(
+        benchmark,
+        build_area_environment(config["build"], exclude=(*BUILD_TYPES, PGO_AREA, TIME_TRACE_AREA)),
+        "Timing the regular build with command",
+        args.repeat,
+    )
+    optimized_time = time_command(
+        benchmark,
+        build_area_environment(optimized["build"]),
+        "Timing the optimized build with command",
+        args.repeat,
+    )
+    print_benchmark(regular_time, optimized_time)
@@ -6,6 +6,7 @@ import spack.environment as ev
 from . import config
 from .concretize import concretize_project
 from .config import print_config_info, selected_project_config
+from .options import add_build_options, build_options_from_args
 from .preconditions import State, preconditions
 from .spack_compat import tty
 from .util import bold, gray
@@ -39,6 +40,7 @@ def setup_subparser(subparsers):
         help="prepend colon-separated paths to ENV_VAR for each checked-out package\n"
         "(can be specified multiple times)",
     )
+    add_build_options(refresh)
     refresh.add_argument("variants", nargs="*", help="variants to apply to developed packages")
     refresh.add_argument(
         "-f",
@@ -79,7 +81,10 @@ def process(args):
     dependencies = getattr(args, "dependencies", None)
     if dependencies:
         dependencies = [" ".join(dep_tokens) for dep_tokens in dependencies]
-    new_config = config.refresh(name, args.variants, dependencies, args.env_var_prepend)
+    build_options = build_options_from_args(args, current_config)
+    new_config = config.refresh(
+        name, args.variants, dependencies, args.env_var_prepend, build_options
+    )
 
     # Normalize configs for comparison (convert OrderedDict to dict, sort lists)
     def normalize(cfg):
@@ -1,7 +1,7 @@
 import shutil
 import subprocess
 
-from .config import project_config, rm_config, selected_project_token
+from .config import project_config, project_data_dir, rm_config, selected_project_token
 from .preconditions import State, preconditions
 
 SUBCOMMAND = "rm-project"
@@ -35,6 +35,7 @@ def rm_project(name, config):
         stderr=subprocess.DEVNULL,
     )
     shutil.rmtree(config["build"], ignore_errors=True)
+    shutil.rmtree(project_data_dir(name), ignore_errors=True)
     rm_config(name)
 
 
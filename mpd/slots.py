@@ -0,0 +1,242 @@
+import fcntl
+import getpass
+import json
+import os
+import socket
+import time
+from datetime import datetime
+
+from . import init
+from .preconditions import State, preconditions
+from .spack_compat import tty
+from .util import bold, cyan, gray, magenta
+
+SUBCOMMAND = "slots"
+
+_SETTINGS = "settings.json"
+_LOCK = ".lock"
+_POLL_INTERVAL = 2.0
+
+
+def setup_subparser(subparsers):
+    slots_description = """view or configure the build-slot broker
+
+When enabled, concurrent 'spack mpd build' and 'spack mpd test' invocations
+that use this Spack instance share a fixed number of job slots.  Each
+invocation is admitted only when a slot is free and is given a fair share
+of the slots for its duration."""
+    slots = subparsers.add_parser(SUBCOMMAND, description=slots_description, help="build slots")
+    action = slots.add_mutually_exclusive_group()
+    action.add_argument(
+        "--enable",
+        nargs="?",
+        type=int,
+        const=os.cpu_count(),
+        metavar="<number>",
+        help="share <number> job slots among concurrent builds (default: %(const)s)",
+    )
+    action.add_argument("--disable", action="store_true", help="disable the build-slot broker")
+
+
+def slots_dir():
+    return init.slots_dir(init.mpd_config_dir())
+
+
+def capacity():
+    """Number of slots shared by concurrent builds, or None if the broker is disabled."""
+    settings = slots_dir() / _SETTINGS
+    if not settings.exists():
+        return None
+    return json.loads(settings.read_text())["capacity"]
+
+
+def enable(number):
+    if number < 1:
+        tty.die("The number of build slots must be positive")
+
+    path = slots_dir()
+    if not path.exists():
+        path.mkdir(parents=True)
+        # Leases of all users of this Spack instance are recorded in the same directory
+        try:
+            path.chmod(0o1777)
+        except PermissionError:
+            pass
+    (path / _SETTINGS).write_text(json.dumps(dict(capacity=number)))
+
+
+def disable():
+    (slots_dir() / _SETTINGS).unlink(missing_ok=True)
+
+
+def fair_shares(requests, total):
+    """Split total slots among requests (ordered by admission) with max-min fairness.
+
+    Requests smaller than an equal share are fully satisfied, and the remaining
+    slots are divided equally among the others.  Every request gets at least
+    one slot.
+    """
+    shares = {}
+    remaining = list(requests)
+    while remaining:
+        equal = max(1, total // len(remaining))
+        satisfied = [(key, n) for key, n in remaining if n <= equal]
+        if not satisfied:
+            extra = max(0, total - equal * len(remaining))
+            for i, (key, _) in enumerate(remaining):
+                shares[key] = equal + (1 if i < extra else 0)
+            break
+        for key, n in satisfied:
+            shares[key] = n
+            total -= n
+        remaining = [(key, n) for key, n in remaining if n > equal]
+    return shares
+
+
+def _holder_alive(path):
+    """A lease is held for as long as its owner keeps the lease file locked."""
+    try:
+        with open(path) as f:
+            fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def leases():
+    """Return the leases of live processes on this host, in order of admission.
+
+    Leases of processes that exited without releasing them are removed.
+    """
+    host = socket.gethostname()
+    live = []
+    for path in slots_dir().glob(f"lease-{host}-*.json"):
+        if not _holder_alive(path):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            continue
+        try:
+            live.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return sorted(live, key=lambda lease: (lease["started"], lease["pid"]))
+
+
+def current_shares(live=None):
+    live = leases() if live is None else live
+    return fair_shares([(lease["pid"], lease["requested"]) for lease in live], capacity() or 1)
+
+
+class Lease:
+    """Slots leased by this process for the duration of a build or test command.
+
+    Entering the context waits until a slot is free; the fair share of the
+    process changes as other leases are taken and released.
+    """
+
+    def __init__(self, project, command, requested):
+        self.project = project
+        self.command = command
+        self.requested = requested
+        self.pid = os.getpid()
+        self.path = slots_dir() / f"lease-{socket.gethostname()}-{self.pid}.json"
+
+    def __enter__(self):
+        waiting = False
+        lock_fd = os.open(slots_dir() / _LOCK, os.O_RDONLY | os.O_CREAT, 0o666)
+        with os.fdopen(lock_fd) as lock:
+            while True:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                live = leases()
+                if len(live) < (capacity() or 1):
+                    self._write()
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                    break
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+                if not waiting:
+                    holders = ", ".join(f"{lease['user']}:{lease['project']}" for lease in live)
+                    tty.msg("Waiting for a free build slot " + gray(f"(held by {holders})"))
+                    waiting = True
+                time.sleep(_POLL_INTERVAL)
+        return self
+
+    def _write(self):
+        # The lease is locked before it becomes visible so that it is never mistaken as stale
+        pending = self.path.with_name(f".pending-{self.pid}")
+        self._file = open(pending, "w")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        lease = dict(
+            pid=self.pid,
+            user=getpass.getuser(),
+            project=self.project,
+            command=self.command,
+            requested=self.requested,
+            started=time.time(),
+        )
+        self._file.write(json.dumps(lease))
+        self._file.flush()
+        pending.rename(self.path)
+
+    def __exit__(self, *exc):
+        self.path.unlink(missing_ok=True)
+        self._file.close()
+        return False
+
+    def share(self):
+        return current_shares().get(self.pid, 1)
+
+
+def lease_for(project_config, command, requested):
+    """Return a slot lease if the broker is enabled, otherwise None."""
+    if capacity() is None:
+        return None
+    return Lease(project_config["name"], command, requested)
+
+
+def print_slots():
+    total = capacity()
+    if total is None:
+        tty.msg(
+            "The build-slot broker is disabled "
+            + gray("(enable it with 'spack mpd slots --enable [<number>]')")
+        )
+        return
+
+    live = leases()
+    shares = current_shares(live)
+    used = sum(shares.values())
+    tty.msg(f"Build slots in use: {bold(f'{min(used, total)}/{total}')}")
+    if not live:
+        return
+
+    print(f"\n  {'User':<12} {'Project':<20} {'Command':<8} {'PID':>8}  Requested  Share  Since")
+    for lease in live:
+        since = datetime.fromtimestamp(lease["started"]).strftime("%H:%M:%S")
+        project = magenta(f"{lease['project']:<20}")
+        share = cyan(f"{shares[lease['pid']]:>5}")
+        print(
+            f"  {lease['user']:<12} {project} {lease['command']:<8}"
+            f" {lease['pid']:>8}  {lease['requested']:>9}  {share}  {since}"
+        )
+    print()
+
+
+def process(args):
+    preconditions(State.INITIALIZED)
+
+    if args.enable is not None:
+        enable(args.enable)
+        tty.msg(f"Concurrent MPD builds now share {bold(args.enable)} job slots")
+        return
+
+    if args.disable:
+        disable()
+        tty.msg("Disabled the build-slot broker")
+        return
+
+    print_slots()
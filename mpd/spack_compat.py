@@ -1,6 +1,11 @@
 import spack.config
 import spack.environment as ev
 
+try:
+    import spack.vendor.archspec.cpu as archspec_cpu
+except ImportError:
+    import archspec.cpu as archspec_cpu
+
 try:
     import spack.llnl.util.filesystem as fs
 except ImportError:
@@ -0,0 +1,101 @@
+from .spack_compat import archspec_cpu, tty
+from .util import bold, gray
+
+# Generic target preferred by default, so that binaries built for it can be reused
+DEFAULT_TARGET = "x86_64_v3"
+NATIVE = "native"
+
+
+def host():
+    return archspec_cpu.host()
+
+
+def default_target():
+    """The default target: x86_64_v3 if the host supports it, else the host's generic target."""
+    preferred = archspec_cpu.TARGETS[DEFAULT_TARGET]
+    if preferred <= host():
+        return preferred.name
+    return host().generic.name
+
+
+def resolve(name):
+    """Return the name of the microarchitecture target specified by name.
+
+    The value 'native' selects the microarchitecture of the host.
+    """
+    if name == NATIVE:
+        return host().name
+    if name not in archspec_cpu.TARGETS:
+        generic = sorted(t for t in archspec_cpu.TARGETS if t.startswith(host().family.name))
+        tty.die(
+            f"Unknown target '{name}'\n"
+            + gray(f"    (e.g. {NATIVE}, {', '.join(generic)}, or a microarchitecture name)")
+        )
+    return name
+
+
+def settings(develop=None, dependencies=None, current=None):
+    """Targets for the developed packages and for their dependencies.
+
+    Targets that are not specified keep their current values or their defaults.
+    """
+    current = current or {}
+    develop = resolve(develop) if develop else current.get("develop") or default_target()
+    if dependencies:
+        dependencies = resolve(dependencies)
+    else:
+        dependencies = current.get("dependencies") or default_target()
+    return dict(develop=develop, dependencies=dependencies)
+
+
+def project_targets(project_config):
+    """Targets recorded for the project, or the defaults for projects created without them."""
+    return project_config.get("target") or settings()
+
+
+def optimization_flags(target, compiler_name, compiler_version):
+    """Compiler flags that generate code for target, as a string."""
+    try:
+        return archspec_cpu.TARGETS[target].optimization_flags(compiler_name, compiler_version)
+    except (KeyError, ValueError, archspec_cpu.UnsupportedMicroarchitecture) as e:
+        tty.warn(f"Not passing optimization flags for target {target}: {e}")
+        return ""
+
+
+def check_host(project_config):
+    """Stop if the host cannot run code built for the developed packages' target."""
+    target = project_targets(project_config)["develop"]
+    current = host()
+    if target in archspec_cpu.TARGETS and archspec_cpu.TARGETS[target] <= current:
+        return
+    tty.die(
+        f"The developed packages are built for target {bold(target)}, which this host"
+        f" ({current.name}) does not support.\n"
+        + gray(
+            "    Build on a compatible host, or select a different target with\n"
+            "    'spack mpd refresh --target <target>'"
+        )
+    )
+
+
+def mismatched_dependencies(project_config, specs):
+    """Return the dependency specs whose target differs from the project's dependency target."""
+    target = project_targets(project_config)["dependencies"]
+    developed = set(project_config["packages"])
+    return sorted(
+        {
+            f"{s.name}@{s.version} target={s.target}"
+            for s in specs
+            if s.name not in developed and not s.external and str(s.target) != target
+        }
+    )
+
+
+def report_mismatched_dependencies(project_config, specs):
+    mismatched = mismatched_dependencies(project_config, specs)
+    if not mismatched:
+        return
+    target = project_targets(project_config)["dependencies"]
+    msg = f"The following reused dependencies were not built for target {bold(target)}:\n"
+    msg += "".join(f"\n    {gray(spec)}" for spec in mismatched)
+    tty.warn(msg + "\n")
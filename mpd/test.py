@@ -1,25 +1,93 @@
+import contextlib
 import subprocess
 import sys
+from pathlib import Path
 
-from .config import selected_project_config
+from . import affected, slots, test_cache, test_resources, test_schedule
+from .build import package_directories
+from .config import build_type_config, selected_project_config
+from .options import add_build_type_option
 from .preconditions import State, activate_development_environment, preconditions
 from .spack_compat import tty
-from .util import maybe_with_color
+from .util import gray, maybe_with_color
 
 SUBCOMMAND = "test"
 ALIASES = ["t"]
 
+# ctest options that run a subset of the tests
+_SELECTION_OPTIONS = {
+    "-R",
+    "--tests-regex",
+    "-E",
+    "--exclude-regex",
+    "-L",
+    "--label-regex",
+    "-LE",
+    "--label-exclude",
+    "-I",
+    "--tests-information",
+    "--rerun-failed",
+    "--tests-from-file",
+    "--exclude-from-file",
+}
+
 
 def setup_subparser(subparsers):
     test = subparsers.add_parser(
         SUBCOMMAND, description="build and run tests", aliases=ALIASES, help="build and run tests"
     )
+    add_build_type_option(test)
     test.add_argument(
         "-j",
         dest="parallel",
         metavar="<number>",
         help="specify number of threads for invoking ctest",
     )
+    selection = test.add_mutually_exclusive_group()
+    selection.add_argument(
+        "--packages",
+        nargs="+",
+        metavar="<package>",
+        help="run only the tests of the specified checked-out packages",
+    )
+    selection.add_argument(
+        "--affected",
+        action="store_true",
+        help="run only the tests of packages whose sources changed since the last successful\n"
+        "test run, and of the packages that depend on them",
+    )
+    test.add_argument(
+        "--with-dependents",
+        action="store_true",
+        help="with --packages, also run the tests of the checked-out packages that depend on them",
+    )
+    test.add_argument(
+        "--shard",
+        type=test_schedule.shard,
+        metavar="<i>/<N>",
+        help="run only the i-th of N shards of the selected tests, balanced by recorded\n"
+        "test durations (e.g. to run the tests on several nodes)",
+    )
+    test.add_argument(
+        "--junit",
+        metavar="<file>",
+        help="write a JUnit report of the tests (default with --shard or --merge:\n"
+        "a file in the Testing directory of the build area)",
+    )
+    test.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="<report>",
+        help="merge the JUnit reports of several shards into one report (see --junit)\n"
+        "instead of running tests",
+    )
+    test.add_argument(
+        "--no-test-cache",
+        dest="test_cache",
+        action="store_const",
+        const=False,
+        help="run all selected tests even if the project's test result cache is enabled",
+    )
     test.add_argument(
         "test_options",
         metavar="-- <test options>",
@@ -28,24 +96,159 @@ def setup_subparser(subparsers):
     )
 
 
+def with_dependents(project_config, directories):
+    """Expand the checked-out repositories by those of the packages that depend on them."""
+    dependencies = project_config.get("package_dependencies")
+    if dependencies is None:
+        tty.die(
+            "The dependencies among the developed packages are unknown\n"
+            + gray("    Type 'spack mpd refresh' to record them.")
+        )
+    srcs = project_config.get("srcs", {})
+    packages = {package for package, directory in srcs.items() if directory in directories}
+    expanded = affected.with_dependents(packages, dependencies)
+    return sorted(set(directories) | {srcs[p] for p in expanded if p in srcs})
+
+
+def label_regex(labels):
+    """A CTest regular expression that matches exactly the given labels."""
+    special = set("\\^$.|?*+()[]{}")
+    escaped = ("".join("\\" + c if c in special else c for c in label) for label in labels)
+    return "^(" + "|".join(escaped) + ")$"
+
+
+def _has_package_labels(project_config):
+    develop_cmake = Path(project_config["source"]) / "develop.cmake"
+    return develop_cmake.exists() and "mpd_labels" in develop_cmake.read_text()
+
+
 def process(args):
     preconditions(State.INITIALIZED, State.SELECTED_PROJECT, State.PACKAGES_TO_DEVELOP)
 
-    config = selected_project_config()
-    build_dir = config["build"]
+    config = build_type_config(selected_project_config(), args.build_type)
+    if args.merge:
+        output = args.junit or test_schedule.junit_path(config)
+        summary = test_schedule.merge_junit(args.merge, output)
+        test_schedule.print_merge_summary(args.merge, output, summary)
+        # Shards do not record durations, so that all shards of a run see the same ones
+        test_schedule.record_durations(config, summary["durations"])
+        if summary["failures"]:
+            sys.exit(1)
+        return
+
+    if args.with_dependents and not args.packages:
+        tty.die("--with-dependents requires --packages")
+
+    labels = None
+    if args.packages:
+        labels = package_directories(config, args.packages)
+        if args.with_dependents:
+            labels = with_dependents(config, labels)
+    elif args.affected:
+        packages = affected.affected_packages(config, "test")
+        if packages == []:
+            return
+        if packages is not None:
+            srcs = config.get("srcs", {})
+            labels = sorted({srcs.get(package, package) for package in packages})
+
+    if labels is not None and not _has_package_labels(config):
+        tty.die(
+            "The tests of this project are not labeled by package\n"
+            + gray("    Type 'spack mpd refresh' and rebuild the project to label them.")
+        )
 
     activate_development_environment(config["local"])
 
-    arguments = ["ctest", "--test-dir", build_dir]
-    if args.parallel:
-        arguments.append(f"-j{args.parallel}")
+    selection = ["-L", label_regex(labels)] if labels is not None else []
+    selection += args.test_options
+    numbered = any(
+        option.startswith(("-I", "--tests-information")) for option in args.test_options
+    )
+    if args.shard and numbered:
+        tty.die("--shard selects tests by number and cannot be combined with -I")
+    cache = None
+    if config.get("test_cache") and args.test_cache is not False:
+        if numbered:
+            tty.warn("The test cache is not used when tests are selected with -I")
+        else:
+            cache = test_cache.TestCache(config)
+
+    # Only the tests' own memory declarations are listed
+    test_resources.clear_defaults(config)
+    tests = test_schedule.list_tests(config["build"], selection)
+    names = [test["name"] for test in tests]
+    to_run, cached = names, []
+    if args.shard:
+        to_run = test_schedule.shard_tests(config, names, *args.shard)
+    if cache:
+        in_shard = set(to_run)
+        to_run, cached = cache.partition([t for t in tests if t["name"] in in_shard])
+    if to_run and to_run != names:
+        selection += test_schedule.test_number_arguments(names, to_run)
+    junit = args.junit or (args.shard and test_schedule.junit_path(config, args.shard))
+    results = junit or (cache and Path(config["build"]) / test_cache.RESULTS_FILE)
+
+    memory_mb = None
+    if not any(option.startswith("--resource-spec-file") for option in args.test_options):
+        spec, memory_mb = test_resources.write_resource_spec(config)
+        if spec:
+            peaks = test_resources.recorded_peaks(config)
+            test_resources.write_defaults(
+                config, test_resources.default_requirements(tests, peaks, memory_mb)
+            )
+            selection += ["--resource-spec-file", str(spec)]
+
+    # Without costs from a previous run, ctest would start the tests in definition order
+    test_schedule.restore_costs(config)
+
+    # The tests exercise what was built, not what is checked out
+    built = affected.read_last_good(config, "build")
+    returncode = 0
+    if to_run or not names:
+        running = set(to_run)
+        with test_resources.PeakMemoryMonitor([t for t in tests if t["name"] in running]) as peaks:
+            returncode = _run_ctest(config, args.parallel, selection, results)
+        if not args.shard:
+            test_schedule.harvest_costs(config)
+        test_resources.record_peaks(config, peaks.peaks)
+        test_resources.print_peaks(peaks.peaks, memory_mb)
+    elif junit:
+        # Do not report the tests of a previous run
+        Path(junit).unlink(missing_ok=True)
+    if cache:
+        cache.record(test_cache.junit_outcomes(results) if to_run else {})
+        test_cache.print_summary(cached, len(cached) + len(to_run))
+    if junit and (cached or not to_run):
+        test_cache.add_cached_to_junit(junit, cached)
+    if junit:
+        tty.msg(f"JUnit report written to {maybe_with_color('c', str(junit))}")
+    if returncode != 0:
+        sys.exit(returncode)
+    selected = (
+        args.packages
+        or args.shard
+        or any(option.split("=")[0] in _SELECTION_OPTIONS for option in args.test_options)
+    )
+    if not selected:
+        affected.record_last_good(config, "test", built)
+
+
+def _run_ctest(project_config, parallel, selection, junit=None):
+    lease = slots.lease_for(project_config, "test", int(parallel or 1))
+    with lease or contextlib.nullcontext():
+        if lease:
+            parallel = lease.share()
 
-    arguments += args.test_options
+        arguments = ["ctest", "--test-dir", project_config["build"]]
+        if parallel:
+            arguments.append(f"-j{parallel}")
+        arguments += selection
+        if junit:
+            arguments += ["--output-junit", str(Path(junit).absolute())]
 
-    arguments_str = " ".join(arguments)
-    print()
-    tty.msg("Testing with command:\n\n" + maybe_with_color("c", arguments_str) + "\n")
+        arguments_str = " ".join(arguments)
+        print()
+        tty.msg("Testing with command:\n\n" + maybe_with_color("c", arguments_str) + "\n")
 
-    result = subprocess.run(arguments)
-    if result.returncode != 0:
-        sys.exit(result.returncode)
+        return subprocess.run(arguments).returncode
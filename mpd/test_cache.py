@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from .build_report import format_duration
+from .config import project_data_dir
+from .spack_compat import tty
+from .util import gray
+
+CACHE_FILE = "test-cache.json"
+
+# JUnit report from which test outcomes are read when no report is requested
+RESULTS_FILE = Path("Testing") / "mpd-test-cache.xml"
+
+# Variables of the interactive session that do not influence tests
+_VOLATILE_VARIABLES = {
+    "_",
+    "COLUMNS",
+    "DISPLAY",
+    "HISTFILE",
+    "LINES",
+    "LS_COLORS",
+    "MAIL",
+    "OLDPWD",
+    "PROMPT_COMMAND",
+    "PS1",
+    "PWD",
+    "SHLVL",
+    "STY",
+    "WINDOW",
+    "XAUTHORITY",
+}
+_VOLATILE_PREFIXES = ("SSH_", "TERM", "TMUX", "XDG_")
+
+_LDD_LIBRARY = re.compile(r"=>\s*(/\S+)|^\s*(/\S+)\s+\(")
+
+
+def _properties(test):
+    return {p["name"]: p["value"] for p in test.get("properties", [])}
+
+
+def test_environment(properties, environ=None):
+    """The environment a test runs in, without the variables of the interactive session."""
+    environment = {
+        name: value
+        for name, value in (os.environ if environ is None else environ).items()
+        if name not in _VOLATILE_VARIABLES and not name.startswith(_VOLATILE_PREFIXES)
+    }
+    for assignment in properties.get("ENVIRONMENT", []):
+        name, _, value = assignment.partition("=")
+        environment[name] = value
+    return environment
+
+
+class FileHashes:
+    """Content hashes of files, recomputed only when a file's size or mtime changes."""
+
+    def __init__(self, recorded=None):
+        self.recorded = recorded or {}
+        self.used = set()
+
+    def digest(self, path):
+        path = Path(path)
+        if path.is_dir():
+            contents = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for f in sorted(files):
+                    file_path = Path(root) / f
+                    contents.update(f"{file_path.relative_to(path)}\0".encode())
+                    contents.update(self.digest(file_path).encode())
+            return contents.hexdigest()
+        try:
+            stat = path.stat()
+        except OSError:
+            return "missing"
+        key = str(path)
+        self.used.add(key)
+        entry = self.recorded.get(key)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+        contents = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                contents.update(block)
+        self.recorded[key] = [stat.st_size, stat.st_mtime_ns, contents.hexdigest()]
+        return contents.hexdigest()
+
+
+def parse_ldd(output):
+    """Paths of the shared libraries listed by ldd."""
+    libraries = []
+    for line in output.splitlines():
+        match = _LDD_LIBRARY.search(line)
+        if match:
+            libraries.append(match.group(1) or match.group(2))
+    return libraries
+
+
+def is_elf(path):
+    """Whether path is an ELF file (an executable or a shared library)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == b"\x7fELF"
+    except OSError:
+        return False
+
+
+def shared_libraries(executable, environment):
+    """Shared libraries the dynamic loader resolves for executable in environment."""
+    if not shutil.which("ldd"):
+        return []
+    result = subprocess.run(
+        ["ldd", executable], env=environment, capture_output=True, text=True, check=False
+    )
+    return parse_ldd(result.stdout) if result.returncode == 0 else []
+
+
+def test_inputs(test, properties):
+    """Files whose contents determine the result of a test.
+
+    These are the test's executable, the files named on its command line, and
+    the files (or directories) declared in its REQUIRED_FILES property.
+    """
+    command = test["command"]
+    working_directory = Path(properties.get("WORKING_DIRECTORY", "."))
+    inputs = [command[0]]
+    for argument in command[1:]:
+        path = working_directory / argument
+        if path.is_file():
+            inputs.append(str(path))
+    return inputs + list(properties.get("REQUIRED_FILES", []))
+
+
+class TestCache:
+    """Results of passing tests, keyed by everything that may change their outcome.
+
+    A test's key combines its command line, its properties, its environment,
+    and the content hashes of its inputs and of the shared libraries its ELF
+    inputs load.  The latter include executables passed to a wrapper script,
+    as cetmodules' cet_exec_test does.  Only passing tests are recorded, so failing tests are
+    always run again.
+    """
+
+    def __init__(self, project_config):
+        self.path = project_data_dir(project_config["name"]) / CACHE_FILE
+        try:
+            data = json.loads(self.path.read_text()) if self.path.exists() else {}
+        except ValueError:
+            data = {}
+        self.data = data
+        self.results = data.setdefault("results", {}).setdefault(project_config["build"], {})
+        self.hashes = FileHashes(data.get("files"))
+        self.keys = {}
+        self._libraries = {}
+
+    def _libraries_of(self, executable, environment):
+        lookup = (executable, environment.get("LD_LIBRARY_PATH"))
+        if lookup not in self._libraries:
+            self._libraries[lookup] = shared_libraries(executable, environment)
+        return self._libraries[lookup]
+
+    def key(self, test):
+        if not test.get("command"):
+            return None
+        properties = _properties(test)
+        environment = test_environment(properties)
+        inputs = test_inputs(test, properties)
+        inputs += [
+            library
+            for path in inputs
+            if is_elf(path)
+            for library in self._libraries_of(path, environment)
+        ]
+        contents = dict(
+            command=test["command"],
+            properties=properties,
+            environment=environment,
+            inputs={path: self.hashes.digest(path) for path in inputs},
+        )
+        return hashlib.sha256(json.dumps(contents, sort_keys=True).encode()).hexdigest()
+
+    def partition(self, tests):
+        """Split tests into the names to run and the (name, seconds) of cached passes."""
+        to_run, cached = [], []
+        for test in tests:
+            name = test["name"]
+            key = self.key(test)
+            recorded = self.results.get(name)
+            if key and recorded and recorded["key"] == key:
+                cached.append((name, recorded["time"]))
+                continue
+            to_run.append(name)
+            if key:
+                self.keys[name] = key
+        return to_run, cached
+
+    def record(self, outcomes):
+        """Record the outcomes {name: (passed, seconds)} of the tests that were run."""
+        for name, key in self.keys.items():
+            passed, seconds = outcomes.get(name, (False, 0.0))
+            if passed:
+                self.results[name] = dict(key=key, time=seconds)
+            else:
+                self.results.pop(name, None)
+        # Forget the hashes of files no longer used by the selected tests
+        self.data["files"] = {
+            path: entry for path, entry in self.hashes.recorded.items() if path in self.hashes.used
+        }
+        self.path.write_text(json.dumps(self.data, sort_keys=True))
+
+
+def junit_outcomes(path):
+    """Map test names to (passed, seconds) from a JUnit report written by ctest."""
+    try:
+        root = ET.parse(path).getroot()
+    except (OSError, ET.ParseError):
+        return {}
+    return {
+        case.get("name"): (
+            case.get("status") == "run" and case.find("failure") is None,
+            float(case.get("time", 0)),
+        )
+        for case in root.iter("testcase")
+    }
+
+
+def add_cached_to_junit(path, cached):
+    """Add the cached tests to a JUnit report, creating the report if ctest did not run."""
+    path = Path(path)
+    if path.exists():
+        tree = ET.parse(path)
+        suite = tree.getroot()
+    else:
+        suite = ET.Element("testsuite", name="spack-mpd", tests="0", failures="0")
+        tree = ET.ElementTree(suite)
+    for name, _ in cached:
+        case = ET.SubElement(suite, "testcase", name=name, classname=name, time="0")
+        case.set("status", "cached")
+        ET.SubElement(case, "system-out").text = "passed before with unchanged inputs"
+    suite.set("tests", str(int(suite.get("tests", 0)) + len(cached)))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tree.write(path, encoding="UTF-8", xml_declaration=True)
+
+
+def print_summary(cached, total):
+    if not cached:
+        return
+    saved = sum(seconds for _, seconds in cached)
+    print()
+    tty.msg(
+        f"{len(cached)} of {total} tests passed before with unchanged inputs and were not run"
+        + gray(f" (saving about {format_duration(saved)})")
+    )
@@ -0,0 +1,266 @@
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+from . import jobs
+from .config import project_data_dir
+from .spack_compat import tty
+from .util import bold, gray
+
+MEMORY_RESOURCE = "memory"  # in MB
+
+PEAKS_FILE = "test-memory.json"
+
+# Files in the build area; the defaults are included by the generated CTestTestfile.cmake
+SPEC_FILE = Path("Testing") / "mpd-resources.json"
+DEFAULTS_FILE = Path("Testing") / "mpd-test-memory.cmake"
+
+# Headroom added to the recorded peak memory of a test
+MEMORY_MARGIN = 1.2
+
+_MB = 1024**2
+
+
+def resource_spec(memory_mb):
+    """A CTest resource specification with the node's memory as a single resource."""
+    return {
+        "version": {"major": 1, "minor": 0},
+        "local": [{MEMORY_RESOURCE: [{"id": "0", "slots": memory_mb}]}],
+    }
+
+
+def write_resource_spec(project_config):
+    """Write the resource specification of the node; return its path and the memory in MB."""
+    total = jobs.total_memory()
+    if not total:
+        return None, None
+    memory_mb = total // _MB
+    path = Path(project_config["build"]) / SPEC_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(resource_spec(memory_mb), indent=2))
+    return path, memory_mb
+
+
+def declared_memory(test):
+    """The memory (in MB) a test declares in its RESOURCE_GROUPS property, or None."""
+    for prop in test.get("properties", []):
+        if prop["name"] != "RESOURCE_GROUPS":
+            continue
+        slots = [
+            requirement["slots"]
+            for group in prop["value"]
+            for requirement in group.get("requirements", [])
+            if requirement.get(".type") == MEMORY_RESOURCE
+        ]
+        return sum(slots) if slots else None
+    return None
+
+
+def default_requirements(tests, peaks, memory_mb):
+    """Memory (in MB) to reserve for tests that declare none, from their recorded peaks.
+
+    No test reserves more than the node's memory, which would keep ctest from
+    running it at all.
+    """
+    requirements = {}
+    for test in tests:
+        name = test["name"]
+        if name not in peaks or declared_memory(test) is not None:
+            continue
+        requirements[name] = min(memory_mb, max(1, math.ceil(peaks[name] * MEMORY_MARGIN)))
+    return requirements
+
+
+def clear_defaults(project_config):
+    (Path(project_config["build"]) / DEFAULTS_FILE).unlink(missing_ok=True)
+
+
+def write_defaults(project_config, requirements):
+    path = Path(project_config["build"]) / DEFAULTS_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        "".join(
+            f'set_tests_properties([==[{name}]==] PROPERTIES RESOURCE_GROUPS "'
+            f'{MEMORY_RESOURCE}:{mb}")\n'
+            for name, mb in sorted(requirements.items())
+        )
+    )
+
+
+def _peaks_path(project_config):
+    return project_data_dir(project_config["name"]) / PEAKS_FILE
+
+
+def _read_peaks(project_config):
+    path = _peaks_path(project_config)
+    try:
+        return json.loads(path.read_text()) if path.exists() else {}
+    except ValueError:
+        return {}
+
+
+def recorded_peaks(project_config):
+    """The peak memory (in MB) of each test when it last ran in the build area."""
+    return _read_peaks(project_config).get(project_config["build"], {})
+
+
+def record_peaks(project_config, peaks):
+    history = _read_peaks(project_config)
+    history.setdefault(project_config["build"], {}).update(peaks)
+    _peaks_path(project_config).write_text(json.dumps(history, indent=2, sort_keys=True))
+
+
+def _read_proc(pid, name):
+    try:
+        with open(f"/proc/{pid}/{name}", "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def process_table():
+    """Map the pid of each process to (parent pid, command name)."""
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        stat = _read_proc(entry, "stat")
+        if not stat:
+            continue
+        # The command name is in parentheses and may itself contain spaces
+        comm_start, comm_end = stat.index(b"("), stat.rindex(b")")
+        fields = stat[comm_end + 2 :].split()
+        table[int(entry)] = (int(fields[1]), stat[comm_start + 1 : comm_end].decode())
+    return table
+
+
+def resident_mb(pid):
+    """The current resident memory of a process and its peak, in MB."""
+    status = _read_proc(pid, "status")
+    if not status:
+        return 0, 0
+    entries = jobs.parse_meminfo(status.decode(errors="replace"))
+    return entries.get("VmRSS", 0) // _MB, entries.get("VmHWM", 0) // _MB
+
+
+class PeakMemoryMonitor:
+    """Samples the memory used by the tests that ctest runs.
+
+    The tests are the children of the ctest processes started by this process.
+    A test's memory is the resident memory of all its processes (or the peak
+    resident memory of its main process, if larger), sampled every interval
+    seconds.  Tests are identified by their command lines and working
+    directories.
+    """
+
+    def __init__(self, tests, interval=0.5):
+        self.interval = interval
+        self.peaks = {}
+        self._commands = {}
+        for test in tests:
+            command = tuple(test.get("command") or ())
+            working_directory = next(
+                (
+                    p["value"]
+                    for p in test.get("properties", [])
+                    if p["name"] == "WORKING_DIRECTORY"
+                ),
+                None,
+            )
+            if command:
+                self._commands.setdefault(command, []).append((working_directory, test["name"]))
+        self._names = {}
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        if self._commands and os.path.isdir("/proc"):
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        else:
+            self._thread = None
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def identify(self, pid):
+        """The name of the test run by process pid, or None."""
+        cmdline = _read_proc(pid, "cmdline")
+        if not cmdline:
+            return None
+        argv = tuple(arg.decode(errors="replace") for arg in cmdline.split(b"\0")[:-1])
+        for command, candidates in self._commands.items():
+            # A script's interpreter precedes the command line given to ctest
+            if argv[-len(command) :] != command:
+                continue
+            if len(candidates) == 1:
+                return candidates[0][1]
+            try:
+                cwd = os.readlink(f"/proc/{pid}/cwd")
+            except OSError:
+                return None
+            return next((name for wd, name in candidates if wd == cwd), None)
+        return None
+
+    def sample(self, table=None):
+        table = process_table() if table is None else table
+        children = {}
+        for pid, (ppid, _) in table.items():
+            children.setdefault(ppid, []).append(pid)
+
+        ctest_pids = [
+            pid
+            for pid in _descendants(os.getpid(), children)
+            if table.get(pid, (None, ""))[1] == "ctest"
+        ]
+        running = set()
+        for ctest_pid in ctest_pids:
+            for pid in children.get(ctest_pid, []):
+                running.add(pid)
+                if pid not in self._names:
+                    self._names[pid] = self.identify(pid)
+                name = self._names[pid]
+                if name is None:
+                    continue
+                rss, hwm = resident_mb(pid)
+                rss += sum(resident_mb(p)[0] for p in _descendants(pid, children))
+                self.peaks[name] = max(self.peaks.get(name, 0), rss, hwm)
+        # Process IDs of finished tests may be reused by later ones
+        self._names = {pid: name for pid, name in self._names.items() if pid in running}
+
+
+def _descendants(pid, children):
+    pending = list(children.get(pid, []))
+    found = []
+    while pending:
+        child = pending.pop()
+        found.append(child)
+        pending.extend(children.get(child, []))
+    return found
+
+
+def print_peaks(peaks, memory_mb, min_mb=1024, top=5):
+    """Report the tests whose peak memory reached min_mb, largest first."""
+    largest = sorted(
+        ((name, mb) for name, mb in peaks.items() if mb >= min_mb),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    if not largest:
+        return
+    print()
+    tty.msg(
+        f"Peak memory of the {min(top, len(largest))} largest of {len(largest)} tests"
+        f" using at least {min_mb / 1024:g} GB"
+        + (gray(f" (node memory {memory_mb / 1024:.1f} GB)") if memory_mb else "")
+        + "".join(f"\n    {mb / 1024:6.2f} GB  {bold(name)}" for name, mb in largest[:top])
+    )
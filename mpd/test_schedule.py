@@ -0,0 +1,220 @@
+import argparse
+import heapq
+import json
+import subprocess
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from .build_report import format_duration
+from .config import project_data_dir
+from .spack_compat import tty
+from .util import bold, cyan, gray
+
+COSTS_FILE = "test-costs.json"
+
+# Written by ctest and read by it to start the longest tests first
+COST_DATA = Path("Testing") / "Temporary" / "CTestCostData.txt"
+
+# Separates the costs from the tests that failed in the last run
+_FAILED_SEPARATOR = "---"
+
+
+def shard(text):
+    """Parse an 'i/N' shard specification (argparse type)."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected <i>/<N> (e.g. 2/4), not '{text}'")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} does not exist among {count} shards")
+    return index, count
+
+
+def parse_cost_data(text):
+    """Map test names to (number of runs, average seconds) from a CTestCostData.txt file."""
+    costs = {}
+    for line in text.splitlines():
+        if line.strip() == _FAILED_SEPARATOR:
+            break
+        fields = line.rsplit(maxsplit=2)
+        if len(fields) != 3:
+            continue
+        name, runs, cost = fields
+        try:
+            costs[name] = (int(runs), float(cost))
+        except ValueError:
+            continue
+    return costs
+
+
+def format_cost_data(costs):
+    lines = [f"{name} {runs} {cost}" for name, (runs, cost) in sorted(costs.items())]
+    return "\n".join(lines + [_FAILED_SEPARATOR, ""])
+
+
+def _costs_path(project_config):
+    return project_data_dir(project_config["name"]) / COSTS_FILE
+
+
+def _read_history(project_config):
+    path = _costs_path(project_config)
+    try:
+        return json.loads(path.read_text()) if path.exists() else {}
+    except ValueError:
+        return {}
+
+
+def recorded_costs(project_config):
+    """The test costs recorded for the build area, surviving 'spack mpd zap'."""
+    recorded = _read_history(project_config).get(project_config["build"], {})
+    return {name: tuple(entry) for name, entry in recorded.items()}
+
+
+def harvest_costs(project_config):
+    """Add the costs ctest measured in the last run to the project's test history."""
+    cost_data = Path(project_config["build"]) / COST_DATA
+    if not cost_data.exists():
+        return
+    history = _read_history(project_config)
+    recorded = history.setdefault(project_config["build"], {})
+    recorded.update(parse_cost_data(cost_data.read_text()))
+    _costs_path(project_config).write_text(json.dumps(history, indent=2, sort_keys=True))
+
+
+def record_durations(project_config, durations):
+    """Add measured durations {name: seconds} to the recorded averages (as ctest does)."""
+    history = _read_history(project_config)
+    recorded = history.setdefault(project_config["build"], {})
+    for name, seconds in durations.items():
+        runs, cost = recorded.get(name, (0, 0.0))
+        recorded[name] = (runs + 1, (runs * cost + seconds) / (runs + 1))
+    _costs_path(project_config).write_text(json.dumps(history, indent=2, sort_keys=True))
+
+
+def restore_costs(project_config):
+    """Give ctest the recorded costs if the build area has none (e.g. after a zap)."""
+    cost_data = Path(project_config["build"]) / COST_DATA
+    if cost_data.exists():
+        return
+    costs = recorded_costs(project_config)
+    if costs:
+        cost_data.parent.mkdir(parents=True, exist_ok=True)
+        cost_data.write_text(format_cost_data(costs))
+
+
+def list_tests(build_area, selection_arguments):
+    """The tests ctest would run with the selection arguments, in ctest's order.
+
+    Each test is described by its name, command and properties.
+    """
+    result = subprocess.run(
+        ["ctest", "--test-dir", str(build_area), "--show-only=json-v1", *selection_arguments],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        tty.die(
+            "Could not list the tests of the project"
+            + (f":\n{result.stderr}" if result.stderr else " (has it been built?)")
+        )
+    return json.loads(result.stdout)["tests"]
+
+
+def balanced_shards(tests, costs, count):
+    """Split tests into count shards of similar total cost.
+
+    The longest tests are assigned first, each to the shard with the least
+    total cost so far.  Tests without a recorded cost count as the average
+    recorded test.  Each shard lists its tests in their original order.
+    """
+    known = [costs[t][1] for t in tests if t in costs]
+    default = sum(known) / len(known) if known else 1.0
+    test_costs = {t: costs[t][1] if t in costs else default for t in tests}
+
+    loads = [(0.0, i) for i in range(count)]
+    assignment = {}
+    for test in sorted(tests, key=lambda t: (-test_costs[t], t)):
+        load, i = heapq.heappop(loads)
+        assignment[test] = i
+        heapq.heappush(loads, (load + test_costs[test], i))
+
+    shards = [[] for _ in range(count)]
+    for test in tests:
+        shards[assignment[test]].append(test)
+    return shards, [sum(test_costs[t] for t in s) for s in shards]
+
+
+def shard_tests(project_config, tests, index, count):
+    """The names among tests that belong to shard index (1-based) of count."""
+    shards, loads = balanced_shards(tests, recorded_costs(project_config), count)
+    print()
+    tty.msg(
+        f"Shard {bold(f'{index}/{count}')}: {len(shards[index - 1])} of {len(tests)} tests"
+        + gray(
+            f" (estimated {format_duration(loads[index - 1])}"
+            f" of {format_duration(sum(loads))})"
+        )
+    )
+    return shards[index - 1]
+
+
+def test_number_arguments(tests, to_run):
+    """ctest arguments that run only the to_run tests among the selected tests."""
+    to_run = set(to_run)
+    # ctest numbers the tests that pass the other selection options from 1
+    numbers = [str(i) for i, test in enumerate(tests, start=1) if test in to_run]
+    return ["-I", "0,0,0," + ",".join(numbers)]
+
+
+def junit_path(project_config, shard_spec=None):
+    """Default JUnit report of a run (or of one shard of a run)."""
+    name = "junit.xml" if shard_spec is None else "junit-shard-{}-of-{}.xml".format(*shard_spec)
+    return Path(project_config["build"]) / "Testing" / name
+
+
+def merge_junit(inputs, output):
+    """Merge the JUnit reports of several shards into one report; return the merged totals."""
+    merged = ET.Element("testsuite", name="spack-mpd")
+    totals = dict(tests=0, failures=0, disabled=0, skipped=0)
+    time = 0.0
+    slowest_shard = 0.0
+    durations = {}
+    for path in inputs:
+        try:
+            root = ET.parse(path).getroot()
+        except (OSError, ET.ParseError) as e:
+            tty.die(f"Could not read JUnit report {path}: {e}")
+        suites = [root] if root.tag == "testsuite" else root.findall("testsuite")
+        for suite in suites:
+            for key in totals:
+                totals[key] += int(suite.get(key, 0))
+            cases = suite.findall("testcase")
+            shard_time = sum(float(case.get("time", 0)) for case in cases)
+            time += shard_time
+            slowest_shard = max(slowest_shard, shard_time)
+            merged.extend(cases)
+            durations.update(
+                (case.get("name"), float(case.get("time", 0)))
+                for case in cases
+                if case.get("status") == "run"
+            )
+    for key, value in totals.items():
+        merged.set(key, str(value))
+    merged.set("time", f"{time:g}")
+
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(merged).write(output, encoding="UTF-8", xml_declaration=True)
+    return dict(totals, time=time, slowest_shard=slowest_shard, durations=durations)
+
+
+def print_merge_summary(inputs, output, summary):
+    print()
+    tty.msg(
+        f"Merged {len(inputs)} JUnit reports into {cyan(str(output))}:\n"
+        f"    {summary['tests']} tests, {summary['failures']} failed, "
+        f"{summary['skipped'] + summary['disabled']} not run\n"
+        + gray(
+            f"    {format_duration(summary['time'])} of tests, "
+            f"slowest report {format_duration(summary['slowest_shard'])}"
+        )
+    )
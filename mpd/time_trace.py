@@ -0,0 +1,198 @@
+import heapq
+import json
+import os
+from pathlib import Path
+
+from .build import TIME_TRACE_AREA, build_project, configure_if_needed, source_directories
+from .build_report import format_duration, package_for
+from .linking import compiler_family
+from .pgo import flag_defines
+from .spack_compat import tty
+from .util import bold, cyan, gray, magenta
+
+TIME_TRACE_FLAGS = "-ftime-trace"
+
+_INSTANTIATIONS = ("InstantiateClass", "InstantiateFunction")
+
+
+def time_trace_dir(project_config):
+    return Path(project_config["build"]) / TIME_TRACE_AREA
+
+
+def trace_files(build_area):
+    """Yield the time-trace files that Clang writes next to the object files of build_area."""
+    build_area = Path(build_area)
+    for root, dirs, files in os.walk(build_area):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        # Object files (and traces) of sources in subdirectories are nested in the target's
+        # directory, e.g. CMakeFiles/tgt.dir/detail/foo.cc.json
+        if not any(part.endswith(".dir") for part in Path(root).relative_to(build_area).parts):
+            continue
+        for f in sorted(files):
+            if f.endswith(".json"):
+                yield Path(root) / f
+
+
+class TraceSummary:
+    """Totals aggregated over the time traces of many translation units.
+
+    Traces are added one at a time, so that only the totals (and not the
+    traces) are kept in memory.  All durations are in microseconds.
+    """
+
+    def __init__(self, top=15):
+        self.top = top
+        self.units = 0
+        self.frontend = 0
+        self.backend = 0
+        self.headers = {}
+        self.templates = {}
+        self.packages = {}
+        self.slowest_units = []
+
+    def add(self, unit, package, events):
+        frontend = backend = total = 0
+        for event in events:
+            if event.get("ph") != "X":
+                continue
+            name = event.get("name")
+            duration = event.get("dur", 0)
+            if name == "Source":
+                _accumulate(self.headers, event.get("args", {}).get("detail", "?"), duration)
+            elif name in _INSTANTIATIONS:
+                _accumulate(self.templates, event.get("args", {}).get("detail", "?"), duration)
+            elif name == "Frontend":
+                frontend += duration
+            elif name == "Backend":
+                backend += duration
+            elif name == "ExecuteCompiler":
+                total += duration
+
+        self.units += 1
+        self.frontend += frontend
+        self.backend += backend
+        totals = self.packages.setdefault(package, dict(units=0, frontend=0, backend=0, total=0))
+        totals["units"] += 1
+        totals["frontend"] += frontend
+        totals["backend"] += backend
+        totals["total"] += total
+        entry = (total, str(unit))
+        if len(self.slowest_units) < self.top:
+            heapq.heappush(self.slowest_units, entry)
+        else:
+            heapq.heappushpop(self.slowest_units, entry)
+
+    def most_expensive(self, table):
+        """Rows (name, total, count) of table ranked by total time."""
+        rows = sorted(table.items(), key=lambda item: item[1][0], reverse=True)[: self.top]
+        return [(name, total, count) for name, (total, count) in rows]
+
+
+def _accumulate(table, key, duration):
+    entry = table.setdefault(key, [0, 0])
+    entry[0] += duration
+    entry[1] += 1
+
+
+def read_events(path):
+    """Return the events of a Clang time-trace file, or None if path is not one."""
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("traceEvents") if isinstance(data, dict) else None
+
+
+def aggregate(build_area, packages, top=15):
+    build_area = Path(build_area)
+    summary = TraceSummary(top)
+    for path in trace_files(build_area):
+        try:
+            events = read_events(path)
+        except (OSError, ValueError):
+            continue
+        if events is None:
+            continue
+        relative = path.relative_to(build_area)
+        summary.add(relative, package_for(str(relative), build_area, packages), events)
+    return summary
+
+
+def _seconds(microseconds):
+    return format_duration(microseconds / 1e6)
+
+
+def _shorten(text, width=90):
+    return text if len(text) <= width else "..." + text[-(width - 3) :]
+
+
+def print_report(summary):
+    print()
+    tty.msg(
+        f"Compilation time traces of {summary.units} translation units: "
+        f"{_seconds(summary.frontend)} parsing (frontend), "
+        f"{_seconds(summary.backend)} code generation (backend)"
+    )
+
+    name_width = max(len(p) for p in list(summary.packages) + ["Package"])
+    header = f"  {'Package':<{name_width}}  {'Units':>6}  {'Frontend':>9}  {'Backend':>9}"
+    print(f"\n{header}  {'Total':>9}")
+    print("  " + "  ".join("-" * width for width in (name_width, 6, 9, 9, 9)))
+    for package, totals in sorted(
+        summary.packages.items(), key=lambda item: item[1]["total"], reverse=True
+    ):
+        print(
+            f"  {magenta(f'{package:<{name_width}}')}  {totals['units']:>6}"
+            f"  {_seconds(totals['frontend']):>9}  {_seconds(totals['backend']):>9}"
+            f"  {_seconds(totals['total']):>9}"
+        )
+
+    print("\n  Most expensive headers (total parse time, times included, average):")
+    for header, total, count in summary.most_expensive(summary.headers):
+        print(
+            f"    {_seconds(total):>9}  {count:>6}x  {_seconds(total / count):>9}"
+            f"  {_shorten(header)}"
+        )
+
+    print("\n  Most expensive template instantiations (total time, times instantiated):")
+    for template, total, count in summary.most_expensive(summary.templates):
+        print(f"    {_seconds(total):>9}  {count:>6}x  {_shorten(template)}")
+
+    print("\n  Slowest translation units:")
+    for total, unit in sorted(summary.slowest_units, reverse=True):
+        print(f"    {_seconds(total):>9}  {unit}")
+    print()
+
+
+def build_with_time_trace(
+    project_config,
+    parallel,
+    generator_options,
+    targets=None,
+    cmake_defines=None,
+    governor=False,
+    profile=False,
+):
+    """Build the developed packages with Clang's -ftime-trace and report the header costs."""
+    compiler = project_config["compiler_paths"].get("cxx")
+    if not compiler or compiler_family(compiler) != "clang":
+        tty.die(
+            "Compilation time traces require a Clang compiler"
+            + (f" ({bold(compiler)} is not one)" if compiler else "")
+            + "\n"
+            + gray("    GCC does not record the time spent in each header.")
+        )
+
+    area = time_trace_dir(project_config)
+    traced = dict(project_config, build=str(area))
+    print()
+    tty.msg(cyan("Building with compilation time traces") + gray(f" ({area})"))
+    # A compiler cache would skip the compilations whose traces are needed
+    defines = list(cmake_defines or []) + flag_defines(project_config, TIME_TRACE_FLAGS)
+    defines += [
+        f"CMAKE_{lang.upper()}_COMPILER_LAUNCHER="
+        for lang in ("c", "cxx")
+        if lang in project_config["languages"]
+    ]
+    configure_if_needed(traced, defines, profile=profile)
+    build_project(traced, parallel, generator_options, targets, governor=governor)
+
+    print_report(aggregate(area, set(source_directories(project_config))))
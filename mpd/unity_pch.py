@@ -0,0 +1,240 @@
+import os
+import re
+from collections import Counter
+from pathlib import Path
+
+from .spack_compat import tty
+
+DEFAULT_UNITY_BATCH_SIZE = 8
+
+# The precompiled header holds the most frequently included headers of the
+# dependencies; headers included by fewer files are not worth precompiling.
+PCH_MAX_HEADERS = 20
+PCH_MIN_FILES = 3
+
+_INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"]+)[>"]', re.MULTILINE)
+_CXX_SUFFIXES = {".cc", ".cpp", ".cxx", ".C", ".c++", ".h", ".hh", ".hpp", ".hxx", ".icc", ".tcc"}
+
+
+def _exclusions(exclude, current):
+    if exclude is None:
+        return list(current.get("exclude", [])) if current else []
+    return sorted({p.strip() for p in exclude.split(",") if p.strip()})
+
+
+def unity_settings(enable=None, batch_size=None, exclude=None, current=None):
+    """Unity-build settings of the project, or None if unity builds are disabled.
+
+    Settings that are not specified keep their current values.  Specifying a
+    batch size enables unity builds.
+    """
+    if enable is False:
+        return None
+    if not (enable or batch_size or current):
+        if exclude is not None:
+            tty.die("The --unity-exclude option requires unity builds (see --unity)")
+        return None
+    if batch_size is not None and batch_size < 1:
+        tty.die(f"Invalid unity batch size {batch_size} (expected a positive number)")
+    current = current or {}
+    return dict(
+        batch_size=batch_size or current.get("batch_size", DEFAULT_UNITY_BATCH_SIZE),
+        exclude=_exclusions(exclude, current),
+    )
+
+
+def pch_settings(enable=None, exclude=None, current=None):
+    """Precompiled-header settings of the project, or None if they are disabled."""
+    if enable is False:
+        return None
+    if not (enable or current):
+        if exclude is not None:
+            tty.die("The --pch-exclude option requires precompiled headers (see --pch)")
+        return None
+    return dict(exclude=_exclusions(exclude, current))
+
+
+def normalize_exclusions(project_config):
+    """Name the packages excluded from unity builds and PCH by their checked-out repositories.
+
+    Exclusions may be given by Spack package name or by repository name; the
+    develop macro compares them with the repository names.
+    """
+    srcs = project_config.get("srcs", {})
+    for key in ("unity", "pch"):
+        settings = project_config.get(key)
+        if settings:
+            settings["exclude"] = sorted({srcs.get(name, name) for name in settings["exclude"]})
+
+
+def _source_files(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for f in files:
+            if Path(f).suffix in _CXX_SUFFIXES:
+                yield Path(root) / f
+
+
+def include_frequencies(package_dirs):
+    """Map each header included by the packages' C++ files to (files, packages) counts.
+
+    Headers provided by the packages themselves are omitted: they change during
+    development, and precompiling them would rebuild everything.
+    """
+    files = Counter()
+    packages = {}
+    provided = set()
+    for package, directory in package_dirs.items():
+        for path in _source_files(directory):
+            parts = path.relative_to(directory).parts
+            provided.update("/".join(parts[i:]) for i in range(len(parts)))
+            try:
+                text = path.read_text(errors="replace")
+            except OSError:
+                continue
+            for header in set(_INCLUDE.findall(text)):
+                files[header] += 1
+                packages.setdefault(header, set()).add(package)
+    return {
+        header: (count, len(packages[header]))
+        for header, count in files.items()
+        if header not in provided
+    }
+
+
+def select_headers(frequencies, npackages, max_headers=PCH_MAX_HEADERS, min_files=PCH_MIN_FILES):
+    """Return the headers to precompile, the most frequently included first.
+
+    When several packages are developed, only headers included by at least two
+    of them are selected.
+    """
+    min_packages = min(2, npackages)
+    candidates = [
+        (count, header)
+        for header, (count, packages) in frequencies.items()
+        if count >= min_files and packages >= min_packages
+    ]
+    return [header for _, header in sorted(candidates, key=lambda c: (-c[0], c[1]))][:max_headers]
+
+
+def pch_headers(project_config):
+    source_path = Path(project_config["source"])
+    excluded = set(project_config["pch"]["exclude"])
+    package_dirs = {
+        name: source_path / srcs_name
+        for name, srcs_name in project_config["srcs"].items()
+        if name != "cetmodules"
+        and srcs_name not in excluded
+        and (source_path / srcs_name).is_dir()
+    }
+    return select_headers(include_frequencies(package_dirs), len(package_dirs))
+
+
+def _cmake_list(name, values):
+    if not values:
+        return f"set({name})\n"
+    return f"set({name}\n" + "".join(f"  {v}\n" for v in values) + "  )\n"
+
+
+_PCH_FUNCTIONS = """
+# Creates the target whose precompiled header the developed packages reuse.  Candidate
+# headers (other than standard headers) not installed in the environment's view are
+# skipped.
+function(mpd_add_pch_target)
+  set(headers)
+  foreach(header IN LISTS MPD_PCH_CANDIDATES)
+    if (NOT header MATCHES "\\\\." OR EXISTS "${MPD_PCH_INCLUDE_DIR}/${header}")
+      list(APPEND headers "$<$<COMPILE_LANGUAGE:CXX>:<${header}$<ANGLE-R>>")
+    endif()
+  endforeach()
+  set(MPD_PCH_HEADERS "${headers}" PARENT_SCOPE)
+  if (NOT headers)
+    return()
+  endif()
+  file(CONFIGURE OUTPUT ${CMAKE_BINARY_DIR}/mpd_pch.cc CONTENT "")
+  add_library(mpd_pch OBJECT ${CMAKE_BINARY_DIR}/mpd_pch.cc)
+  set_target_properties(mpd_pch PROPERTIES POSITION_INDEPENDENT_CODE ON UNITY_BUILD OFF)
+  target_include_directories(mpd_pch SYSTEM PRIVATE ${MPD_PCH_INCLUDE_DIR})
+  target_precompile_headers(mpd_pch PRIVATE ${headers})
+endfunction()
+
+# Precompiles the headers for the compiled targets of directory and its subdirectories.
+# GCC reuses the precompiled header of mpd_pch, falling back to the headers themselves
+# when a target's compile options differ; other compilers precompile the headers
+# for each target.
+function(mpd_use_pch directory)
+  get_directory_property(targets DIRECTORY ${directory} BUILDSYSTEM_TARGETS)
+  foreach(target IN LISTS targets)
+    get_target_property(type ${target} TYPE)
+    get_target_property(own_headers ${target} PRECOMPILE_HEADERS)
+    get_target_property(reused_headers ${target} PRECOMPILE_HEADERS_REUSE_FROM)
+    if (type MATCHES "^(STATIC_LIBRARY|SHARED_LIBRARY|MODULE_LIBRARY|OBJECT_LIBRARY|EXECUTABLE)$"
+        AND NOT own_headers AND NOT reused_headers)
+      if (CMAKE_CXX_COMPILER_ID STREQUAL "GNU")
+        target_precompile_headers(${target} REUSE_FROM mpd_pch)
+      else()
+        target_precompile_headers(${target} PRIVATE ${MPD_PCH_HEADERS})
+      endif()
+      target_include_directories(${target} SYSTEM AFTER PRIVATE ${MPD_PCH_INCLUDE_DIR})
+    endif()
+  endforeach()
+  get_directory_property(subdirectories DIRECTORY ${directory} SUBDIRECTORIES)
+  foreach(subdirectory IN LISTS subdirectories)
+    mpd_use_pch(${subdirectory})
+  endforeach()
+endfunction()
+"""
+
+
+def develop_preamble(project_config, view_path):
+    """CMake code of develop.cmake that defines the unity-build and PCH settings."""
+    content = ""
+    unity = project_config.get("unity")
+    if unity:
+        content += "# Unity builds\n"
+        content += f"set(CMAKE_UNITY_BUILD_BATCH_SIZE {unity['batch_size']})\n"
+        content += _cmake_list("MPD_UNITY_EXCLUDED", unity["exclude"]) + "\n"
+
+    pch = project_config.get("pch")
+    if pch:
+        headers = pch_headers(project_config)
+        content += "# Precompiled headers, selected by their include frequency\n"
+        content += f'set(MPD_PCH_INCLUDE_DIR "{Path(view_path) / "include"}")\n'
+        content += _cmake_list("MPD_PCH_CANDIDATES", headers)
+        content += _cmake_list("MPD_PCH_EXCLUDED", pch["exclude"])
+        content += _PCH_FUNCTIONS + "\n"
+    return content
+
+
+def develop_prologue(project_config):
+    """CMake code run by the develop macro before adding a package's subdirectory."""
+    content = ""
+    if project_config.get("unity"):
+        content += """  if ("${pkg}" IN_LIST MPD_UNITY_EXCLUDED)
+    set(CMAKE_UNITY_BUILD OFF)
+  else()
+    set(CMAKE_UNITY_BUILD ON)
+  endif()
+"""
+    if project_config.get("pch"):
+        # cetmodules is developed before the project's languages are enabled
+        content += """  if (NOT DEFINED MPD_PCH_HEADERS AND NOT "${pkg}" STREQUAL "cetmodules"
+      AND NOT "${pkg}" IN_LIST MPD_PCH_EXCLUDED)
+    enable_language(CXX)
+    mpd_add_pch_target()
+  endif()
+"""
+    return content
+
+
+def develop_epilogue(project_config):
+    """CMake code run by the develop macro after adding a package's subdirectory."""
+    content = ""
+    if project_config.get("unity"):
+        content += "  unset(CMAKE_UNITY_BUILD)\n"
+    if project_config.get("pch"):
+        content += """  if (MPD_PCH_HEADERS AND NOT "${pkg}" IN_LIST MPD_PCH_EXCLUDED)
+    mpd_use_pch(${pkg})
+  endif()
+"""
+    return content
@@ -73,6 +73,20 @@ def make_yaml_file(package, spec, prefix):
     return str(filepath)
 
 
+def write_if_changed(path, content):
+    """Write content to path unless the file already has that content.
+
+    Leaving unchanged files untouched preserves their modification times, which
+    would otherwise cause build tools to regenerate everything depending on them.
+    Returns True if the file was written.
+    """
+    path = Path(path)
+    if path.exists() and path.read_text() == content:
+        return False
+    path.write_text(content)
+    return True
+
+
 def maybe_with_color(color, msg):
     if not color:
         return msg
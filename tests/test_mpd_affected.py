@@ -0,0 +1,125 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from spack.extensions.mpd import affected, test
+
+pytestmark = pytest.mark.skipif(not shutil.which("git"), reason="git is required")
+
+
+def _git(repo, *arguments):
+    subprocess.run(
+        ["git", "-C", str(repo), "-c", "user.name=mpd", "-c", "user.email=mpd@example.com"]
+        + list(arguments),
+        check=True,
+        capture_output=True,
+    )
+
+
+def _repository(srcs, name):
+    repo = srcs / name
+    repo.mkdir(parents=True)
+    _git(repo, "init", "-q")
+    (repo / "CMakeLists.txt").write_text(f"project({name})\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "initial")
+    return repo
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    srcs = tmp_path / "srcs"
+    for name in ("core", "sim", "reco", "docs"):
+        _repository(srcs, name)
+    monkeypatch.setattr(affected, "project_data_dir", lambda name: tmp_path)
+    return {
+        "name": "test",
+        "source": str(srcs),
+        "build": str(tmp_path / "build"),
+        "srcs": {"core": "core", "sim": "sim", "reco": "reco", "docs": "docs"},
+        # reco depends on sim, which depends on core
+        "package_dependencies": {"core": [], "sim": ["core"], "reco": ["sim", "core"], "docs": []},
+    }
+
+
+def test_with_dependents():
+    dependencies = {"core": [], "sim": ["core"], "reco": ["sim", "core"], "docs": []}
+    assert affected.with_dependents({"sim"}, dependencies) == {"sim", "reco"}
+    assert affected.with_dependents({"core"}, dependencies) == {"core", "sim", "reco"}
+    assert affected.with_dependents(set(), dependencies) == set()
+
+
+def _record(project, activity):
+    affected.record_last_good(project, activity, affected.repository_states(project))
+
+
+def test_affected_packages_since_last_good(project):
+    srcs = Path(project["source"])
+
+    # Nothing was recorded yet
+    assert affected.affected_packages(project, "build") == ["core", "docs", "reco", "sim"]
+
+    _record(project, "build")
+    assert affected.affected_packages(project, "build") == []
+    # Builds and test runs are tracked separately
+    assert affected.affected_packages(project, "test") == ["core", "docs", "reco", "sim"]
+
+    # Uncommitted changes, including untracked files
+    (srcs / "sim" / "new.cc").write_text("int f();\n")
+    assert affected.affected_packages(project, "build") == ["reco", "sim"]
+
+    # Uncommitted changes that were built do not affect the package again...
+    _record(project, "build")
+    assert affected.affected_packages(project, "build") == []
+    # ...unless they change further
+    (srcs / "sim" / "new.cc").write_text("int g();\n")
+    assert affected.affected_packages(project, "build") == ["reco", "sim"]
+
+    # Committed changes since the last successful build
+    _git(srcs / "sim", "add", "-A")
+    _git(srcs / "sim", "commit", "-q", "-m", "add source")
+    assert affected.affected_packages(project, "build") == ["reco", "sim"]
+
+    # A commit that leaves the sources unchanged does not affect the package
+    _record(project, "build")
+    _git(srcs / "core", "commit", "-q", "--allow-empty", "-m", "empty")
+    assert affected.affected_packages(project, "build") == []
+
+
+def test_tests_record_the_last_build(project):
+    srcs = Path(project["source"])
+    _record(project, "build")
+
+    # New commits that were not built yet remain affected after a test run
+    (srcs / "core" / "core.cc").write_text("int c();\n")
+    _git(srcs / "core", "add", "-A")
+    _git(srcs / "core", "commit", "-q", "-m", "add source")
+    affected.record_last_good(project, "test", affected.read_last_good(project, "build"))
+    assert affected.affected_packages(project, "test") == ["core", "reco", "sim"]
+
+    _record(project, "build")
+    assert affected.affected_packages(project, "test") == ["core", "reco", "sim"]
+    affected.record_last_good(project, "test", affected.read_last_good(project, "build"))
+    assert affected.affected_packages(project, "test") == []
+
+
+def test_commits_recorded_by_older_versions(project):
+    srcs = Path(project["source"])
+    commits = {repo: affected.head_commit(srcs / repo) for repo in project["srcs"].values()}
+    affected.record_last_good(project, "build", commits)
+    assert affected.affected_packages(project, "build") == []
+    (srcs / "docs" / "index.md").write_text("# Docs\n")
+    assert affected.affected_packages(project, "build") == ["docs"]
+
+
+def test_unknown_dependencies_affect_all_packages(project):
+    del project["package_dependencies"]
+    assert affected.affected_packages(project, "build") is None
+
+
+def test_test_labels(project):
+    assert test.with_dependents(project, ["sim"]) == ["reco", "sim"]
+    assert test.with_dependents(project, ["core", "docs"]) == ["core", "docs", "reco", "sim"]
+    assert test.label_regex(["g++-tests", "sim"]) == r"^(g\+\+-tests|sim)$"
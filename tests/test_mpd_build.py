@@ -47,3 +47,84 @@ def test_build_includes_targets_before_generator_options(monkeypatch):
         "-j8",
         "VERBOSE=1",
     ]
+
+
+def _configure_inputs(tmp_path, defines=None, previous=None, generator="ninja"):
+    (tmp_path / "srcs").mkdir(exist_ok=True)
+    (tmp_path / "local").mkdir(exist_ok=True)
+    project_config = {
+        "source": str(tmp_path / "srcs"),
+        "local": str(tmp_path / "local"),
+        "generator": {"value": generator},
+        "compiler_paths": {"c": "/usr/bin/gcc", "cxx": "/usr/bin/g++"},
+    }
+    return build.configure_inputs(project_config, defines, previous)
+
+
+def test_reconfigure_only_when_configure_inputs_change(tmp_path):
+    build_area = tmp_path / "build"
+    build_area.mkdir()
+    (tmp_path / "srcs").mkdir()
+    (tmp_path / "srcs" / "CMakePresets.json").write_text("{}")
+
+    inputs = _configure_inputs(tmp_path, ["FOO:BOOL=ON"])
+    assert build.reconfigure_reason(build_area, None, inputs) == (False, None)
+
+    (build_area / "CMakeCache.txt").touch()
+    build.write_configure_fingerprint(build_area, inputs)
+    previous = build.read_configure_fingerprint(build_area)
+
+    # Previous definitions are kept when none are specified
+    inputs = _configure_inputs(tmp_path, previous=previous)
+    assert build.reconfigure_reason(build_area, previous, inputs) is None
+
+    fresh, _ = build.reconfigure_reason(
+        build_area, previous, _configure_inputs(tmp_path, ["FOO:BOOL=ON", "BAR:BOOL=ON"])
+    )
+    assert not fresh
+
+    fresh, _ = build.reconfigure_reason(build_area, previous, _configure_inputs(tmp_path, []))
+    assert fresh
+
+    (tmp_path / "srcs" / "CMakePresets.json").write_text('{"version": 3}')
+    inputs = _configure_inputs(tmp_path, previous=previous)
+    fresh, reason = build.reconfigure_reason(build_area, previous, inputs)
+    assert not fresh and "CMakePresets.json" in reason
+
+    (tmp_path / "local" / "spack.lock").write_text("{}")
+    inputs = _configure_inputs(tmp_path, previous=previous)
+    fresh, reason = build.reconfigure_reason(build_area, previous, inputs)
+    assert fresh and "environment" in reason
+
+    inputs = _configure_inputs(tmp_path, previous=previous, generator="make")
+    fresh, reason = build.reconfigure_reason(build_area, previous, inputs)
+    assert fresh and "generator" in reason
+
+
+def test_build_types_use_separate_build_areas(tmp_path, monkeypatch):
+    project_config = {"build": str(tmp_path / "build"), "build_type": {"value": "Release"}}
+    assert build.build_type_config(project_config, "Release") is project_config
+
+    debug = build.build_type_config(project_config, "Debug")
+    assert debug["build"] == str(tmp_path / "build" / "Debug")
+    assert project_config["build"] == str(tmp_path / "build")
+
+    captured = {}
+    monkeypatch.setattr(build.subprocess, "run", lambda args: captured.setdefault("args", args))
+    debug.update(source=str(tmp_path / "srcs"), generator={"value": "ninja"})
+    build.configure_cmake_project(debug)
+    assert "-DCMAKE_BUILD_TYPE:STRING=Debug" in captured["args"]
+
+
+def test_clean_keeps_build_areas_of_other_build_types(tmp_path):
+    build_path = tmp_path / "build"
+    (build_path / "Debug" / "pkg").mkdir(parents=True)
+    (build_path / "pkg").mkdir()
+    (build_path / "CMakeCache.txt").touch()
+    project_config = {"build": str(build_path)}
+
+    build.clean_build_area(project_config)
+    assert [p.name for p in build_path.iterdir()] == ["Debug"]
+
+    build.clean_build_area(build.build_type_config(project_config, "Debug"))
+    assert not (build_path / "Debug").exists()
@@ -0,0 +1,121 @@
+import pytest
+
+from spack.extensions.mpd import build_report
+
+NINJA_LOG = """# ninja log v5
+0\t1000\t0\told/a.o\t1111
+1000\t4000\t0\told/liba.so\t2222
+0\t500\t0\tphlex/util.o\tbbbb
+500\t900\t0\texamples/ex.o\tdddd
+0\t2000\t0\tphlex/core.o\taaaa
+2000\t2600\t0\tphlex/libphlex.so\tcccc
+2000\t2600\t0\tphlex/libphlex.so.1\tcccc
+2600\t3000\t0\texamples/ex\teeee
+"""
+
+NINJA_GRAPH = """digraph ninja {
+rankdir="LR"
+node [fontsize=10, shape=box, height=0.25]
+edge [fontsize=10]
+"0x1" [label="phlex/libphlex.so"]
+"0x2" [label="phlex/core.o"]
+"0x3" [label="phlex/util.o"]
+"0x4" [label="phlex/libphlex.so.1"]
+"0x9" [label="CXX_SHARED_LIBRARY_LINKER", shape=ellipse]
+"0x9" -> "0x1"
+"0x9" -> "0x4"
+"0x2" -> "0x9" [arrowhead=none]
+"0x3" -> "0x9" [arrowhead=none]
+"0x5" [label="examples/ex"]
+"0x6" [label="examples/ex.o"]
+"0x8" [label="CXX_EXECUTABLE_LINKER", shape=ellipse]
+"0x8" -> "0x5"
+"0x6" -> "0x8" [arrowhead=none]
+"0x1" -> "0x8" [arrowhead=none]
+"0x7" [label="../srcs/examples/ex.cpp"]
+"0x7" -> "0x6" [label=" CXX_COMPILER"]
+}
+"""
+
+
+def _steps(tmp_path):
+    log = tmp_path / ".ninja_log"
+    log.write_text(NINJA_LOG)
+    return build_report.parse_ninja_log(log)
+
+
+def test_parse_ninja_log_keeps_most_recent_build(tmp_path):
+    steps = _steps(tmp_path)
+
+    assert [s.outputs for s in steps] == [
+        ["phlex/util.o"],
+        ["examples/ex.o"],
+        ["phlex/core.o"],
+        ["phlex/libphlex.so", "phlex/libphlex.so.1"],
+        ["examples/ex"],
+    ]
+    assert steps[3].duration == pytest.approx(0.6)
+
+
+def test_parse_ninja_graph_maps_outputs_to_inputs():
+    inputs = build_report.parse_ninja_graph(NINJA_GRAPH)
+
+    assert inputs["phlex/libphlex.so"] == {"phlex/core.o", "phlex/util.o"}
+    assert inputs["phlex/libphlex.so.1"] == {"phlex/core.o", "phlex/util.o"}
+    assert inputs["examples/ex"] == {"examples/ex.o", "phlex/libphlex.so"}
+    assert inputs["examples/ex.o"] == {"../srcs/examples/ex.cpp"}
+
+
+def test_critical_path_follows_slowest_chain(tmp_path):
+    steps = _steps(tmp_path)
+    inputs = build_report.parse_ninja_graph(NINJA_GRAPH)
+
+    path = build_report.critical_path(steps, inputs)
+
+    assert [s.outputs[0] for s in path] == ["phlex/core.o", "phlex/libphlex.so", "examples/ex"]
+
+
+def test_summarize_attributes_time_to_packages(tmp_path):
+    steps = _steps(tmp_path)
+    steps.append(build_report.BuildStep(["build.ninja"], 0.0, 0.25))
+
+    summary = build_report.summarize(steps, tmp_path, {"phlex", "examples"})
+
+    assert summary["wall"] == 3.0
+    assert summary["targets"] == 6
+    assert summary["critical_path"] is None
+    assert summary["packages"]["phlex"] == dict(seconds=pytest.approx(3.1), targets=3)
+    assert summary["packages"]["examples"]["targets"] == 2
+    assert summary["packages"][build_report.SUPERBUILD]["seconds"] == 0.25
+
+
+def test_format_duration():
+    assert build_report.format_duration(4.25) == "4.2s"
+    assert build_report.format_duration(125) == "2m 05s"
+    assert build_report.format_duration(3 * 3600 + 61) == "3h 01m"
+
+
+def test_record_skips_builds_already_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_report, "project_data_dir", lambda name: tmp_path)
+    summary = dict(wall=3.0, cpu=5.0, targets=5, packages={}, critical_path=None)
+
+    assert build_report.record("test", summary, "1:100") == []
+    previous = build_report.record("test", dict(summary, wall=2.0), "2:200")
+    assert [e["wall"] for e in previous] == [3.0]
+
+    # Reporting on the same build again compares against the build before it
+    previous = build_report.record("test", dict(summary, wall=2.0), "2:200")
+    assert [e["wall"] for e in previous] == [3.0]
+    assert len(build_report.read_history("test")) == 2
+
+
+def test_summarize_reports_link_time(tmp_path):
+    steps = _steps(tmp_path)
+    inputs = build_report.parse_ninja_graph(NINJA_GRAPH)
+
+    summary = build_report.summarize(steps, tmp_path, {"phlex", "examples"}, inputs=inputs)
+    assert summary["link"] == dict(seconds=pytest.approx(1.0), targets=2)
+
+    # Without the build graph, only the shared library is recognized as a link step
+    summary = build_report.summarize(steps, tmp_path, {"phlex", "examples"})
+    assert summary["link"] == dict(seconds=pytest.approx(0.6), targets=1)
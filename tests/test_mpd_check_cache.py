@@ -0,0 +1,117 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from spack.extensions.mpd import check_cache
+
+CMAKE_CACHE = """# This is the CMakeCache file.
+//CXX compiler
+CMAKE_CXX_COMPILER:FILEPATH={compiler}
+
+//Flags used by the CXX compiler during all build types.
+CMAKE_CXX_FLAGS:STRING=
+
+CMAKE_BUILD_TYPE:STRING=RelWithDebInfo
+CMAKE_CXX_STANDARD:STRING=20
+CMAKE_CXX_EXTENSIONS:BOOL=OFF
+
+//Have include unistd.h
+HAVE_UNISTD_H:INTERNAL=1
+//Have symbol no_such_symbol
+HAVE_NO_SUCH_SYMBOL:INTERNAL=
+//Test HAS_FLAG_WALL
+HAS_FLAG_WALL:INTERNAL=1
+//CHECK_TYPE_SIZE: sizeof(long)
+SIZEOF_LONG:INTERNAL=8
+//ADVANCED property for variable: CMAKE_CXX_FLAGS
+CMAKE_CXX_FLAGS-ADVANCED:INTERNAL=1
+//Path to a program.
+CMAKE_LINKER:FILEPATH=/usr/bin/ld
+"""
+
+PRESETS_VARIABLES = {
+    "CMAKE_BUILD_TYPE": {"type": "STRING", "value": "RelWithDebInfo"},
+    "CMAKE_CXX_EXTENSIONS": {"type": "BOOL", "value": "OFF"},
+    "CMAKE_CXX_STANDARD": {"type": "STRING", "value": "20"},
+}
+
+
+@pytest.fixture
+def project_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(check_cache.init, "mpd_config_dir", lambda: tmp_path / "mpd")
+    monkeypatch.delenv("CXXFLAGS", raising=False)
+    compiler = tmp_path / "g++"
+    compiler.write_text("#!/bin/sh\necho 'g++ (GCC) 13.2.0'\n")
+    compiler.chmod(0o755)
+    build = tmp_path / "build"
+    build.mkdir()
+    (build / "CMakeCache.txt").write_text(CMAKE_CACHE.format(compiler=compiler))
+    return {
+        "build": str(build),
+        "languages": ["cxx"],
+        "compiler_paths": {"c": str(tmp_path / "gcc"), "cxx": str(compiler)},
+    }
+
+
+def test_check_results_are_harvested(project_config):
+    assert check_cache.harvest(project_config) == 4
+    assert check_cache.cache_variables(project_config, PRESETS_VARIABLES) == {
+        "HAS_FLAG_WALL": {"type": "INTERNAL", "value": "1"},
+        "HAVE_NO_SUCH_SYMBOL": {"type": "INTERNAL", "value": ""},
+        "HAVE_UNISTD_H": {"type": "INTERNAL", "value": "1"},
+        "SIZEOF_LONG": {"type": "INTERNAL", "value": "8"},
+    }
+
+    # Results do not apply to different settings
+    variables = dict(PRESETS_VARIABLES, CMAKE_CXX_FLAGS={"type": "STRING", "value": "-m32"})
+    assert check_cache.cache_variables(project_config, variables) == {}
+
+
+def test_results_of_changed_compilers_are_discarded(project_config):
+    check_cache.harvest(project_config)
+    compiler = project_config["compiler_paths"]["cxx"]
+    with open(compiler, "a") as f:
+        f.write("echo 'upgraded'\n")
+    os.utime(compiler, ns=(0, 0))
+
+    assert check_cache.cache_variables(project_config, PRESETS_VARIABLES) == {}
+    check_cache.prune()
+    assert list(check_cache.results_dir().iterdir()) == []
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not (shutil.which("cmake") and shutil.which("c++")), reason="requires cmake")
+def test_injected_results_skip_checks(tmp_path, monkeypatch):
+    monkeypatch.setattr(check_cache.init, "mpd_config_dir", lambda: tmp_path / "mpd")
+    monkeypatch.delenv("CXXFLAGS", raising=False)
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.18)\nproject(test LANGUAGES CXX)\n"
+        "include(CheckIncludeFileCXX)\ncheck_include_file_cxx(unistd.h HAVE_UNISTD_H)\n"
+    )
+    project_config = {
+        "build": str(tmp_path / "build"),
+        "languages": ["cxx"],
+        "compiler_paths": {"cxx": shutil.which("c++")},
+    }
+    variables = dict(PRESETS_VARIABLES, CMAKE_CXX_COMPILER=project_config["compiler_paths"]["cxx"])
+
+    def configure(build, cache_variables):
+        defines = [f"-D{name}:{v['type']}={v['value']}" for name, v in cache_variables.items()]
+        defines += [f"-D{name}={check_cache._value(value)}" for name, value in variables.items()]
+        return subprocess.run(
+            ["cmake", "-S", str(source), "-B", str(build)] + defines,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    assert "Looking for C++ include unistd.h" in configure(project_config["build"], {})
+    assert check_cache.harvest(project_config) == 1
+
+    cache_variables = check_cache.cache_variables(project_config, variables)
+    assert "HAVE_UNISTD_H" in cache_variables
+    assert "Looking for C++ include" not in configure(tmp_path / "fresh", cache_variables)
@@ -2,6 +2,9 @@
 # Spack Project Developers. See the top-level COPYRIGHT file for details.
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
+import asyncio
+import subprocess
+
 import spack.util.spack_yaml as syaml
 from spack.extensions.mpd import clone, init
 from spack.extensions.mpd.spack_compat import fs
@@ -93,7 +96,7 @@ def test_github_ssh_url_rewrite():
 def test_clone_repos_reports_https_fallback(monkeypatch, tmp_path, capsys):
     repo = clone.GitHubRepo("FNALssi", "cetlib")
 
-    def fake_clone(_repo, _srcs_area, prefer_ssh=False):
+    def fake_clone(_repo, _srcs_area, prefer_ssh=False, commit=None, shallow=False):
         assert prefer_ssh is True
         return (None, True)
 
@@ -110,3 +113,180 @@ def test_clone_repos_reports_https_fallback(monkeypatch, tmp_path, capsys):
     assert changed is True
     out = capsys.readouterr().out
     assert "cloned via https fallback" in out
+
+
+def test_lockfile_round_trip(tmp_path):
+    lockfile = tmp_path / "mpd-lock.yaml"
+    locked = {
+        "cetlib": {"url": "https://github.com/art-framework-suite/cetlib.git", "commit": "a" * 40},
+        "canvas": {"url": "https://github.com/art-framework-suite/canvas.git", "commit": "b" * 40},
+    }
+    clone.write_lockfile(lockfile, locked)
+    assert clone.read_lockfile(lockfile) == locked
+
+
+def test_suite_lockfile_is_not_a_suite_file():
+    suite = clone.Suite("custom", "FNALssi", ["cetlib"], suite_file="/suites/custom-suite.yaml")
+    assert str(suite.lockfile()) == "/suites/custom-suite-lock.yaml"
+    assert not suite.lockfile().name.endswith("-suite.yaml")
+
+
+def test_clone_repos_checks_out_locked_commits(monkeypatch, tmp_path, capsys):
+    cloned = {}
+
+    def fake_clone(repo, _srcs_area, prefer_ssh=False, commit=None, shallow=False):
+        cloned[repo.name()] = (repo.url(), commit, shallow)
+        return (None, False)
+
+    monkeypatch.setattr(clone, "_clone", fake_clone)
+
+    locked = {"cetlib": {"url": "https://example.com/fork/cetlib.git", "commit": "c" * 40}}
+    changed = clone.clone_repos(
+        {"cetlib": clone.GitHubRepo("FNALssi", "cetlib"), "canvas": clone.GitHubRepo("a", "b")},
+        should_fork=False,
+        srcs_area=str(tmp_path),
+        local_area=str(tmp_path),
+        locked=locked,
+        shallow=True,
+    )
+
+    assert changed is True
+    assert cloned == {"cetlib": ("https://example.com/fork/cetlib.git", "c" * 40, True)}
+    out = capsys.readouterr().out
+    assert "cloned at cccccccccc" in out
+    assert "no commit recorded in lockfile" in out
+
+
+def test_freeze_records_checked_out_commits(tmp_path):
+    def git(*args, cwd):
+        return subprocess.run(
+            ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    upstream = tmp_path / "upstream"
+    upstream.mkdir()
+    git("init", "--quiet", cwd=upstream)
+    git(
+        "-c",
+        "user.name=a",
+        "-c",
+        "user.email=a@b",
+        "commit",
+        "--allow-empty",
+        "-m",
+        "x",
+        cwd=upstream,
+    )
+
+    srcs = tmp_path / "srcs"
+    srcs.mkdir()
+    git("clone", "--quiet", str(upstream), "pkg", cwd=srcs)
+
+    clone.freeze({"source": str(srcs)})
+
+    locked = clone.read_lockfile(srcs / "mpd-lock.yaml")
+    assert locked == {
+        "pkg": {"url": str(upstream), "commit": git("rev-parse", "HEAD", cwd=srcs / "pkg")}
+    }
+
+
+class FakeGitHub:
+    """Local stand-in for clone.GhClient"""
+
+    def __init__(self, existing=None, delay=0):
+        self.existing = existing or {}
+        self.delay = delay
+
+    async def login(self):
+        return "me"
+
+    async def repository(self, full_name):
+        return self.existing.get(full_name)
+
+    async def fork(self, full_name):
+        await asyncio.sleep(self.delay)
+        name = full_name.split("/")[1]
+        return {
+            "full_name": f"me/{name}",
+            "clone_url": f"https://github.com/me/{name}.git",
+            "ssh_url": f"git@github.com:me/{name}.git",
+        }
+
+    async def set_default(self, repo_path, full_name):
+        pass
+
+
+def _fake_cloned_repo(monkeypatch, srcs, name, url):
+    def fake_clone(repo, srcs_area, prefer_ssh=False, commit=None, shallow=False):
+        local = srcs / repo.name()
+        subprocess.run(["git", "init", "--quiet", str(local)], check=True)
+        subprocess.run(["git", "-C", str(local), "remote", "add", "origin", url], check=True)
+        return (None, False)
+
+    monkeypatch.setattr(clone, "_clone", fake_clone)
+
+
+def _remote_url(repo_path, remote):
+    return subprocess.run(
+        ["git", "-C", str(repo_path), "remote", "get-url", remote],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def test_clone_repos_forks_with_client(monkeypatch, tmp_path, capsys):
+    url = "https://github.com/FNALssi/cetlib.git"
+    _fake_cloned_repo(monkeypatch, tmp_path, "cetlib", url)
+
+    clone.clone_repos(
+        {"cetlib": clone.GitHubRepo("FNALssi", "cetlib")},
+        should_fork=True,
+        srcs_area=str(tmp_path),
+        local_area=str(tmp_path),
+        fork_client=FakeGitHub(),
+    )
+
+    assert "cloned, created fork me/cetlib" in capsys.readouterr().out
+    assert _remote_url(tmp_path / "cetlib", "origin") == "https://github.com/me/cetlib.git"
+    assert _remote_url(tmp_path / "cetlib", "upstream") == url
+
+
+def test_clone_repos_reuses_existing_fork(monkeypatch, tmp_path, capsys):
+    _fake_cloned_repo(monkeypatch, tmp_path, "cetlib", "git@github.com:FNALssi/cetlib.git")
+    existing = {
+        "me/cetlib": {
+            "full_name": "me/cetlib",
+            "parent": {"full_name": "FNALssi/cetlib"},
+            "clone_url": "https://github.com/me/cetlib.git",
+            "ssh_url": "git@github.com:me/cetlib.git",
+        }
+    }
+
+    clone.clone_repos(
+        {"cetlib": clone.GitHubRepo("FNALssi", "cetlib")},
+        should_fork=True,
+        srcs_area=str(tmp_path),
+        local_area=str(tmp_path),
+        fork_client=FakeGitHub(existing=existing),
+    )
+
+    assert "added fork me/cetlib" in capsys.readouterr().out
+    assert _remote_url(tmp_path / "cetlib", "origin") == "git@github.com:me/cetlib.git"
+
+
+def test_clone_repos_fork_timeout(monkeypatch, tmp_path, capsys):
+    _fake_cloned_repo(monkeypatch, tmp_path, "cetlib", "https://github.com/FNALssi/cetlib.git")
+
+    clone.clone_repos(
+        {"cetlib": clone.GitHubRepo("FNALssi", "cetlib")},
+        should_fork=True,
+        srcs_area=str(tmp_path),
+        local_area=str(tmp_path),
+        fork_client=FakeGitHub(delay=10),
+        fork_timeout=0.1,
+    )
+
+    out = capsys.readouterr().out
+    assert "error" in out
+    assert "fork timed out after 0.1s" in out
@@ -0,0 +1,72 @@
+import types
+
+import pytest
+
+from spack.extensions.mpd import compiler_cache, options
+
+CCACHE_STATS = """stats_updated_timestamp\t1718000000
+direct_cache_hit\t120
+direct_cache_miss\t40
+preprocessed_cache_hit\t5
+preprocessed_cache_miss\t35
+cache_miss\t35
+files_in_cache\t900
+"""
+
+SCCACHE_STATS = """{"stats": {
+  "compile_requests": 60,
+  "cache_hits": {"counts": {"C/C++": 48, "CUDA": 2}, "adv_counts": {}},
+  "cache_misses": {"counts": {"C/C++": 10}, "adv_counts": {}}
+}}"""
+
+
+@pytest.fixture
+def project_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(compiler_cache.init, "mpd_config_dir", lambda: tmp_path / "mpd")
+    monkeypatch.setattr(compiler_cache.shutil, "which", lambda tool: f"/usr/bin/{tool}")
+    top = tmp_path / "proj"
+    return {
+        "top": str(top),
+        "source": str(top / "srcs"),
+        "build": str(top / "build"),
+        "compiler_cache": compiler_cache.settings("ccache"),
+    }
+
+
+def test_ccache_launcher_shares_cache_and_rewrites_project_paths(project_config, tmp_path):
+    launcher = compiler_cache.launcher(project_config).split(";")
+
+    assert launcher[0] == "env"
+    assert launcher[-1] == "/usr/bin/ccache"
+    assert f"CCACHE_DIR={tmp_path / 'mpd' / 'cache' / 'ccache'}" in launcher
+    assert f"CCACHE_BASEDIR={tmp_path / 'proj'}" in launcher
+    assert f"CCACHE_MAXSIZE={compiler_cache.DEFAULT_MAX_SIZE}" in launcher
+    assert (tmp_path / "mpd" / "cache" / "ccache").is_dir()
+
+
+def test_no_launcher_without_compiler_cache(project_config):
+    project_config["compiler_cache"] = None
+    assert compiler_cache.launcher(project_config) is None
+    assert compiler_cache.statistics(project_config) is None
+
+
+def test_parse_cache_statistics():
+    assert compiler_cache.parse_ccache_stats(CCACHE_STATS) == dict(hits=125, misses=35)
+    assert compiler_cache.parse_sccache_stats(SCCACHE_STATS) == dict(hits=50, misses=10)
+
+
+def test_refresh_keeps_tool_when_only_size_changes(project_config):
+    args = types.SimpleNamespace(compiler_cache=None, compiler_cache_size="5G")
+    build_options = options.build_options_from_args(args, project_config)
+    assert build_options == dict(compiler_cache=dict(tool="ccache", max_size="5G"))
+
+    args = types.SimpleNamespace(compiler_cache="none", compiler_cache_size=None)
+    assert options.build_options_from_args(args, project_config) == dict(compiler_cache=None)
+
+    args = types.SimpleNamespace(compiler_cache=None, compiler_cache_size=None)
+    assert options.build_options_from_args(args, project_config) == {}
+
+    # A size without a cache is an error, whether or not the cache is turned off explicitly
+    args = types.SimpleNamespace(compiler_cache="none", compiler_cache_size="20G")
+    with pytest.raises(SystemExit):
+        options.build_options_from_args(args, project_config)
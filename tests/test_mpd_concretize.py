@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from spack.extensions.mpd import concretize
+
+
+def test_cmake_lists_rewritten_only_when_changed(tmp_path):
+    project_config = {
+        "name": "test",
+        "source": str(tmp_path),
+        "srcs": {"cetlib": "cetlib", "cetlib-except": "cetlib-except"},
+    }
+    dependencies = [("cetlib-except", "abc", "/p1"), ("cetlib", "def", "/p2")]
+
+    assert concretize.cmake_lists(project_config, dependencies, cetmodules4=False)
+    cmake_lists = tmp_path / "CMakeLists.txt"
+    assert "project(test LANGUAGES NONE)" in cmake_lists.read_text()
+
+    os.utime(cmake_lists, ns=(0, 0))
+    assert not concretize.cmake_lists(project_config, dependencies, cetmodules4=False)
+    assert cmake_lists.stat().st_mtime_ns == 0
+
+    assert concretize.cmake_lists(project_config, dependencies[:1], cetmodules4=False)
+    assert "develop(cetlib)" not in cmake_lists.read_text()
+
+
+def _install_config_file(prefix, relative_dir, file_name):
+    directory = prefix / relative_dir
+    directory.mkdir(parents=True)
+    (directory / file_name).write_text(f"set({file_name.split('C')[0]}_FOUND TRUE)\n")
+    return directory
+
+
+def test_find_package_hints_point_to_config_file_directories(tmp_path):
+    boost = tmp_path / "boost"
+    boost_dir = _install_config_file(boost, "lib/cmake/Boost-1.84.0", "BoostConfig.cmake")
+    fs_dir = _install_config_file(
+        boost, "lib/cmake/boost_filesystem-1.84.0", "boost_filesystem-config.cmake"
+    )
+    tbb_dir = _install_config_file(tmp_path / "tbb", "lib64/cmake/TBB", "tbb-config.cmake")
+    root_dir = _install_config_file(tmp_path / "root", "cmake", "ROOTConfig.cmake")
+
+    hints = concretize.find_package_hints(
+        [boost, tmp_path / "tbb", tmp_path / "root", tmp_path / "not-installed"]
+    )
+
+    assert {name: hint["value"] for name, hint in hints.items()} == {
+        "Boost_DIR": str(boost_dir),
+        "boost_filesystem_DIR": str(fs_dir),
+        "TBB_DIR": str(tbb_dir),
+        "ROOT_DIR": str(root_dir),
+    }
+
+
+def test_cmake_presets_include_find_package_hints(tmp_path):
+    project_config = {
+        "name": "test",
+        "source": str(tmp_path),
+        "local": str(tmp_path / "local"),
+        "compiler_paths": {"cxx": "/usr/bin/g++"},
+        "cxxstd": {"value": "20"},
+        "languages": ["cxx"],
+        "generator": {"value": "make"},
+    }
+    hints = {"Dep_DIR": {"type": "PATH", "value": "/opt/dep/lib/cmake/Dep"}}
+
+    assert concretize.cmake_presets(project_config, [], False, tmp_path / "view", None, hints)
+    presets = json.loads((tmp_path / "CMakePresets.json").read_text())
+    assert presets["configurePresets"][0]["cacheVariables"]["Dep_DIR"] == hints["Dep_DIR"]
+    # Regenerating the presets with the same hints leaves the file untouched
+    assert not concretize.cmake_presets(project_config, [], False, tmp_path / "view", None, hints)
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+def test_configure_finds_packages_through_hints(tmp_path):
+    prefixes = []
+    for i in range(3):
+        prefix = tmp_path / "opt" / f"dep{i}"
+        _install_config_file(prefix, f"lib/cmake/Dep{i}", f"Dep{i}Config.cmake")
+        prefixes.append(prefix)
+
+    source = tmp_path / "src"
+    source.mkdir()
+    finds = "".join(f"find_package(Dep{i} REQUIRED)\n" for i in range(3))
+    (source / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.24)\nproject(t LANGUAGES NONE)\n" + finds
+    )
+
+    # The prefixes are not searched: the hints alone locate the packages
+    hints = concretize.find_package_hints(prefixes)
+    build = tmp_path / "build"
+    subprocess.run(
+        ["cmake", "-S", source, "-B", build]
+        + [f"-D{name}:PATH={hint['value']}" for name, hint in hints.items()],
+        check=True,
+        capture_output=True,
+    )
+    cache = (build / "CMakeCache.txt").read_text()
+    for i, prefix in enumerate(prefixes):
+        assert f"Dep{i}_DIR:PATH={prefix / 'lib' / 'cmake' / f'Dep{i}'}" in cache
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+def test_benchmark_configure_with_find_package_hints(tmp_path):
+    """Compare configure times of a project with 100 dependencies with and without hints."""
+    ndeps = 100
+    prefixes = []
+    for i in range(ndeps):
+        prefix = tmp_path / "opt" / f"dep{i}"
+        _install_config_file(prefix, f"lib/cmake/Dep{i}", f"Dep{i}Config.cmake")
+        # Unrelated files make the search of each prefix more realistic
+        for j in range(20):
+            (prefix / "lib" / f"libdep{i}_{j}.so").touch()
+        prefixes.append(prefix)
+
+    source = tmp_path / "src"
+    source.mkdir()
+    finds = "".join(f"find_package(Dep{i} REQUIRED)\n" for i in range(ndeps))
+    (source / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.24)\nproject(bench LANGUAGES NONE)\n" + finds
+    )
+
+    hints = concretize.find_package_hints(prefixes)
+    assert len(hints) == ndeps
+
+    def configure(build, defines):
+        start = time.perf_counter()
+        subprocess.run(
+            ["cmake", "-S", source, "-B", build] + defines, check=True, capture_output=True
+        )
+        return time.perf_counter() - start
+
+    prefix_path = ";".join(str(p) for p in prefixes)
+    without_hints = configure(tmp_path / "build1", [f"-DCMAKE_PREFIX_PATH={prefix_path}"])
+    with_hints = configure(
+        tmp_path / "build2",
+        [f"-DCMAKE_PREFIX_PATH={prefix_path}"]
+        + [f"-D{name}:PATH={hint['value']}" for name, hint in hints.items()],
+    )
+    print(f"\nconfigure time without hints: {without_hints:.2f}s, with hints: {with_hints:.2f}s")
+
+    # Each package was found in the config-file directory its hint names
+    cache = (tmp_path / "build2" / "CMakeCache.txt").read_text()
+    for name, hint in hints.items():
+        assert f"{name}:PATH={hint['value']}" in cache
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+def test_develop_macro_labels_tests_by_package(tmp_path):
+    srcs = tmp_path / "srcs"
+    (srcs / "core" / "detail").mkdir(parents=True)
+    (srcs / "sim").mkdir()
+    (srcs / "core" / "CMakeLists.txt").write_text(
+        "add_test(NAME core_t COMMAND true)\n"
+        "set_tests_properties(core_t PROPERTIES LABELS unit)\n"
+        "add_subdirectory(detail)\n"
+    )
+    (srcs / "core" / "detail" / "CMakeLists.txt").write_text(
+        "add_test(NAME detail_t COMMAND true)\n"
+    )
+    (srcs / "sim" / "CMakeLists.txt").write_text("add_test(NAME sim_t COMMAND true)\n")
+    project_config = {"name": "test", "source": str(srcs), "srcs": {"core": "core", "sim": "sim"}}
+    concretize.cmake_develop(project_config, {}, tmp_path / "view")
+    (srcs / "CMakeLists.txt").write_text(
+        concretize.cmake_lists_preamble("test", develop_cetmodules=False, cetmodules4=False)
+        + "add_test(NAME top_t COMMAND true)\ndevelop(core)\ndevelop(sim)\n"
+    )
+
+    build = tmp_path / "build"
+    subprocess.run(["cmake", "-S", srcs, "-B", build], check=True, capture_output=True)
+
+    def tests_labeled(regex):
+        result = subprocess.run(
+            ["ctest", "--test-dir", build, "-N", "-L", regex],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return sorted(line.split()[-1] for line in result.stdout.splitlines() if "Test #" in line)
+
+    assert tests_labeled("^core$") == ["core_t", "detail_t"]
+    assert tests_labeled("^(core|sim)$") == ["core_t", "detail_t", "sim_t"]
+    # Labels of the packages themselves are kept
+    assert tests_labeled("^unit$") == ["core_t"]
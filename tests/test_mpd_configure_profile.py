@@ -0,0 +1,73 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from spack.extensions.mpd import configure_profile
+from spack.extensions.mpd.build_report import SUPERBUILD
+
+
+def _call(name, args, location, begin, end):
+    return [
+        dict(ph="B", name=name, ts=begin, args=dict(functionArgs=args, location=location)),
+        dict(ph="E", ts=end),
+    ]
+
+
+def test_trace_is_aggregated_by_package_and_command():
+    events = (
+        _call("project", "test LANGUAGES NONE", "CMakeLists.txt:2", 0, 1_000_000)
+        + [
+            dict(ph="B", name="develop", ts=1_000_000, args=dict(functionArgs="cetlib")),
+            # find_package calls made by config files count toward the outermost call
+            dict(ph="B", name="find_package", ts=1_100_000, args=dict(functionArgs="Boost")),
+        ]
+        + _call("find_package", "Boost_headers", "BoostConfig.cmake:1", 1_200_000, 1_300_000)
+        + [dict(ph="E", ts=2_100_000)]
+        + _call("execute_process", "COMMAND git", "cetlib/CMakeLists.txt:3", 2_100_000, 2_600_000)
+        + [dict(ph="E", ts=3_000_000)]
+        + _call("try_compile", "HAVE_X", "CMakeLists.txt:9", 3_000_000, 3_500_000)
+    )
+
+    calls, package_seconds, total = configure_profile.parse_trace(events, {"cetlib"})
+    assert total == pytest.approx(3.5)
+    assert package_seconds == pytest.approx({"cetlib": 2.0, SUPERBUILD: 1.5})
+    assert [(c.package, c.command, c.arguments) for c in calls] == [
+        ("cetlib", "find_package", "Boost"),
+        ("cetlib", "execute_process", "COMMAND git"),
+        (SUPERBUILD, "try_compile", "HAVE_X"),
+    ]
+
+    rows = configure_profile.summarize(calls, package_seconds)
+    assert [row[0] for row in rows] == ["cetlib", SUPERBUILD]
+    assert rows[0][2] == pytest.approx({"find_package": 1.0, "execute_process": 0.5})
+
+
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+def test_cmake_trace_is_parsed(tmp_path):
+    source = tmp_path / "src"
+    (source / "pkg").mkdir(parents=True)
+    (source / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.18)\nproject(test LANGUAGES NONE)\n"
+        "macro(develop pkg)\n  add_subdirectory(${pkg})\nendmacro()\ndevelop(pkg)\n"
+    )
+    (source / "pkg" / "CMakeLists.txt").write_text(
+        "execute_process(COMMAND true)\nfind_package(NotInstalled QUIET)\n"
+    )
+    build = tmp_path / "build"
+    build.mkdir()
+    subprocess.run(
+        ["cmake", "-S", str(source), "-B", str(build)]
+        + configure_profile.profiling_arguments(build),
+        check=True,
+        capture_output=True,
+    )
+
+    events = json.loads(configure_profile.trace_path(build).read_text())
+    calls, package_seconds, _ = configure_profile.parse_trace(events, {"pkg"})
+    assert "pkg" in package_seconds
+    assert {(c.package, c.command) for c in calls if c.package == "pkg"} == {
+        ("pkg", "execute_process"),
+        ("pkg", "find_package"),
+    }
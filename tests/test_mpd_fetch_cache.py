@@ -0,0 +1,63 @@
+import shutil
+import subprocess
+import types
+
+import pytest
+
+from spack.extensions.mpd import fetch_cache
+
+
+def _git(*args, cwd):
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@pytest.fixture
+def cetmodules_upstream(tmp_path, monkeypatch):
+    upstream = tmp_path / "cetmodules"
+    upstream.mkdir()
+    _git("init", "--quiet", cwd=upstream)
+    (upstream / "CMakeLists.txt").write_text("project(cetmodules)\n")
+    _git("add", "CMakeLists.txt", cwd=upstream)
+    _git("-c", "user.name=a", "-c", "user.email=a@b", "commit", "-qm", "init", cwd=upstream)
+
+    monkeypatch.setattr(fetch_cache.init, "mpd_config_dir", lambda: tmp_path / "mpd")
+    monkeypatch.setattr(fetch_cache, "CETMODULES_REPOSITORY", str(upstream))
+    monkeypatch.setattr(fetch_cache, "CETMODULES_TAG", _git("rev-parse", "HEAD", cwd=upstream))
+    return upstream
+
+
+def _project(tmp_path, cmake_text):
+    srcs = tmp_path / "srcs"
+    (srcs / "pkg" / "src").mkdir(parents=True)
+    (srcs / "pkg" / "src" / "CMakeLists.txt").write_text(cmake_text)
+    return {"source": str(srcs), "srcs": {"pkg": "pkg"}}
+
+
+def test_cetmodules_sources_are_cached_once(cetmodules_upstream, tmp_path):
+    project_config = _project(tmp_path, "add_library(pkg pkg.cc)\n")
+
+    variables = fetch_cache.cetmodules_cache_variables(project_config)
+    source_dir = fetch_cache.cetmodules_source_dir()
+    assert variables["FETCHCONTENT_SOURCE_DIR_CETMODULES"]["value"] == str(source_dir)
+    assert variables["FETCHCONTENT_FULLY_DISCONNECTED"]["value"] == "ON"
+    assert (source_dir / "CMakeLists.txt").exists()
+
+    # A warm cache does not need the upstream repository
+    shutil.rmtree(cetmodules_upstream)
+    assert fetch_cache.populate_cetmodules()
+
+
+def test_fetchcontent_stays_connected_for_other_dependencies(cetmodules_upstream, tmp_path):
+    project_config = _project(tmp_path, "FetchContent_Declare(fmt GIT_REPOSITORY ...)\n")
+
+    variables = fetch_cache.cetmodules_cache_variables(project_config)
+    assert "FETCHCONTENT_SOURCE_DIR_CETMODULES" in variables
+    assert "FETCHCONTENT_FULLY_DISCONNECTED" not in variables
+
+
+def test_installed_cetmodules_preferred(tmp_path):
+    spec = types.SimpleNamespace(prefix="/opt/cetmodules", satisfies=lambda constraint: True)
+    variables = fetch_cache.cetmodules_cache_variables({"source": str(tmp_path)}, spec)
+    assert variables == {"cetmodules_ROOT": {"type": "PATH", "value": "/opt/cetmodules"}}
@@ -0,0 +1,54 @@
+import os
+
+from spack.extensions.mpd import governor
+
+GB = 1024**3
+
+PRESSURE = """some avg10=12.50 avg60=3.10 avg300=0.80 total=123456
+full avg10=4.00 avg60=1.00 avg300=0.20 total=45678
+"""
+
+
+def test_parse_pressure():
+    assert governor.parse_pressure(PRESSURE) == 12.5
+    assert governor.parse_pressure("") is None
+
+
+def test_target_tokens_follow_memory_and_pressure():
+    def target(in_use, available_gb, pressure=None, current=0):
+        return governor.target_tokens(in_use, available_gb * GB, pressure, 2.0, 15, current)
+
+    # Growth is limited per step
+    assert target(0, 64) == 3
+    assert target(3, 64, current=12) == 15
+    assert target(4, 5, current=8) == 6
+    assert target(4, 64, pressure=governor.PRESSURE_HOLD, current=8) == 4
+    assert target(6, 64, pressure=governor.PRESSURE_SHED, current=8) == 3
+    assert governor.target_tokens(0, None, None, 2.0, 15, 0) == 15
+
+
+def test_governor_grants_and_withdraws_tokens(tmp_path):
+    samples = iter([(8 * GB, None), (GB // 2, 30.0), (8 * GB, None)])
+
+    log_path = tmp_path / "governor.log"
+    with governor.Governor(16, 2.0, log_path, interval=3600, sampler=samples.__next__) as g:
+        assert "--jobserver-auth=fifo:" in os.environ["MAKEFLAGS"]
+        assert g.tokens == 3
+
+        # A client takes a token for a second job
+        client = os.open(g.fifo, os.O_RDWR | os.O_NONBLOCK)
+        assert os.read(client, 1) == b"+"
+
+        # Under memory pressure, only the two free tokens can be withdrawn
+        g.adjust()
+        assert g.tokens == 1
+
+        # Once the client returns its token, tokens are granted again
+        os.write(client, b"+")
+        os.close(client)
+        g.adjust()
+        assert g.tokens == 4
+
+    assert "mpd-jobserver" not in os.environ.get("MAKEFLAGS", "")
+    assert g.history == [3, 1, 4]
+    assert len(log_path.read_text().splitlines()) == 4
@@ -0,0 +1,119 @@
+import shutil
+import subprocess
+
+import pytest
+
+from spack.extensions.mpd import build_report, impact
+
+NINJA_DEPS = """phlex/CMakeFiles/phlex.dir/core.cpp.o: #deps 3, deps mtime 1700000000 (VALID)
+    /srcs/phlex/core.cpp
+    /srcs/phlex/core.hpp
+    /view/include/boost/graph.hpp
+
+examples/CMakeFiles/ex.dir/ex.cpp.o: #deps 2, deps mtime 1700000001 (STALE)
+    /srcs/examples/ex.cpp
+    /srcs/phlex/core.hpp
+
+"""
+
+
+def test_parse_ninja_deps():
+    deps = impact.parse_ninja_deps(NINJA_DEPS)
+    assert deps["phlex/CMakeFiles/phlex.dir/core.cpp.o"][-1] == "/view/include/boost/graph.hpp"
+    assert deps["examples/CMakeFiles/ex.dir/ex.cpp.o"] == [
+        "/srcs/examples/ex.cpp",
+        "/srcs/phlex/core.hpp",
+    ]
+
+
+def test_parse_link_command(tmp_path):
+    output, inputs = impact.parse_link_command(
+        "/usr/bin/c++ CMakeFiles/b.dir/b.cc.o -o b -Wl,-rpath,/x ../a/liba.so -ldl", tmp_path
+    )
+    assert output == str(tmp_path / "b")
+    assert inputs == [
+        str(tmp_path / "CMakeFiles/b.dir/b.cc.o"),
+        str(tmp_path.parent / "a/liba.so"),
+    ]
+
+    output, inputs = impact.parse_link_command("/usr/bin/ar qc libc.a CMakeFiles/c.dir/c.o", "/b")
+    assert (output, inputs) == ("/b/libc.a", ["/b/CMakeFiles/c.dir/c.o"])
+    assert impact.parse_link_command("/usr/bin/ranlib libc.a", "/b") == (None, [])
+
+
+def test_affected_outputs_follow_links():
+    inputs = {
+        "/b/phlex/core.o": {"/srcs/phlex/core.cpp", "/srcs/phlex/core.hpp"},
+        "/b/examples/ex.o": {"/srcs/examples/ex.cpp", "/srcs/phlex/core.hpp"},
+        "/b/phlex/libphlex.so": {"/b/phlex/core.o"},
+        "/b/examples/ex": {"/b/examples/ex.o", "/b/phlex/libphlex.so"},
+    }
+    index = impact.Index.from_dependencies(inputs, {"/b/phlex/core.o": 2.0})
+    index = impact.Index.from_json(index.to_json())
+
+    assert index.affected(["/srcs/examples/ex.cpp"]) == ["/b/examples/ex", "/b/examples/ex.o"]
+    assert index.affected(["/srcs/phlex/core.hpp"]) == [
+        "/b/examples/ex",
+        "/b/examples/ex.o",
+        "/b/phlex/core.o",
+        "/b/phlex/libphlex.so",
+    ]
+    assert index.lookup("/srcs/unused.hpp") is None
+
+    summary = impact.summarize(index, index.affected(["/srcs/phlex/core.cpp"]), "/b", {"phlex"})
+    assert summary["phlex"] == dict(objects=1, links=1, other=0, seconds=2.0, untimed=1)
+    assert summary[build_report.SUPERBUILD]["links"] == 1
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+def test_impact_of_make_build(tmp_path, monkeypatch, capsys):
+    src = tmp_path / "srcs"
+    for package in ("a", "b"):
+        (src / package).mkdir(parents=True)
+    (src / "common.hpp").write_text("#pragma once\ninline int h() { return 1; }\n")
+    (src / "b.hpp").write_text("#pragma once\nint a();\n")
+    (src / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.24)\nproject(t CXX)\n"
+        "add_subdirectory(a)\nadd_subdirectory(b)\n"
+    )
+    (src / "a" / "CMakeLists.txt").write_text(
+        "add_library(a SHARED a.cc)\ntarget_include_directories(a PUBLIC ${CMAKE_SOURCE_DIR})\n"
+    )
+    (src / "a" / "a.cc").write_text('#include "common.hpp"\nint a() { return h(); }\n')
+    (src / "b" / "CMakeLists.txt").write_text(
+        "add_executable(b b.cc)\ntarget_link_libraries(b a)\n"
+    )
+    (src / "b" / "b.cc").write_text('#include "b.hpp"\nint main() { return a(); }\n')
+
+    build = tmp_path / "build"
+    subprocess.run(["cmake", "-S", src, "-B", build], check=True, capture_output=True)
+    subprocess.run(["cmake", "--build", build], check=True, capture_output=True)
+
+    project_config = {
+        "name": "test",
+        "source": str(src),
+        "build": str(build),
+        "generator": {"value": "make"},
+    }
+    monkeypatch.setattr(impact, "read_history", lambda name: [])
+    index = impact.load_index(project_config)
+    assert index.affected([str(src / "b.hpp")]) == [
+        str(build / "b" / "CMakeFiles" / "b.dir" / "b.cc.o"),
+        str(build / "b" / "b"),
+    ]
+    # Changing the library's header recompiles the library and relinks both targets
+    affected = index.affected([str(src / "common.hpp")])
+    assert affected == [
+        str(build / "a" / "CMakeFiles" / "a.dir" / "a.cc.o"),
+        str(build / "a" / "liba.so"),
+        str(build / "b" / "b"),
+    ]
+
+    # The cached index is reused until the dependency information changes
+    assert (build / impact.INDEX_FILE).exists()
+    monkeypatch.setattr(impact, "build_index", None)
+    impact.print_impact(project_config, [str(src / "common.hpp")], list_outputs=True)
+    output = capsys.readouterr().out
+    assert "rebuild 1 objects" in output and "relink 2 targets" in output
+    assert "a/liba.so" in output
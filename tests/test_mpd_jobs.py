@@ -0,0 +1,51 @@
+import pytest
+
+from spack.extensions.mpd import jobs
+
+MEMINFO = """MemTotal:       33554432 kB
+MemFree:         1048576 kB
+MemAvailable:   12582912 kB
+HugePages_Total:       0
+"""
+
+GB = 1024**3
+
+
+def test_parse_meminfo():
+    entries = jobs.parse_meminfo(MEMINFO)
+    assert entries["MemTotal"] == 32 * GB
+    assert entries["MemAvailable"] == 12 * GB
+    assert entries["HugePages_Total"] == 0
+
+
+def test_job_pools_sized_from_total_memory(monkeypatch):
+    monkeypatch.setattr(jobs.os, "cpu_count", lambda: 64)
+    project_config = {"generator": {"value": "ninja"}, "job_memory": {"link": 6.0}}
+
+    assert jobs.job_pools(project_config, memory=32 * GB) == {"mpd_compile": 16, "mpd_link": 5}
+
+    monkeypatch.setattr(jobs, "total_memory", lambda: 32 * GB)
+    cache_variables = jobs.job_pool_cache_variables(project_config)
+    assert cache_variables["CMAKE_JOB_POOLS"]["value"] == "mpd_compile=16;mpd_link=5"
+    assert cache_variables["CMAKE_JOB_POOL_LINK"]["value"] == "mpd_link"
+
+    project_config["generator"]["value"] = "make"
+    assert jobs.job_pool_cache_variables(project_config) == {}
+
+
+def test_default_parallelism_bounded_by_memory_and_cpus(monkeypatch):
+    monkeypatch.setattr(jobs.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(jobs, "available_memory", lambda: 12 * GB)
+    assert jobs.default_parallelism({}) == 6
+    assert jobs.default_parallelism({"job_memory": {"compile": 0.5}}) == 8
+    assert jobs.default_parallelism({"job_memory": {"compile": 64.0}}) == 1
+
+    monkeypatch.setattr(jobs, "available_memory", lambda: None)
+    assert jobs.default_parallelism({}) == 8
+
+
+def test_parse_job_memory():
+    assert jobs.parse_job_memory("2.5") == 2.5
+    for value in ("0", "-1", "many", "nan", "inf"):
+        with pytest.raises(SystemExit):
+            jobs.parse_job_memory(value)
@@ -0,0 +1,75 @@
+import shutil
+import types
+
+import pytest
+
+from spack.extensions.mpd import linking, options
+
+GCC = shutil.which("g++")
+
+
+def _project(link, compiler=GCC):
+    return {
+        "languages": ["cxx"],
+        "compiler_paths": {"cxx": compiler},
+        "link": link,
+    }
+
+
+def test_link_settings():
+    assert linking.settings() == {}
+    current = linking.settings("mold", True, "thin")
+    assert current == dict(linker="mold", split_dwarf=True, lto="thin")
+    assert linking.settings(lto="none", current=current) == dict(linker="mold", split_dwarf=True)
+    assert linking.settings("default", False, current=current) == dict(lto="thin")
+    assert linking.describe(current) == "mold, split DWARF, thin LTO"
+    assert linking.describe({}) == "default linker"
+
+
+def test_link_options_kept_by_refresh():
+    args = types.SimpleNamespace(linker=None, split_dwarf=None, lto=None, target=None)
+    current = {"link": dict(linker="lld"), "target": {}}
+    assert "link" not in options.build_options_from_args(args, current)
+
+    args.split_dwarf = True
+    assert options.build_options_from_args(args, current)["link"] == dict(
+        linker="lld", split_dwarf=True
+    )
+
+
+def test_flags():
+    link = dict(linker="lld", split_dwarf=True, lto="full")
+    assert linking.compile_flags(link, "gcc") == "-gsplit-dwarf -flto=auto"
+    assert linking.compile_flags(link, "clang") == "-gsplit-dwarf -flto=full"
+    assert linking.linker_flags(link) == "-fuse-ld=lld -Wl,--gdb-index"
+    # GNU ld cannot write a .gdb_index section
+    assert linking.linker_flags(dict(split_dwarf=True)) == ""
+
+
+@pytest.mark.skipif(not GCC, reason="g++ is required")
+def test_cache_variables_combine_target_flags():
+    variables = linking.cache_variables(
+        _project(dict(linker="gold", split_dwarf=True)), {"cxx": "-march=haswell"}
+    )
+    assert variables["CMAKE_CXX_FLAGS"]["value"] == "-march=haswell -gsplit-dwarf"
+    assert variables["CMAKE_SHARED_LINKER_FLAGS"]["value"] == "-fuse-ld=gold -Wl,--gdb-index"
+    assert "CMAKE_AR" not in variables
+
+
+@pytest.mark.skipif(not GCC, reason="g++ is required")
+def test_thin_lto_requires_clang():
+    with pytest.raises(SystemExit):
+        linking.validate(_project(dict(lto="thin")))
+
+
+@pytest.mark.skipif(not (GCC and shutil.which("ld.gold")), reason="g++ and gold are required")
+def test_validate_supported_settings():
+    linking.validate(_project(dict(linker="gold", split_dwarf=True, lto="full")))
+
+
+@pytest.mark.skipif(not GCC or shutil.which("mold"), reason="g++ without mold is required")
+def test_validate_rejects_missing_linker(capsys):
+    with pytest.raises(SystemExit):
+        linking.validate(_project(dict(linker="mold")))
+    captured = capsys.readouterr()
+    assert "cannot link with mold" in captured.out + captured.err
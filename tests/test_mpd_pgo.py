@@ -0,0 +1,78 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from spack.extensions.mpd import pgo
+
+
+def test_pgo_flags_extend_preset_flags(tmp_path):
+    presets = {
+        "configurePresets": [
+            {"cacheVariables": {"CMAKE_CXX_FLAGS": {"type": "STRING", "value": "-march=haswell"}}}
+        ]
+    }
+    (tmp_path / "CMakePresets.json").write_text(json.dumps(presets))
+    project_config = {"source": str(tmp_path), "languages": ["cxx", "python"]}
+
+    flags = pgo.instrumentation_flags("clang", tmp_path / "profiles", tmp_path / "build")
+    assert pgo.flag_defines(project_config, flags) == [
+        f"CMAKE_CXX_FLAGS:STRING=-march=haswell -fprofile-generate={tmp_path / 'profiles'}"
+    ]
+
+
+def test_build_area_environment(tmp_path, monkeypatch):
+    (tmp_path / "pkg" / "lib").mkdir(parents=True)
+    (tmp_path / "pkg" / "lib" / "libpkg.so").touch()
+    (tmp_path / "pkg" / "bin").mkdir()
+    (tmp_path / "Debug" / "lib").mkdir(parents=True)
+    (tmp_path / "Debug" / "lib" / "libpkg.so").touch()
+    monkeypatch.setenv("LD_LIBRARY_PATH", "/opt/lib")
+
+    env = pgo.build_area_environment(tmp_path, exclude=("Debug",))
+    assert env["LD_LIBRARY_PATH"] == f"{tmp_path / 'pkg' / 'lib'}:/opt/lib"
+    assert env["PATH"].startswith(f"{tmp_path / 'pkg' / 'bin'}:")
+    assert env["MPD_BUILD_AREA"] == str(tmp_path)
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not (shutil.which("cmake") and shutil.which("g++")), reason="requires g++")
+def test_gcc_profiles_are_found_by_a_different_build_area(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.18)\nproject(test CXX)\n"
+        "add_library(work SHARED work.cc)\nadd_executable(app main.cc)\n"
+        "target_link_libraries(app work)\n"
+    )
+    (source / "work.cc").write_text(
+        "int work(int n) { int s = 0; for (int i = 0; i < n; ++i) s += i % 3; return s; }\n"
+    )
+    (source / "main.cc").write_text("int work(int);\nint main() { return work(1000) < 0; }\n")
+    profiles = tmp_path / "profiles"
+    project_config = {"source": str(source), "languages": ["cxx"]}
+
+    def build(build_area, flags):
+        defines = [f"-D{d}" for d in pgo.flag_defines(project_config, flags)]
+        subprocess.run(
+            ["cmake", "-S", str(source), "-B", str(build_area)] + defines,
+            check=True,
+            capture_output=True,
+        )
+        result = subprocess.run(
+            ["cmake", "--build", str(build_area)], check=True, capture_output=True, text=True
+        )
+        return result.stdout + result.stderr
+
+    instrumented = tmp_path / "instrumented"
+    build(instrumented, pgo.instrumentation_flags("gcc", profiles, instrumented))
+    subprocess.run(
+        [str(instrumented / "app")], env=pgo.build_area_environment(instrumented), check=True
+    )
+    assert pgo.merge_profiles("gcc", profiles, project_config) == profiles
+
+    optimized = tmp_path / "optimized"
+    flags = pgo.optimization_flags("gcc", profiles, optimized)
+    output = build(optimized, flags.replace("-Wno-missing-profile", "-Wmissing-profile"))
+    assert "profile" not in output
@@ -0,0 +1,49 @@
+import json
+import socket
+
+import pytest
+
+from spack.extensions.mpd import slots
+
+
+@pytest.fixture
+def broker(tmp_path, monkeypatch):
+    monkeypatch.setattr(slots.init, "mpd_config_dir", lambda: tmp_path)
+    slots.enable(8)
+    return slots.slots_dir()
+
+
+def test_fair_shares():
+    assert slots.fair_shares([(1, 64), (2, 64)], 16) == {1: 8, 2: 8}
+    assert slots.fair_shares([(1, 2), (2, 64), (3, 64)], 16) == {1: 2, 2: 7, 3: 7}
+    assert slots.fair_shares([(1, 64), (2, 64), (3, 64)], 16) == {1: 6, 2: 5, 3: 5}
+    assert slots.fair_shares([(1, 4)], 16) == {1: 4}
+    assert slots.fair_shares([(i, 4) for i in range(3)], 2) == {0: 1, 1: 1, 2: 1}
+
+
+def test_lease_is_released_on_exit(broker):
+    with slots.Lease("proj", "build", 32) as lease:
+        assert [entry["project"] for entry in slots.leases()] == ["proj"]
+        assert lease.share() == 8
+    assert slots.leases() == []
+
+
+def test_leases_of_dead_processes_are_removed(broker):
+    # A lease file that nobody holds a lock on belongs to a process that died
+    stale = broker / f"lease-{socket.gethostname()}-999999.json"
+    stale.write_text(
+        json.dumps(
+            dict(pid=999999, user="u", project="p", command="build", requested=4, started=0)
+        )
+    )
+
+    with slots.Lease("proj", "build", 32) as lease:
+        assert len(slots.leases()) == 1
+        assert lease.share() == 8
+    assert not stale.exists()
+
+
+def test_disabled_broker_has_no_lease(broker):
+    slots.disable()
+    assert slots.capacity() is None
+    assert slots.lease_for({"name": "proj"}, "build", 4) is None
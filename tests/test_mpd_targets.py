@@ -0,0 +1,65 @@
+import types
+
+import pytest
+
+from spack.extensions.mpd import options, targets
+from spack.extensions.mpd.spack_compat import archspec_cpu
+
+
+@pytest.fixture
+def haswell_host(monkeypatch):
+    monkeypatch.setattr(targets, "host", lambda: archspec_cpu.TARGETS["haswell"])
+
+
+def test_target_settings(haswell_host):
+    assert targets.settings() == dict(develop="x86_64_v3", dependencies="x86_64_v3")
+    assert targets.settings(develop="native") == dict(develop="haswell", dependencies="x86_64_v3")
+
+    current = dict(develop="haswell", dependencies="x86_64_v2")
+    assert targets.settings(current=current) == current
+    assert targets.settings(dependencies="x86_64", current=current) == dict(
+        develop="haswell", dependencies="x86_64"
+    )
+
+
+def test_default_target_of_older_hosts(monkeypatch):
+    monkeypatch.setattr(targets, "host", lambda: archspec_cpu.TARGETS["nehalem"])
+    assert targets.default_target() == "x86_64_v2"
+
+
+def test_target_options_recorded_for_new_projects(haswell_host):
+    args = types.SimpleNamespace(target=None, dependency_target=None)
+    assert options.build_options_from_args(args)["target"] == dict(
+        develop="x86_64_v3", dependencies="x86_64_v3"
+    )
+    current = {"target": dict(develop="x86_64_v3", dependencies="x86_64_v3")}
+    assert "target" not in options.build_options_from_args(args, current)
+
+
+def test_unsupported_target_is_rejected(haswell_host):
+    targets.check_host({"target": dict(develop="x86_64_v3", dependencies="x86_64_v3")})
+    with pytest.raises(SystemExit):
+        targets.check_host({"target": dict(develop="skylake_avx512", dependencies="x86_64_v3")})
+    with pytest.raises(SystemExit):
+        targets.resolve("no-such-target")
+
+
+def test_optimization_flags():
+    assert "-march=x86-64-v3" in targets.optimization_flags("x86_64_v3", "gcc", "13.2.0")
+
+
+def test_mismatched_dependencies_are_reported(haswell_host):
+    def spec(name, target, external=False):
+        return types.SimpleNamespace(name=name, version="1.0", target=target, external=external)
+
+    project_config = {
+        "packages": {"cetlib": {}},
+        "target": dict(develop="native", dependencies="x86_64_v3"),
+    }
+    specs = [
+        spec("cetlib", "haswell"),
+        spec("boost", "x86_64_v3"),
+        spec("tbb", "x86_64_v2"),
+        spec("glibc", "x86_64", external=True),
+    ]
+    assert targets.mismatched_dependencies(project_config, specs) == ["tbb@1.0 target=x86_64_v2"]
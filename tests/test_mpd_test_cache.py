@@ -0,0 +1,141 @@
+import shutil
+import subprocess
+
+import pytest
+
+from spack.extensions.mpd import test_cache, test_schedule
+
+LDD_OUTPUT = """\tlinux-vdso.so.1 (0x00007ffd)
+\tlibphlex.so => /build/phlex/libphlex.so (0x00007f01)
+\tlibc.so.6 => /lib/x86_64-linux-gnu/libc.so.6 (0x00007f02)
+\tlibmissing.so => not found
+\t/lib64/ld-linux-x86-64.so.2 (0x00007f03)
+"""
+
+
+def test_parse_ldd():
+    assert test_cache.parse_ldd(LDD_OUTPUT) == [
+        "/build/phlex/libphlex.so",
+        "/lib/x86_64-linux-gnu/libc.so.6",
+        "/lib64/ld-linux-x86-64.so.2",
+    ]
+
+
+def test_test_environment():
+    environ = {"PATH": "/bin", "PWD": "/home", "SSH_TTY": "/dev/pts/1", "A": "0"}
+    properties = {"ENVIRONMENT": ["A=1", "B=x=y"]}
+    assert test_cache.test_environment(properties, environ) == {
+        "PATH": "/bin",
+        "A": "1",
+        "B": "x=y",
+    }
+
+
+def test_file_hashes_follow_contents(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "input.txt").write_text("1")
+    hashes = test_cache.FileHashes()
+    before = hashes.digest(data)
+    assert hashes.digest(data) == before
+
+    (data / "input.txt").write_text("2")
+    assert hashes.digest(data) != before
+    assert hashes.digest(tmp_path / "absent") == "missing"
+
+
+def test_junit_outcomes_and_cached_tests(tmp_path):
+    report = tmp_path / "junit.xml"
+    report.write_text(
+        '<testsuite tests="2" failures="1">'
+        '<testcase name="a" time="1.5" status="run"/>'
+        '<testcase name="b" time="2" status="fail"><failure message="Failed"/></testcase>'
+        "</testsuite>"
+    )
+    assert test_cache.junit_outcomes(report) == {"a": (True, 1.5), "b": (False, 2.0)}
+
+    test_cache.add_cached_to_junit(report, [("c", 4.0)])
+    root = test_schedule.ET.parse(report).getroot()
+    assert root.get("tests") == "3"
+    assert root[-1].get("status") == "cached"
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+def test_cached_tests_are_not_rerun(tmp_path, monkeypatch, capsys):
+    src = tmp_path / "src"
+    src.mkdir()
+    for name, status in (("pass", 0), ("fail", 1), ("other", 0)):
+        (src / f"{name}.sh").write_text(f"exit {status}\n")
+    (src / "data.txt").write_text("1")
+    (src / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.24)\nproject(t NONE)\nenable_testing()\n"
+        "add_test(NAME pass COMMAND sh pass.sh WORKING_DIRECTORY ${CMAKE_SOURCE_DIR})\n"
+        "set_tests_properties(pass PROPERTIES REQUIRED_FILES ${CMAKE_SOURCE_DIR}/data.txt)\n"
+        "add_test(NAME fail COMMAND sh ${CMAKE_SOURCE_DIR}/fail.sh)\n"
+        "add_test(NAME other COMMAND sh ${CMAKE_SOURCE_DIR}/other.sh)\n"
+    )
+    build = tmp_path / "build"
+    subprocess.run(["cmake", "-S", src, "-B", build], check=True, capture_output=True)
+    monkeypatch.setattr(test_cache, "project_data_dir", lambda name: tmp_path)
+    project_config = {"name": "test", "build": str(build)}
+    results = build / test_cache.RESULTS_FILE
+
+    def run_tests():
+        tests = test_schedule.list_tests(build, [])
+        cache = test_cache.TestCache(project_config)
+        to_run, cached = cache.partition(tests)
+        if to_run:
+            names = [test["name"] for test in tests]
+            subprocess.run(
+                ["ctest", "--test-dir", build, "--output-junit", results]
+                + test_schedule.test_number_arguments(names, to_run),
+                capture_output=True,
+            )
+        cache.record(test_cache.junit_outcomes(results) if to_run else {})
+        return sorted(to_run), sorted(name for name, _ in cached)
+
+    assert run_tests() == (["fail", "other", "pass"], [])
+    # Failing tests always run again
+    assert run_tests() == (["fail"], ["other", "pass"])
+
+    # Changing a declared data file or a file on the command line invalidates the result
+    (src / "data.txt").write_text("2")
+    (src / "other.sh").write_text("exit 0 # changed\n")
+    assert run_tests() == (["fail", "other", "pass"], [])
+
+    test_cache.print_summary([("pass", 90.0), ("other", 30.0)], 3)
+    assert "2 of 3 tests passed before" in capsys.readouterr().out
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not (shutil.which("gcc") and shutil.which("ldd")), reason="gcc is required")
+def test_libraries_of_wrapped_executables_are_keyed(tmp_path, monkeypatch):
+    def compile_library(value):
+        (tmp_path / "value.c").write_text(f"int value(void) {{ return {value}; }}\n")
+        subprocess.run(
+            ["gcc", "-shared", "-fPIC", "-o", tmp_path / "libvalue.so", tmp_path / "value.c"],
+            check=True,
+        )
+
+    compile_library(0)
+    (tmp_path / "main.c").write_text("int value(void);\nint main(void) { return value(); }\n")
+    subprocess.run(
+        ["gcc", "-o", tmp_path / "main", tmp_path / "main.c", f"-L{tmp_path}", "-lvalue"]
+        + [f"-Wl,-rpath,{tmp_path}"],
+        check=True,
+    )
+    (tmp_path / "wrapper.sh").write_text('exec "$@"\n')
+    # Like cetmodules' cet_exec_test, a script runs the test's executable
+    test = {
+        "name": "t",
+        "command": ["/bin/sh", str(tmp_path / "wrapper.sh"), str(tmp_path / "main")],
+    }
+
+    monkeypatch.setattr(test_cache, "project_data_dir", lambda name: tmp_path)
+    project_config = {"name": "test", "build": str(tmp_path / "build")}
+    before = test_cache.TestCache(project_config).key(test)
+
+    # Rebuilding the library without relinking the executable changes the key
+    compile_library(1)
+    assert test_cache.TestCache(project_config).key(test) != before
@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from spack.extensions.mpd import concretize, test_resources, test_schedule
+
+
+def _test(name, command=None, groups=None, working_directory=None):
+    properties = []
+    if groups:
+        properties.append({"name": "RESOURCE_GROUPS", "value": groups})
+    if working_directory:
+        properties.append({"name": "WORKING_DIRECTORY", "value": working_directory})
+    return {"name": name, "command": command or ["/bin/" + name], "properties": properties}
+
+
+def test_default_requirements_from_recorded_peaks():
+    tests = [
+        _test("declared", groups=[{"requirements": [{".type": "memory", "slots": 500}]}]),
+        _test("gpu", groups=[{"requirements": [{".type": "gpus", "slots": 1}]}]),
+        _test("heavy"),
+        _test("huge"),
+        _test("unknown"),
+    ]
+    assert test_resources.declared_memory(tests[0]) == 500
+    assert test_resources.declared_memory(tests[1]) is None
+
+    peaks = {"declared": 9000, "gpu": 100, "heavy": 3000, "huge": 70000}
+    assert test_resources.default_requirements(tests, peaks, memory_mb=64000) == {
+        "gpu": 120,
+        "heavy": 3600,
+        "huge": 64000,
+    }
+
+
+def test_resource_spec():
+    spec = test_resources.resource_spec(16000)
+    assert spec["local"] == [{"memory": [{"id": "0", "slots": 16000}]}]
+
+
+def test_monitor_identifies_tests(monkeypatch):
+    tests = [
+        _test("script", command=["/srcs/run.sh", "-c", "a.fcl"]),
+        _test("in_a", command=["/bin/art", "-c", "x.fcl"], working_directory="/build/a"),
+        _test("in_b", command=["/bin/art", "-c", "x.fcl"], working_directory="/build/b"),
+    ]
+    monitor = test_resources.PeakMemoryMonitor(tests)
+    processes = {
+        10: (b"/bin/bash\0/srcs/run.sh\0-c\0a.fcl\0", None),
+        11: (b"/bin/art\0-c\0x.fcl\0", "/build/b"),
+        12: (b"/bin/other\0", None),
+        13: (b"sleep\0", None),
+    }
+    monkeypatch.setattr(test_resources, "_read_proc", lambda pid, name: processes[pid][0])
+    monkeypatch.setattr(test_resources.os, "readlink", lambda path: processes[11][1])
+    assert [monitor.identify(pid) for pid in (10, 11, 12)] == ["script", "in_b", None]
+
+    # Test 10 runs in a ctest started by this process and has a child process (13)
+    resident = {10: (100, 150), 13: (80, 90), 11: (10, 10)}
+    monkeypatch.setattr(test_resources, "resident_mb", lambda pid: resident[pid])
+    me = os.getpid()
+    table = {1: (0, "ctest"), 2: (me, "ctest"), 10: (2, "bash"), 13: (10, "sleep"), 11: (1, "art")}
+    monitor.sample(table)
+    assert monitor.peaks == {"script": 180}
+
+    resident[10] = (20, 200)
+    monitor.sample(table)
+    assert monitor.peaks == {"script": 200}
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="requires /proc")
+def test_memory_reserved_for_tests(tmp_path, monkeypatch):
+    srcs = tmp_path / "srcs"
+    (srcs / "alpha").mkdir(parents=True)
+    allocate = "import time; x = bytearray(300 * 1024**2); x[::4096] = b'x' * len(x[::4096]); "
+    (srcs / "alpha" / "CMakeLists.txt").write_text(
+        f'add_test(NAME big COMMAND "{sys.executable}" -c "{allocate}time.sleep(2)")\n'
+        "add_test(NAME declared COMMAND true)\n"
+        "set_tests_properties(declared PROPERTIES RESOURCE_GROUPS memory:10)\n"
+    )
+    project_config = {"name": "test", "source": str(srcs), "srcs": {"alpha": "alpha"}}
+    concretize.cmake_develop(project_config, {}, tmp_path / "view")
+    concretize.cmake_lists(project_config, [("alpha", "hash", "/prefix")], cetmodules4=False)
+
+    build = tmp_path / "build"
+    subprocess.run(["cmake", "-S", srcs, "-B", build], check=True, capture_output=True)
+    monkeypatch.setattr(test_resources, "project_data_dir", lambda name: tmp_path)
+    project_config["build"] = str(build)
+
+    tests = test_schedule.list_tests(build, [])
+    with test_resources.PeakMemoryMonitor(tests, interval=0.2) as monitor:
+        subprocess.run(["ctest", "--test-dir", build], check=True, capture_output=True)
+    assert monitor.peaks["big"] >= 300
+    test_resources.record_peaks(project_config, monitor.peaks)
+
+    spec, memory_mb = test_resources.write_resource_spec(project_config)
+    requirements = test_resources.default_requirements(
+        tests, test_resources.recorded_peaks(project_config), memory_mb
+    )
+    assert set(requirements) == {"big"}
+    test_resources.write_defaults(project_config, requirements)
+
+    groups = {
+        test["name"]: test_resources.declared_memory(test)
+        for test in test_schedule.list_tests(build, [])
+    }
+    assert groups == {"big": requirements["big"], "declared": 10}
+    assert json.loads(spec.read_text())["local"][0]["memory"][0]["slots"] == memory_mb
+    subprocess.run(
+        ["ctest", "--test-dir", build, "-j2", "--resource-spec-file", spec],
+        check=True,
+        capture_output=True,
+    )
@@ -0,0 +1,120 @@
+import argparse
+import shutil
+import subprocess
+
+import pytest
+
+from spack.extensions.mpd import test_schedule
+
+COST_DATA = """slow 3 12.5
+fast 10 0.25
+with spaces? 1 x
+---
+slow
+"""
+
+
+def test_cost_data_round_trip():
+    costs = test_schedule.parse_cost_data(COST_DATA)
+    assert costs == {"slow": (3, 12.5), "fast": (10, 0.25)}
+    assert test_schedule.parse_cost_data(test_schedule.format_cost_data(costs)) == costs
+
+
+def test_shard_specification():
+    assert test_schedule.shard("2/4") == (2, 4)
+    for text in ("0/4", "5/4", "2", "a/b"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            test_schedule.shard(text)
+
+
+def test_balanced_shards():
+    costs = {"a": (1, 10.0), "b": (1, 6.0), "c": (1, 5.0), "d": (1, 4.0), "e": (1, 1.0)}
+    tests = ["e", "d", "c", "b", "a", "new"]
+    shards, loads = test_schedule.balanced_shards(tests, costs, 2)
+    # The unknown test counts as the average test (5.2s)
+    assert shards == [["e", "c", "a"], ["d", "b", "new"]]
+    assert loads == pytest.approx([16.0, 15.2])
+    assert sorted(sum(shards, [])) == sorted(tests)
+
+    shards, loads = test_schedule.balanced_shards(["a"], {}, 3)
+    assert shards == [["a"], [], []]
+
+
+def test_costs_survive_removal_of_build_area(tmp_path, monkeypatch):
+    monkeypatch.setattr(test_schedule, "project_data_dir", lambda name: tmp_path)
+    project_config = {"name": "test", "build": str(tmp_path / "build")}
+    cost_data = tmp_path / "build" / test_schedule.COST_DATA
+    cost_data.parent.mkdir(parents=True)
+    cost_data.write_text(COST_DATA)
+
+    test_schedule.harvest_costs(project_config)
+    shutil.rmtree(tmp_path / "build")
+    test_schedule.restore_costs(project_config)
+    assert test_schedule.parse_cost_data(cost_data.read_text()) == {
+        "slow": (3, 12.5),
+        "fast": (10, 0.25),
+    }
+
+
+def _junit(path, cases, failures=0):
+    path.write_text(
+        f'<?xml version="1.0"?>\n<testsuite tests="{len(cases)}" failures="{failures}"'
+        ' disabled="0" skipped="0">\n'
+        + "".join(
+            f'<testcase name="{name}" time="{time}" status="run"/>\n' for name, time in cases
+        )
+        + "</testsuite>\n"
+    )
+    return path
+
+
+def test_merge_junit(tmp_path, capsys):
+    inputs = [
+        _junit(tmp_path / "1.xml", [("a", 3.0), ("b", 1.0)], failures=1),
+        _junit(tmp_path / "2.xml", [("c", 2.5)]),
+    ]
+    output = tmp_path / "merged" / "junit.xml"
+    summary = test_schedule.merge_junit(inputs, output)
+    assert summary["tests"] == 3 and summary["failures"] == 1
+    assert summary["time"] == 6.5 and summary["slowest_shard"] == 4.0
+    assert summary["durations"] == {"a": 3.0, "b": 1.0, "c": 2.5}
+
+    merged = test_schedule.ET.parse(output).getroot()
+    assert [case.get("name") for case in merged] == ["a", "b", "c"]
+    assert merged.get("tests") == "3"
+
+    test_schedule.print_merge_summary(inputs, output, summary)
+    assert "3 tests, 1 failed" in capsys.readouterr().out
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+def test_shards_cover_selected_tests(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.24)\nproject(t NONE)\nenable_testing()\n"
+        + "".join(f"add_test(NAME t{i} COMMAND true)\n" for i in range(7))
+    )
+    build = tmp_path / "build"
+    subprocess.run(["cmake", "-S", src, "-B", build], check=True, capture_output=True)
+    monkeypatch.setattr(test_schedule, "project_data_dir", lambda name: tmp_path)
+    project_config = {"name": "test", "build": str(build)}
+
+    selection = ["-E", "t0"]
+    names = [test["name"] for test in test_schedule.list_tests(build, selection)]
+    reports = []
+    for index in (1, 2, 3):
+        shard = test_schedule.shard_tests(project_config, names, index, 3)
+        arguments = test_schedule.test_number_arguments(names, shard)
+        reports.append(test_schedule.junit_path(project_config, (index, 3)))
+        subprocess.run(
+            ["ctest", "--test-dir", build, *selection, *arguments, "--output-junit", reports[-1]],
+            check=True,
+            capture_output=True,
+        )
+
+    summary = test_schedule.merge_junit(reports, test_schedule.junit_path(project_config))
+    assert sorted(summary["durations"]) == [f"t{i}" for i in range(1, 7)]
+    test_schedule.record_durations(project_config, summary["durations"])
+    assert set(test_schedule.recorded_costs(project_config)) == {f"t{i}" for i in range(1, 7)}
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from spack.extensions.mpd import build_report, time_trace
+
+
+def _event(name, dur, detail=None):
+    event = {"ph": "X", "pid": 1, "tid": 1, "ts": 0, "dur": dur, "name": name}
+    if detail:
+        event["args"] = {"detail": detail}
+    return event
+
+
+def _write_trace(build_area, relative, events):
+    path = build_area / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"traceEvents": events, "beginningOfTime": 0}))
+    return path
+
+
+def _traces(build_area):
+    _write_trace(
+        build_area,
+        "phlex/core/CMakeFiles/phlex_core.dir/graph.cpp.json",
+        [
+            _event("Source", 300_000, "/view/include/boost/graph.hpp"),
+            _event("Source", 100_000, "/view/include/tbb/flow_graph.h"),
+            _event("InstantiateClass", 50_000, "std::vector<int>"),
+            _event("Frontend", 500_000),
+            _event("Backend", 200_000),
+            _event("ExecuteCompiler", 750_000),
+            {"ph": "M", "name": "process_name", "args": {"name": "clang"}},
+        ],
+    )
+    # Sources in subdirectories have their traces in subdirectories of the target's directory
+    _write_trace(
+        build_area,
+        "phlex/core/CMakeFiles/phlex_core.dir/detail/node.cpp.json",
+        [
+            _event("Frontend", 100_000),
+            _event("Backend", 50_000),
+            _event("ExecuteCompiler", 160_000),
+        ],
+    )
+    _write_trace(
+        build_area,
+        "examples/CMakeFiles/ex.dir/ex.cpp.json",
+        [
+            _event("Source", 200_000, "/view/include/boost/graph.hpp"),
+            _event("InstantiateFunction", 20_000, "std::sort<int *>"),
+            _event("InstantiateClass", 30_000, "std::vector<int>"),
+            _event("Frontend", 300_000),
+            _event("Backend", 100_000),
+            _event("ExecuteCompiler", 450_000),
+        ],
+    )
+    # Other JSON files are ignored
+    other_dir = build_area / "CMakeFiles" / "mpd_pch.dir"
+    other_dir.mkdir(parents=True)
+    (other_dir / "not-a-trace.json").write_text('{"version": 1}')
+    (other_dir / "truncated.json").write_text("{")
+    _write_trace(build_area, "compile_commands.json", [])
+
+
+def test_aggregate_time_traces(tmp_path):
+    _traces(tmp_path)
+
+    summary = time_trace.aggregate(tmp_path, {"phlex", "examples"})
+
+    assert summary.units == 3
+    assert summary.frontend == 900_000
+    assert summary.backend == 350_000
+    assert summary.packages["phlex"] == dict(
+        units=2, frontend=600_000, backend=250_000, total=910_000
+    )
+    assert summary.packages["examples"]["total"] == 450_000
+    assert summary.most_expensive(summary.headers)[0] == (
+        "/view/include/boost/graph.hpp",
+        500_000,
+        2,
+    )
+    assert summary.most_expensive(summary.templates) == [
+        ("std::vector<int>", 80_000, 2),
+        ("std::sort<int *>", 20_000, 1),
+    ]
+
+
+def test_slowest_units_are_bounded(tmp_path):
+    summary = time_trace.TraceSummary(top=2)
+    for i in range(5):
+        summary.add(f"unit{i}", build_report.SUPERBUILD, [_event("ExecuteCompiler", i)])
+
+    assert sorted(summary.slowest_units, reverse=True) == [(4, "unit4"), (3, "unit3")]
+
+
+def test_print_report(tmp_path, capsys):
+    _traces(tmp_path)
+    time_trace.print_report(time_trace.aggregate(tmp_path, {"phlex", "examples"}))
+
+    output = capsys.readouterr().out
+    assert "3 translation units" in output
+    assert "boost/graph.hpp" in output
+    assert "std::sort<int *>" in output
+
+
+@pytest.mark.parametrize("family", ["gcc", None])
+def test_time_trace_requires_clang(monkeypatch, family):
+    monkeypatch.setattr(time_trace, "compiler_family", lambda compiler: family)
+    project_config = {"compiler_paths": {"cxx": "/usr/bin/g++"}, "build": "/nonexistent"}
+    with pytest.raises(SystemExit):
+        time_trace.build_with_time_trace(project_config, None, [])
@@ -0,0 +1,131 @@
+import shutil
+import subprocess
+import types
+
+import pytest
+
+from spack.extensions.mpd import concretize, options, unity_pch
+
+
+def _write_package(srcs, name, nsources, header="vector"):
+    package_dir = srcs / name / name
+    package_dir.mkdir(parents=True)
+    (package_dir / f"{name}.hpp").write_text(f"#include <{header}>\nint {name}();\n")
+    sources = []
+    for i in range(nsources):
+        (package_dir / f"s{i}.cc").write_text(
+            f'#include "{name}/{name}.hpp"\n'
+            "#include <map>\n"
+            "#include <string>\n"
+            f"int {name}{i}() {{ std::map<int, std::string> m; return {i} + m.size(); }}\n"
+        )
+        sources.append(f"{name}/s{i}.cc")
+    (srcs / name / "CMakeLists.txt").write_text(
+        f"project({name} LANGUAGES CXX)\n"
+        f"add_library({name} SHARED {' '.join(sources)})\n"
+        f"target_include_directories({name} PUBLIC ${{CMAKE_CURRENT_SOURCE_DIR}})\n"
+    )
+
+
+def test_unity_and_pch_settings():
+    assert unity_pch.unity_settings() is None
+    assert unity_pch.unity_settings(enable=True) == dict(batch_size=8, exclude=[])
+    current = unity_pch.unity_settings(batch_size=4, exclude="b, a")
+    assert current == dict(batch_size=4, exclude=["a", "b"])
+    assert unity_pch.unity_settings(current=current) == current
+    assert unity_pch.unity_settings(exclude="", current=current) == dict(batch_size=4, exclude=[])
+    assert unity_pch.unity_settings(enable=False, current=current) is None
+
+    assert unity_pch.pch_settings(enable=True, exclude="art") == dict(exclude=["art"])
+    with pytest.raises(SystemExit):
+        unity_pch.pch_settings(exclude="art")
+
+
+def test_unity_options_kept_by_refresh():
+    args = types.SimpleNamespace(unity=None, unity_batch_size=None, unity_exclude=None, pch=False)
+    current = {"unity": dict(batch_size=4, exclude=[]), "pch": dict(exclude=[]), "target": {}}
+    build_options = options.build_options_from_args(args, current)
+    assert "unity" not in build_options
+    assert build_options["pch"] is None
+
+
+def test_exclusions_named_by_repository(tmp_path, monkeypatch):
+    srcs = tmp_path / "srcs"
+    _write_package(srcs, "alpha", 4)
+    _write_package(srcs, "beta", 3, header="memory")
+    project_config = {
+        "source": str(srcs),
+        "srcs": {"py-alpha": "alpha", "beta": "beta"},
+        "unity": dict(batch_size=2, exclude=["py-alpha", "other"]),
+        "pch": dict(exclude=["alpha"]),
+    }
+    unity_pch.normalize_exclusions(project_config)
+    assert project_config["unity"]["exclude"] == ["alpha", "other"]
+    assert project_config["pch"]["exclude"] == ["alpha"]
+
+    scanned = []
+    monkeypatch.setattr(unity_pch, "include_frequencies", lambda dirs: scanned.extend(dirs) or {})
+    unity_pch.pch_headers(project_config)
+    assert scanned == ["beta"]
+
+
+def test_headers_selected_by_include_frequency(tmp_path):
+    srcs = tmp_path / "srcs"
+    _write_package(srcs, "alpha", 4)
+    _write_package(srcs, "beta", 3, header="memory")
+
+    frequencies = unity_pch.include_frequencies({"alpha": srcs / "alpha", "beta": srcs / "beta"})
+    assert frequencies["map"] == (7, 2)
+    assert frequencies["vector"] == (1, 1)
+    # Headers of the developed packages are never precompiled
+    assert "alpha/alpha.hpp" not in frequencies
+
+    assert unity_pch.select_headers(frequencies, 2) == ["map", "string"]
+    assert unity_pch.select_headers(frequencies, 2, max_headers=1) == ["map"]
+    assert unity_pch.select_headers(frequencies, 2, min_files=8) == []
+
+
+@pytest.mark.maybeslow
+@pytest.mark.skipif(not shutil.which("cmake"), reason="cmake is required")
+def test_unity_build_and_shared_pch(tmp_path):
+    srcs = tmp_path / "srcs"
+    _write_package(srcs, "alpha", 4)
+    _write_package(srcs, "beta", 3)
+    project_config = {
+        "name": "test",
+        "source": str(srcs),
+        "srcs": {"alpha": "alpha", "py-beta": "beta"},
+        "unity": dict(batch_size=2, exclude=["py-beta"]),
+        "pch": dict(exclude=[]),
+    }
+    unity_pch.normalize_exclusions(project_config)
+    concretize.cmake_develop(project_config, {}, tmp_path / "view")
+    (srcs / "CMakeLists.txt").write_text(
+        concretize.cmake_lists_preamble("test", develop_cetmodules=False, cetmodules4=False)
+        + "develop(alpha)\ndevelop(beta)\n"
+    )
+
+    build = tmp_path / "build"
+    subprocess.run(
+        ["cmake", "-S", str(srcs), "-B", str(build)], check=True, capture_output=True, text=True
+    )
+    result = subprocess.run(
+        ["cmake", "--build", str(build), "-j", "4", "--verbose"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    # Only alpha, which is not excluded, is built from unity sources (two batches of two)
+    unity_sources = sorted(build.rglob("unity_*_cxx.cxx"))
+    assert [p.relative_to(build).parts[0] for p in unity_sources] == ["alpha", "alpha"]
+
+    # Both packages reuse the precompiled header of the shared target, which is valid for them
+    assert "<map>" in next(build.rglob("mpd_pch.dir/cmake_pch.hxx")).read_text()
+    output = result.stdout + result.stderr
+    for package in ("alpha", "beta"):
+        compile_line = next(
+            line for line in output.splitlines() if f"{package}.dir/" in line and " -c " in line
+        )
+        assert "mpd_pch.dir/cmake_pch.hxx" in compile_line
+    assert "not used because" not in output